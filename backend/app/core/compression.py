@@ -0,0 +1,96 @@
+"""
+Сжатие больших текстов при хранении (Note.content).
+
+Значение длиннее порога NOTE_COMPRESSION_THRESHOLD (байт в UTF-8) хранится как
+MARKER + "<длина исходного текста в байтах>:" + base64(zlib(текст)). Колонка остается
+текстовой, поэтому формат одинаков для SQLite и PostgreSQL; base64 добавляет треть к сжатому
+размеру, но JSON todo-списков и обычный текст сжимаются в несколько раз. Исходная длина
+в заголовке позволяет посчитать экономию без распаковки (см. compression_service).
+
+Маркер начинается с управляющего символа \\x01, которого нет в пользовательском тексте;
+текст, который все же начинается с маркера, сжимается независимо от порога, чтобы чтение
+было однозначным.
+
+CompressedText - тип колонки: ORM и Core-запросы с колонкой Note.content сжимают при записи
+и распаковывают при чтении. Запросы в виде text() и SQL-функции над колонкой (JSON1, LIKE)
+видят хранимое значение: для них есть is_compressed_sql() и decode_content().
+"""
+import base64
+import zlib
+from typing import Optional
+
+from sqlalchemy import Text, func, type_coerce
+from sqlalchemy.types import TypeDecorator
+
+from .config import settings
+
+MARKER = "\x01z:"
+COMPRESSION_LEVEL = 6
+
+
+def is_compressed(value: Optional[str]) -> bool:
+    return bool(value) and value.startswith(MARKER)
+
+
+def compress_text(value: str) -> str:
+    raw = value.encode("utf-8")
+    packed = base64.b64encode(zlib.compress(raw, COMPRESSION_LEVEL)).decode("ascii")
+    return f"{MARKER}{len(raw)}:{packed}"
+
+
+def decompress_text(value: str) -> str:
+    _, packed = value[len(MARKER):].split(":", 1)
+    return zlib.decompress(base64.b64decode(packed)).decode("utf-8")
+
+
+def stored_raw_length(value: str) -> int:
+    """Длина исходного текста в байтах по заголовку сжатого значения (без распаковки)."""
+    return int(value[len(MARKER):].split(":", 1)[0])
+
+
+def encode_content(value: Optional[str], threshold: Optional[int] = None) -> Optional[str]:
+    """
+    Значение для записи в БД: сжатое, если текст длиннее порога (0 - сжатие выключено)
+    и сжатие выгодно. value - всегда исходный текст, даже если он начинается с маркера.
+    """
+    if value is None:
+        return None
+    if threshold is None:
+        threshold = settings.note_compression_threshold
+    starts_with_marker = value.startswith(MARKER)
+    if not starts_with_marker and (threshold <= 0 or len(value.encode("utf-8")) <= threshold):
+        return value
+    compressed = compress_text(value)
+    if not starts_with_marker and len(compressed) >= len(value):
+        return value
+    return compressed
+
+
+def decode_content(value: Optional[str]) -> Optional[str]:
+    """Исходный текст по хранимому значению (без изменений, если оно не сжато)."""
+    if is_compressed(value):
+        return decompress_text(value)
+    return value
+
+
+def stored_column(column):
+    """Колонка без CompressedText: выражение над хранимым значением, без распаковки."""
+    return type_coerce(column, Text)
+
+
+def is_compressed_sql(column):
+    """SQL-условие: хранимое значение колонки сжато."""
+    return func.substr(stored_column(column), 1, len(MARKER)) == MARKER
+
+
+class CompressedText(TypeDecorator):
+    """Text, сжимаемый при записи выше порога и распаковываемый при чтении."""
+
+    impl = Text
+    cache_ok = True
+
+    def process_bind_param(self, value, dialect):
+        return encode_content(value)
+
+    def process_result_value(self, value, dialect):
+        return decode_content(value)
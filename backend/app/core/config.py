@@ -7,10 +7,35 @@ class Settings(BaseModel):
     database_url: str = os.getenv("DATABASE_URL", "sqlite:///./data.sqlite3")
     secret_key: str = os.getenv("SECRET_KEY", "dev-secret-key-change")
     access_token_expire_minutes: int = int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES", "180"))
+    # Сколько минут после истечения токен еще можно обменять на новый через /auth/refresh
+    token_refresh_grace_minutes: int = int(os.getenv("TOKEN_REFRESH_GRACE_MINUTES", "1440"))
+    # Максимальная длительность сессии от входа через initData: дальше /auth/refresh не продлевает
+    session_max_age_minutes: int = int(os.getenv("SESSION_MAX_AGE_MINUTES", "43200"))
     max_bot_token: str = os.getenv("MAX_BOT_TOKEN", "f9LHodD0cOL5W8EQiGLI9ISi4E_iHinEt5vCyTmrqDJxDSEi11qY1q_libk7rmyRUI8Lp_o94V1zojAW13-k")
     notification_delete_after_read_seconds: int = int(os.getenv("NOTIFICATION_DELETE_AFTER_READ_SECONDS", "43200"))
     # URL изображения для прикрепления к уведомлениям о дедлайнах (опционально)
     notification_image_url: Optional[str] = os.getenv("NOTIFICATION_IMAGE_URL", "https://i.pinimg.com/736x/28/28/7c/28287c47478349b53d46c3ce6b81d90f.jpg")
+    # Логирование: общий уровень, уровни по модулям ("app.deps=DEBUG,app.services.bot_service=WARNING"),
+    # формат ("text" или "json") и доля запросов с подробной трассировкой (0.0 - 1.0)
+    log_level: str = os.getenv("LOG_LEVEL", "INFO")
+    log_levels: str = os.getenv("LOG_LEVELS", "")
+    log_format: str = os.getenv("LOG_FORMAT", "text")
+    log_trace_sample_rate: float = float(os.getenv("LOG_TRACE_SAMPLE_RATE", "0"))
+    # Токен для служебных возможностей (профилирование по X-Profile-Token, /internal/* по X-Admin-Token); пустой - выключено
+    admin_token: str = os.getenv("ADMIN_TOKEN", "")
+    # Токен для GET /metrics (заголовок "Authorization: Bearer <METRICS_TOKEN>"); пустой - эндпоинт выключен
+    metrics_token: str = os.getenv("METRICS_TOKEN", "")
+    # Доля запросов, профилируемых автоматически (0.0 - выключено), и каталог для отчетов
+    profile_sample_rate: float = float(os.getenv("PROFILE_SAMPLE_RATE", "0"))
+    profile_dir: str = os.getenv("PROFILE_DIR", "./profiles")
+    # Порог медленного SQL-запроса в миллисекундах (0 - журнал медленных запросов выключен)
+    slow_query_threshold_ms: float = float(os.getenv("SLOW_QUERY_THRESHOLD_MS", "100"))
+    # Сколько дней хранить надгробия удаленных сущностей для /api/sync
+    sync_tombstone_retention_days: int = int(os.getenv("SYNC_TOMBSTONE_RETENTION_DAYS", "30"))
+    # Текст заметки длиннее стольких байт хранится сжатым (0 - сжатие выключено)
+    note_compression_threshold: int = int(os.getenv("NOTE_COMPRESSION_THRESHOLD", "2048"))
+    # Сколько тегов (имя -> id, цвет) держать в памяти процесса (0 - кэш выключен)
+    tag_cache_size: int = int(os.getenv("TAG_CACHE_SIZE", "10000"))
 
 
 settings = Settings()
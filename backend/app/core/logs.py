@@ -0,0 +1,116 @@
+"""
+Настройка логирования: уровни по модулям, структурированный формат и выборочная
+трассировка запросов.
+
+Правила для горячих путей:
+- сообщения форматируются лениво (logger.info("... %s", value)), без f-строк;
+- подробные отладочные строки пишутся через trace(): они форматируются только
+  если модуль включен на DEBUG или текущий запрос попал в выборку трассировки;
+- дополнительные поля передаются именованными аргументами и выводятся как key=value (или JSON).
+"""
+import contextvars
+import json
+import logging
+import random
+import sys
+from typing import Any, Optional
+
+from .config import settings
+
+_trace_request: contextvars.ContextVar[bool] = contextvars.ContextVar("trace_request", default=False)
+
+_TEXT_FORMAT = "%(asctime)s - %(name)s - %(levelname)s - %(message)s"
+
+
+class StructuredFormatter(logging.Formatter):
+    """Текстовый формат с полями key=value, переданными через extra={"fields": {...}}."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        line = super().format(record)
+        fields = getattr(record, "fields", None)
+        if fields:
+            line += " " + " ".join(f"{key}={value}" for key, value in fields.items())
+        return line
+
+
+class JsonFormatter(logging.Formatter):
+    """Одна JSON-строка на запись: время, уровень, логгер, сообщение и дополнительные поля."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        data = {
+            "ts": self.formatTime(record),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        fields = getattr(record, "fields", None)
+        if fields:
+            data.update(fields)
+        if record.exc_info:
+            data["exc"] = self.formatException(record.exc_info)
+        return json.dumps(data, ensure_ascii=False, default=str)
+
+
+def _parse_module_levels(raw: str) -> dict:
+    """Разбирает строку вида "app.deps=DEBUG,app.services.bot_service=WARNING"."""
+    levels = {}
+    for part in (raw or "").split(","):
+        name, sep, level = part.partition("=")
+        if sep and name.strip() and level.strip():
+            levels[name.strip()] = level.strip().upper()
+    return levels
+
+
+def configure_logging(stream: Optional[Any] = None) -> None:
+    """Настраивает корневой логгер по settings.log_level / log_levels / log_format."""
+    handler = logging.StreamHandler(stream or sys.stdout)
+    if settings.log_format == "json":
+        handler.setFormatter(JsonFormatter())
+    else:
+        handler.setFormatter(StructuredFormatter(_TEXT_FORMAT))
+
+    root = logging.getLogger()
+    for existing in list(root.handlers):
+        root.removeHandler(existing)
+    root.addHandler(handler)
+    root.setLevel(settings.log_level.upper())
+
+    for name, level in _parse_module_levels(settings.log_levels).items():
+        logging.getLogger(name).setLevel(level)
+
+
+def start_request_trace() -> contextvars.Token:
+    """Решает, трассировать ли текущий запрос (по settings.log_trace_sample_rate)."""
+    rate = settings.log_trace_sample_rate
+    sampled = rate > 0 and (rate >= 1 or random.random() < rate)
+    return _trace_request.set(sampled)
+
+
+def reset_request_trace(token: contextvars.Token) -> None:
+    _trace_request.reset(token)
+
+
+def is_request_traced() -> bool:
+    return _trace_request.get()
+
+
+def trace_enabled(logger: logging.Logger) -> bool:
+    """True, если отладочные строки этого логгера будут выведены."""
+    return _trace_request.get() or logger.isEnabledFor(logging.DEBUG)
+
+
+def trace(logger: logging.Logger, msg: str, *args: Any, **fields: Any) -> None:
+    """
+    Отладочная строка для горячих путей. В запросе из выборки трассировки пишется на INFO,
+    иначе — на DEBUG, если он включен для модуля. В остальных случаях ничего не форматируется.
+    """
+    if _trace_request.get():
+        logger.info(msg, *args, extra={"fields": fields} if fields else None, stacklevel=2)
+    elif logger.isEnabledFor(logging.DEBUG):
+        logger.debug(msg, *args, extra={"fields": fields} if fields else None, stacklevel=2)
+
+
+def log_event(logger: logging.Logger, level: int, msg: str, *args: Any, **fields: Any) -> None:
+    """Структурированная строка с полями key=value; форматируется только если уровень включен."""
+    if logger.isEnabledFor(level):
+        logger.log(level, msg, *args, extra={"fields": fields}, stacklevel=2)
@@ -0,0 +1,229 @@
+"""
+Внутрипроцессные метрики (без внешних зависимостей) и их вывод в текстовом формате Prometheus.
+
+Метрики регистрируются при создании объекта и попадают в вывод render_metrics().
+Gauge может вычисляться в момент чтения через callback (размер пула, число потоков и т.п.).
+"""
+import bisect
+import math
+import threading
+import time
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+# Границы корзин для задержек в секундах
+DEFAULT_LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+_registry: List["_Metric"] = []
+_registry_lock = threading.Lock()
+
+
+class _Metric:
+    type_name = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (), register: bool = True):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        if register:
+            with _registry_lock:
+                _registry.append(self)
+
+    def _samples(self) -> List[Tuple[str, Tuple[Tuple[str, str], ...], float]]:
+        raise NotImplementedError
+
+    def _labels(self, labelvalues: Tuple[str, ...]) -> Tuple[Tuple[str, str], ...]:
+        return tuple(zip(self.labelnames, labelvalues))
+
+
+class Counter(_Metric):
+    """Монотонно растущий счетчик с метками."""
+
+    type_name = "counter"
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, *labelvalues: str, amount: float = 1.0) -> None:
+        with self._lock:
+            self._values[labelvalues] = self._values.get(labelvalues, 0.0) + amount
+
+    def _samples(self):
+        with self._lock:
+            items = list(self._values.items())
+        return [(self.name + "_total", self._labels(labels), value) for labels, value in items]
+
+
+class Gauge(_Metric):
+    """Текущее значение с метками; либо хранимое (set/inc/dec), либо вычисляемое через callback."""
+
+    type_name = "gauge"
+
+    def __init__(self, *args, callback: Optional[Callable[[], float]] = None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._callback = callback
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def set(self, value: float, *labelvalues: str) -> None:
+        with self._lock:
+            self._values[labelvalues] = value
+
+    def inc(self, *labelvalues: str, amount: float = 1.0) -> None:
+        with self._lock:
+            self._values[labelvalues] = self._values.get(labelvalues, 0.0) + amount
+
+    def dec(self, *labelvalues: str, amount: float = 1.0) -> None:
+        self.inc(*labelvalues, amount=-amount)
+
+    def _samples(self):
+        if self._callback is not None:
+            try:
+                return [(self.name, (), float(self._callback()))]
+            except Exception:
+                return []
+        with self._lock:
+            items = list(self._values.items())
+        return [(self.name, self._labels(labels), value) for labels, value in items]
+
+
+class Histogram(_Metric):
+    """Гистограмма с метками: накопительные счетчики по корзинам, сумма и количество наблюдений."""
+
+    type_name = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_LATENCY_BUCKETS, register: bool = True):
+        super().__init__(name, documentation, labelnames, register)
+        self.buckets = tuple(sorted(buckets))
+        # labels -> [counts по корзинам (+Inf последней), sum, count]
+        self._series: Dict[Tuple[str, ...], list] = {}
+
+    def observe(self, value: float, *labelvalues: str) -> None:
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labelvalues)
+            if series is None:
+                series = self._series[labelvalues] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    def snapshot(self) -> Dict[Tuple[str, ...], Tuple[list, float, int]]:
+        """Копия данных: для каждой комбинации меток — (счетчики по корзинам, сумма, количество)."""
+        with self._lock:
+            return {labels: (list(counts), total, count) for labels, (counts, total, count) in self._series.items()}
+
+    def _samples(self):
+        samples = []
+        for labelvalues, (counts, total, count) in self.snapshot().items():
+            labels = self._labels(labelvalues)
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (math.inf,), counts):
+                cumulative += bucket_count
+                le = "+Inf" if bound == math.inf else repr(float(bound))
+                samples.append((self.name + "_bucket", labels + (("le", le),), cumulative))
+            samples.append((self.name + "_sum", labels, total))
+            samples.append((self.name + "_count", labels, count))
+        return samples
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_value(value: float) -> str:
+    if value == math.inf:
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+def render_metrics() -> str:
+    """Все зарегистрированные метрики в текстовом формате экспозиции Prometheus."""
+    with _registry_lock:
+        metrics = list(_registry)
+    lines = []
+    for metric in metrics:
+        lines.append(f"# HELP {metric.name} {_escape(metric.documentation)}")
+        lines.append(f"# TYPE {metric.name} {metric.type_name}")
+        for name, labels, value in metric._samples():
+            if labels:
+                label_str = ",".join(f'{key}="{_escape(val)}"' for key, val in labels)
+                lines.append(f"{name}{{{label_str}}} {_format_value(value)}")
+            else:
+                lines.append(f"{name} {_format_value(value)}")
+    return "\n".join(lines) + "\n"
+
+
+# HTTP
+REQUEST_LATENCY = Histogram(
+    "http_request_duration_seconds",
+    "Длительность HTTP-запросов по шаблону маршрута",
+    labelnames=("method", "route", "status"),
+)
+REQUESTS_IN_FLIGHT = Gauge("http_requests_in_flight", "HTTP-запросы, обрабатываемые в данный момент")
+
+# Процесс
+THREADS = Gauge("process_threads", "Количество потоков Python в процессе", callback=threading.active_count)
+PROCESS_START_TIME = Gauge("process_start_time_seconds", "Время запуска процесса (unix time)")
+PROCESS_START_TIME.set(time.time())
+
+# Пул соединений SQLAlchemy
+DB_POOL_CHECKOUTS = Counter("db_pool_checkouts", "Выдачи соединений из пула SQLAlchemy")
+DB_POOL_WAIT = Histogram(
+    "db_pool_wait_seconds",
+    "Время ожидания соединения из пула SQLAlchemy",
+    buckets=(0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 30.0),
+)
+
+# Планировщик
+SCHEDULER_TICKS = Counter("scheduler_ticks", "Запуски задач планировщика", labelnames=("job", "outcome"))
+SCHEDULER_TICK_DURATION = Histogram(
+    "scheduler_tick_duration_seconds",
+    "Длительность одного запуска задачи планировщика",
+    labelnames=("job",),
+    buckets=(0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 10.0, 30.0, 60.0),
+)
+SCHEDULER_LAST_TICK = Gauge("scheduler_last_tick_timestamp_seconds", "Время последнего запуска задачи планировщика", labelnames=("job",))
+
+# Max Bot API
+BOT_API_LATENCY = Histogram(
+    "bot_api_request_duration_seconds",
+    "Длительность запросов к Max Bot API",
+    labelnames=("operation",),
+)
+BOT_API_REQUESTS = Counter("bot_api_requests", "Запросы к Max Bot API по результату", labelnames=("operation", "outcome"))
+
+
+def instrument_engine(engine) -> None:
+    """Подключает метрики пула соединений: выдачи, занятые соединения, overflow и время ожидания."""
+    from sqlalchemy import event
+
+    pool = engine.pool
+
+    @event.listens_for(pool, "checkout")
+    def _on_checkout(dbapi_connection, connection_record, connection_proxy):
+        DB_POOL_CHECKOUTS.inc()
+
+    # Время ожидания соединения: Pool.connect() блокируется, пока пул исчерпан
+    original_connect = pool.connect
+
+    def timed_connect():
+        start = time.perf_counter()
+        try:
+            return original_connect()
+        finally:
+            DB_POOL_WAIT.observe(time.perf_counter() - start)
+
+    pool.connect = timed_connect
+
+    for name, documentation, method in (
+        ("db_pool_size", "Размер пула соединений SQLAlchemy", "size"),
+        ("db_pool_checked_out", "Соединения, выданные из пула в данный момент", "checkedout"),
+        ("db_pool_overflow", "Соединения сверх размера пула (overflow)", "overflow"),
+    ):
+        if hasattr(pool, method):
+            Gauge(name, documentation, callback=getattr(pool, method))
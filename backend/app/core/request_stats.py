@@ -0,0 +1,150 @@
+"""
+Статистика SQL на запрос: количество запросов и время в БД, а также момент окончания
+работы эндпоинта (для оценки времени сериализации ответа).
+
+RequestStats создается AccessLogMiddleware и передается через contextvar, поэтому
+подсчет работает и в потоках threadpool, где выполняются sync-эндпоинты.
+
+Для тестов и бенчмарков: count_queries() / assert_max_queries(n) считают все запросы
+движка внутри блока независимо от contextvar (например, вызовы через TestClient).
+"""
+import asyncio
+import contextvars
+import functools
+import threading
+import time
+from contextlib import contextmanager
+from typing import Iterator, List, Optional
+
+from sqlalchemy import event
+
+
+class RequestStats:
+    __slots__ = ("started_at", "queries", "db_time", "endpoint_done_at")
+
+    def __init__(self):
+        self.started_at = time.perf_counter()
+        self.queries = 0
+        self.db_time = 0.0
+        self.endpoint_done_at: Optional[float] = None
+
+    def server_timing(self, now: Optional[float] = None) -> str:
+        """Значение заголовка Server-Timing: db, serialize (если известен конец эндпоинта), total."""
+        now = now or time.perf_counter()
+        parts = [f'db;dur={self.db_time * 1000:.2f};desc="{self.queries} queries"']
+        if self.endpoint_done_at is not None:
+            parts.append(f"serialize;dur={(now - self.endpoint_done_at) * 1000:.2f}")
+        parts.append(f"total;dur={(now - self.started_at) * 1000:.2f}")
+        return ", ".join(parts)
+
+
+_request_stats: contextvars.ContextVar[Optional[RequestStats]] = contextvars.ContextVar("request_stats", default=None)
+
+# Активные сборщики count_queries(): списки выполненных SQL-выражений
+_collectors: List[List[str]] = []
+_collectors_lock = threading.Lock()
+
+
+def start_request_stats() -> contextvars.Token:
+    return _request_stats.set(RequestStats())
+
+
+def current_request_stats() -> Optional[RequestStats]:
+    return _request_stats.get()
+
+
+def reset_request_stats(token: contextvars.Token) -> None:
+    _request_stats.reset(token)
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_start_time", []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    elapsed = time.perf_counter() - conn.info["query_start_time"].pop()
+    stats = _request_stats.get()
+    if stats is not None:
+        stats.queries += 1
+        stats.db_time += elapsed
+    if _collectors:
+        with _collectors_lock:
+            for collected in _collectors:
+                collected.append(statement)
+
+
+def _handle_error(exception_context):
+    # after_cursor_execute не вызывается при ошибке: снимаем время начала, чтобы стек не рос
+    connection = exception_context.connection
+    if connection is not None and connection.info.get("query_start_time"):
+        connection.info["query_start_time"].pop()
+
+
+def instrument_sql_stats(engine) -> None:
+    """Подключает подсчет SQL-запросов к движку."""
+    event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+    event.listen(engine, "handle_error", _handle_error)
+
+
+def _mark_endpoint_done() -> None:
+    stats = _request_stats.get()
+    if stats is not None:
+        stats.endpoint_done_at = time.perf_counter()
+
+
+def timed_endpoint(call):
+    """Оборачивает функцию эндпоинта (сохраняя sync/async), отмечая момент ее завершения."""
+    if asyncio.iscoroutinefunction(call):
+        @functools.wraps(call)
+        async def async_wrapper(*args, **kwargs):
+            try:
+                return await call(*args, **kwargs)
+            finally:
+                _mark_endpoint_done()
+        return async_wrapper
+
+    @functools.wraps(call)
+    def sync_wrapper(*args, **kwargs):
+        try:
+            return call(*args, **kwargs)
+        finally:
+            _mark_endpoint_done()
+    return sync_wrapper
+
+
+def instrument_routes(app) -> None:
+    """Оборачивает эндпоинты приложения timed_endpoint. Вызывается после подключения роутеров."""
+    from fastapi.routing import APIRoute
+
+    for route in app.routes:
+        if isinstance(route, APIRoute):
+            route.dependant.call = timed_endpoint(route.dependant.call)
+
+
+@contextmanager
+def count_queries() -> Iterator[List[str]]:
+    """Собирает все SQL-выражения, выполненные внутри блока; возвращает их список."""
+    collected: List[str] = []
+    with _collectors_lock:
+        _collectors.append(collected)
+    try:
+        yield collected
+    finally:
+        with _collectors_lock:
+            _collectors.remove(collected)
+
+
+@contextmanager
+def assert_max_queries(max_count: int) -> Iterator[List[str]]:
+    """
+    Падает с AssertionError, если внутри блока выполнено больше max_count SQL-запросов:
+
+        with assert_max_queries(4):
+            client.get("/api/notes", headers=headers)
+    """
+    with count_queries() as collected:
+        yield collected
+    if len(collected) > max_count:
+        listing = "\n".join(f"  {number}. {statement}" for number, statement in enumerate(collected, 1))
+        raise AssertionError(f"Выполнено {len(collected)} SQL-запросов, ожидалось не больше {max_count}:\n{listing}")
@@ -0,0 +1,49 @@
+"""
+Быстрая сериализация списочных ответов.
+
+Если эндпоинт возвращает модели или словари, FastAPI повторно валидирует их по response_model,
+прогоняет через jsonable_encoder и сериализует стандартным json. Для тысяч элементов это
+основная часть времени ответа. Здесь - два способа обойти этот путь (эндпоинт подключает их явно):
+
+- list_response(NoteOut, items, response): список уже построенных моделей сериализуется
+  закэшированным TypeAdapter(list[Model]) прямо в JSON-байты (pydantic-core, без валидации);
+- FastJSONResponse / rows_response(rows, response): готовые dict/list сериализуются orjson.
+
+В обоих случаях возвращается готовый Response, поэтому заголовки, выставленные в параметре
+response (ETag, X-Next-Cursor), переносятся явно.
+"""
+from functools import lru_cache
+from typing import Any, List, Type
+
+import orjson
+from fastapi import Response
+from pydantic import BaseModel, TypeAdapter
+
+
+class FastJSONResponse(Response):
+    """JSON-ответ через orjson. Можно указывать как response_class маршрута."""
+
+    media_type = "application/json"
+
+    def render(self, content: Any) -> bytes:
+        return orjson.dumps(content)
+
+
+@lru_cache(maxsize=None)
+def list_adapter(model: Type[BaseModel]) -> TypeAdapter:
+    """TypeAdapter(list[model]) создается один раз на модель: построение схемы дорогое."""
+    return TypeAdapter(List[model])
+
+
+def _headers(response: Response) -> dict:
+    return {name: value for name, value in response.headers.items() if name != "content-length"}
+
+
+def list_response(model: Type[BaseModel], items: List[BaseModel], response: Response) -> Response:
+    """Ответ со списком моделей model, сериализованным без повторной валидации."""
+    return Response(list_adapter(model).dump_json(items), media_type="application/json", headers=_headers(response))
+
+
+def rows_response(rows: Any, response: Response) -> FastJSONResponse:
+    """Ответ из готовых словарей (read model) через orjson."""
+    return FastJSONResponse(rows, headers=_headers(response))
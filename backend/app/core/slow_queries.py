@@ -0,0 +1,176 @@
+"""
+Журнал медленных SQL-запросов.
+
+Запросы дольше SLOW_QUERY_THRESHOLD_MS логируются с параметрами и группируются по
+"отпечатку" (текст запроса без литералов и с одним "?" вместо списков IN (...)).
+Для каждого отпечатка один раз снимается план выполнения (EXPLAIN QUERY PLAN на SQLite,
+EXPLAIN на PostgreSQL) в отдельном фоновом потоке, не задерживая сам запрос.
+Сводка доступна через GET /internal/slow-queries (заголовок X-Admin-Token).
+"""
+import logging
+import re
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from typing import List, Optional
+
+from sqlalchemy import event
+
+from .logs import log_event
+
+logger = logging.getLogger(__name__)
+
+# Сколько разных отпечатков хранить (самые давние вытесняются)
+MAX_ENTRIES = 500
+# Ограничение длины параметров в журнале и сводке
+MAX_PARAMS_LENGTH = 500
+
+_STRING_LITERAL = re.compile(r"'(?:[^']|'')*'")
+_NUMBER_LITERAL = re.compile(r"\b\d+(?:\.\d+)?\b")
+_IN_LIST = re.compile(r"\(\s*(?:\?|%\(\w+\)s|:\w+)(?:\s*,\s*(?:\?|%\(\w+\)s|:\w+))*\s*\)")
+_WHITESPACE = re.compile(r"\s+")
+# План снимается только для DML; DDL и PRAGMA (create_all, миграции) пропускаются
+_EXPLAINABLE = re.compile(r"^\s*(?:SELECT|INSERT|UPDATE|DELETE|WITH)\b", re.IGNORECASE)
+
+
+def fingerprint(statement: str) -> str:
+    """Нормализованный текст запроса: без литералов, лишних пробелов и длины списков IN (...)."""
+    text = _STRING_LITERAL.sub("?", statement)
+    text = _NUMBER_LITERAL.sub("?", text)
+    text = _WHITESPACE.sub(" ", text).strip()
+    return _IN_LIST.sub("(?)", text)
+
+
+class SlowQueryEntry:
+    __slots__ = ("fingerprint", "count", "total_ms", "max_ms", "last_params", "last_seen", "plan", "full_scan")
+
+    def __init__(self, fingerprint: str):
+        self.fingerprint = fingerprint
+        self.count = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+        self.last_params: Optional[str] = None
+        self.last_seen: Optional[datetime] = None
+        self.plan: Optional[List[str]] = None
+        self.full_scan: Optional[bool] = None
+
+    def as_dict(self) -> dict:
+        return {
+            "fingerprint": self.fingerprint,
+            "count": self.count,
+            "total_ms": round(self.total_ms, 2),
+            "max_ms": round(self.max_ms, 2),
+            "avg_ms": round(self.total_ms / self.count, 2) if self.count else 0.0,
+            "last_params": self.last_params,
+            "last_seen": self.last_seen.isoformat() if self.last_seen else None,
+            "plan": self.plan,
+            "full_scan": self.full_scan,
+        }
+
+
+class SlowQueryLog:
+    """Накопитель медленных запросов движка с фоновым снятием планов."""
+
+    def __init__(self, engine, threshold_ms: float):
+        self.engine = engine
+        self.threshold = threshold_ms / 1000
+        self._entries: "OrderedDict[str, SlowQueryEntry]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._explainer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="explain")
+
+    def install(self) -> None:
+        event.listen(self.engine, "before_cursor_execute", self._before_cursor_execute)
+        event.listen(self.engine, "after_cursor_execute", self._after_cursor_execute)
+        event.listen(self.engine, "handle_error", self._handle_error)
+
+    def _before_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("slow_query_start", []).append(time.perf_counter())
+
+    def _handle_error(self, exception_context):
+        connection = exception_context.connection
+        if connection is not None and connection.info.get("slow_query_start"):
+            connection.info["slow_query_start"].pop()
+
+    def _after_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        elapsed = time.perf_counter() - conn.info["slow_query_start"].pop()
+        if elapsed < self.threshold or statement.lstrip().upper().startswith("EXPLAIN"):
+            return
+        self.record(statement, parameters, elapsed, explain=not executemany and bool(_EXPLAINABLE.match(statement)))
+
+    def record(self, statement: str, parameters, elapsed: float, explain: bool = True) -> None:
+        key = fingerprint(statement)
+        elapsed_ms = elapsed * 1000
+        params = repr(parameters)[:MAX_PARAMS_LENGTH]
+        with self._lock:
+            entry = self._entries.get(key)
+            is_new = entry is None
+            if is_new:
+                entry = self._entries[key] = SlowQueryEntry(key)
+                while len(self._entries) > MAX_ENTRIES:
+                    self._entries.popitem(last=False)
+            else:
+                self._entries.move_to_end(key)
+            entry.count += 1
+            entry.total_ms += elapsed_ms
+            entry.max_ms = max(entry.max_ms, elapsed_ms)
+            entry.last_params = params
+            entry.last_seen = datetime.now(timezone.utc)
+            count = entry.count
+
+        log_event(
+            logger,
+            logging.WARNING,
+            "slow query %.1f ms: %s",
+            elapsed_ms,
+            key,
+            params=params,
+            count=count,
+        )
+        if is_new and explain:
+            self._explainer.submit(self._explain, entry, statement, parameters)
+
+    def _explain(self, entry: SlowQueryEntry, statement: str, parameters) -> None:
+        dialect = self.engine.dialect.name
+        if dialect == "sqlite":
+            prefix, scan_marker = "EXPLAIN QUERY PLAN ", re.compile(r"^SCAN (?!.*USING (?:COVERING )?INDEX)")
+        elif dialect == "postgresql":
+            prefix, scan_marker = "EXPLAIN ", re.compile(r"Seq Scan")
+        else:
+            return
+        try:
+            with self.engine.connect() as conn:
+                rows = conn.exec_driver_sql(prefix + statement, parameters).fetchall()
+                conn.rollback()
+            plan = [str(row[-1]) for row in rows]
+        except Exception as e:
+            logger.info("Не удалось получить план для медленного запроса %s: %s", entry.fingerprint, type(e).__name__)
+            return
+        with self._lock:
+            entry.plan = plan
+            entry.full_scan = any(scan_marker.search(line.strip()) for line in plan)
+        log_event(logger, logging.WARNING, "slow query plan: %s", entry.fingerprint, plan=" | ".join(plan), full_scan=entry.full_scan)
+
+    def entries(self) -> List[dict]:
+        """Сводка по отпечаткам, отсортированная по суммарному времени."""
+        with self._lock:
+            items = [entry.as_dict() for entry in self._entries.values()]
+        return sorted(items, key=lambda item: item["total_ms"], reverse=True)
+
+    def reset(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+
+slow_query_log: Optional[SlowQueryLog] = None
+
+
+def install_slow_query_log(engine, threshold_ms: float) -> Optional[SlowQueryLog]:
+    """Подключает журнал медленных запросов к движку; при threshold_ms <= 0 ничего не делает."""
+    global slow_query_log
+    if threshold_ms <= 0:
+        return None
+    slow_query_log = SlowQueryLog(engine, threshold_ms)
+    slow_query_log.install()
+    return slow_query_log
@@ -1,13 +1,20 @@
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, inspect
+from sqlalchemy.schema import CreateColumn
 from sqlalchemy.orm import sessionmaker, declarative_base
 
 from .core.config import settings
+from .core.metrics import instrument_engine
+from .core.request_stats import instrument_sql_stats
+from .core.slow_queries import install_slow_query_log
 
 
 engine = create_engine(
     settings.database_url,
     connect_args={"check_same_thread": False} if settings.database_url.startswith("sqlite") else {},
 )
+instrument_engine(engine)
+instrument_sql_stats(engine)
+install_slow_query_log(engine, settings.slow_query_threshold_ms)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 Base = declarative_base()
 
@@ -20,3 +27,32 @@ def get_db():
         db.close()
 
 
+def dialect_insert(db, table):
+    """INSERT с поддержкой ON CONFLICT для текущего диалекта (SQLite или PostgreSQL)."""
+    if db.get_bind().dialect.name == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert
+    else:
+        from sqlalchemy.dialects.sqlite import insert
+    return insert(table)
+
+
+
+
+def migrate_schema(bind) -> None:
+    """
+    Дополняет уже существующие таблицы тем, что create_all не добавляет: новыми колонками
+    и индексами. Новые колонки должны быть nullable или иметь server_default.
+    """
+    inspector = inspect(bind)
+    with bind.begin() as conn:
+        for table in Base.metadata.sorted_tables:
+            if not inspector.has_table(table.name):
+                continue
+            existing = {column["name"] for column in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name not in existing:
+                    column_ddl = CreateColumn(column).compile(dialect=bind.dialect)
+                    conn.exec_driver_sql(f"ALTER TABLE {table.name} ADD COLUMN {column_ddl}")
+    for table in Base.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(bind=bind, checkfirst=True)
@@ -1,11 +1,17 @@
+import hmac
 import logging
-from fastapi import Depends, HTTPException, status
+from typing import Callable, Optional
+
+from fastapi import Depends, Header, HTTPException, Request, Response, status
 from fastapi.security import OAuth2PasswordBearer
 from sqlalchemy.orm import Session
 
+from .core.config import settings
+from .core.logs import trace, trace_enabled
 from .db import get_db
 from .models.user import User
 from .security import decode_access_token
+from .services.version_service import get_user_version
 
 logger = logging.getLogger(__name__)
 
@@ -13,106 +19,150 @@ oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/auth/login")
 
 
 def get_current_user(
-    token: str = Depends(oauth2_scheme), 
+    token: str = Depends(oauth2_scheme),
     db: Session = Depends(get_db)
 ) -> User:
     """
     Получает текущего авторизованного пользователя из токена.
-    Добавлено детальное логирование для отладки проблем с авторизацией.
+    Подробные строки пишутся через trace() и форматируются только при включенной трассировке.
     """
-    logger.info("=" * 80)
-    logger.info("[get_current_user] Начало проверки авторизации")
-    logger.info(f"[get_current_user] Токен получен: {'ДА' if token else 'НЕТ'}")
-    
-    if token:
-        logger.info(f"[get_current_user] Токен (первые 30 символов): {token[:30]}...")
-        logger.info(f"[get_current_user] Токен (последние 10 символов): ...{token[-10:]}")
-        logger.info(f"[get_current_user] Длина токена: {len(token)} символов")
-    else:
-        logger.error("[get_current_user] ❌ ОШИБКА: токен не получен из заголовка Authorization")
+    if not token:
+        logger.warning("[get_current_user] Токен не получен из заголовка Authorization")
         raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED, 
+            status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Токен не предоставлен. Пожалуйста, войдите заново."
         )
-    
+    trace(logger, "[get_current_user] Проверка токена", token_length=len(token))
+
     try:
-        logger.info("[get_current_user] Попытка декодирования токена...")
         payload = decode_access_token(token)
-        logger.info(f"[get_current_user] ✅ Токен успешно декодирован: {payload}")
-        
+
         user_id_str = payload.get("sub")
-        logger.info(f"[get_current_user] user_id из токена (sub): {user_id_str} (тип: {type(user_id_str)})")
-        
         if not user_id_str:
-            logger.error("[get_current_user] ❌ ОШИБКА: поле 'sub' отсутствует в payload токена")
+            logger.warning("[get_current_user] Поле 'sub' отсутствует в payload токена")
             raise HTTPException(
-                status_code=status.HTTP_401_UNAUTHORIZED, 
+                status_code=status.HTTP_401_UNAUTHORIZED,
                 detail="Токен не содержит идентификатор пользователя"
             )
-        
+
         try:
             user_id = int(user_id_str)
-            logger.info(f"[get_current_user] user_id преобразован в int: {user_id}")
         except (ValueError, TypeError) as e:
-            logger.error(f"[get_current_user] ❌ ОШИБКА: не удалось преобразовать user_id в int: {e}")
-            logger.error(f"[get_current_user] user_id_str: {user_id_str}, тип: {type(user_id_str)}")
+            logger.warning("[get_current_user] Не удалось преобразовать user_id %r в int: %s", user_id_str, e)
             raise HTTPException(
-                status_code=status.HTTP_401_UNAUTHORIZED, 
+                status_code=status.HTTP_401_UNAUTHORIZED,
                 detail=f"Неверный формат идентификатора пользователя в токене: {user_id_str}"
             )
-        
+
     except HTTPException:
         # Пробрасываем HTTPException дальше
         raise
     except Exception as e:
-        logger.error(f"[get_current_user] ❌ ОШИБКА при декодировании токена: {e}")
-        logger.error(f"[get_current_user] Тип ошибки: {type(e).__name__}")
-        import traceback
-        logger.error(f"[get_current_user] Трассировка:\n{traceback.format_exc()}")
-        
         # Проверяем конкретные типы ошибок
         error_str = str(e).lower()
         if "expired" in error_str or "exp" in error_str:
-            logger.error("[get_current_user] Причина: токен истек")
+            logger.info("[get_current_user] Токен истек")
             raise HTTPException(
-                status_code=status.HTTP_401_UNAUTHORIZED, 
+                status_code=status.HTTP_401_UNAUTHORIZED,
                 detail="Токен истек. Пожалуйста, войдите заново."
             )
         elif "signature" in error_str or "invalid" in error_str:
-            logger.error("[get_current_user] Причина: неверная подпись токена")
+            logger.warning("[get_current_user] Неверная подпись токена: %s", e)
             raise HTTPException(
-                status_code=status.HTTP_401_UNAUTHORIZED, 
+                status_code=status.HTTP_401_UNAUTHORIZED,
                 detail="Неверный токен. Пожалуйста, войдите заново."
             )
         else:
-            logger.error(f"[get_current_user] Причина: {e}")
+            logger.warning("[get_current_user] Не удалось проверить токен (%s): %s", type(e).__name__, e)
             raise HTTPException(
-                status_code=status.HTTP_401_UNAUTHORIZED, 
+                status_code=status.HTTP_401_UNAUTHORIZED,
                 detail="Не удалось проверить токен. Пожалуйста, войдите заново."
             )
 
     # Поиск пользователя в БД
-    logger.info(f"[get_current_user] Поиск пользователя в БД с id={user_id}...")
     user = db.get(User, user_id)
-    
+
     if user is None:
-        logger.error(f"[get_current_user] ❌ ОШИБКА: пользователь с id={user_id} не найден в БД")
-        # Проверяем, сколько пользователей в БД для отладки
-        total_users = db.query(User).count()
-        logger.error(f"[get_current_user] Всего пользователей в БД: {total_users}")
-        # Показываем несколько последних пользователей для отладки
-        if total_users > 0:
+        logger.warning("[get_current_user] Пользователь с id=%s не найден в БД", user_id)
+        if trace_enabled(logger):
+            # Диагностика только в режиме трассировки: лишние запросы к БД
+            total_users = db.query(User).count()
             last_users = db.query(User).order_by(User.id.desc()).limit(5).all()
-            logger.error(f"[get_current_user] Последние 5 пользователей:")
-            for u in last_users:
-                logger.error(f"[get_current_user]   - id={u.id}, username={u.username}, uuid={u.uuid}")
+            trace(
+                logger,
+                "[get_current_user] Всего пользователей в БД: %s, последние: %s",
+                total_users,
+                [(u.id, u.username, u.uuid) for u in last_users],
+            )
         raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED, 
+            status_code=status.HTTP_401_UNAUTHORIZED,
             detail=f"Пользователь с id={user_id} не найден в базе данных"
         )
-    
-    logger.info(f"[get_current_user] ✅ Пользователь найден: id={user.id}, username={user.username}, uuid={user.uuid}")
-    logger.info("=" * 80)
+
+    trace(logger, "[get_current_user] Пользователь найден", user_id=user.id)
     return user
 
 
+def require_admin(x_admin_token: Optional[str] = Header(default=None)) -> None:
+    """
+    Доступ к служебным эндпоинтам по заголовку X-Admin-Token.
+    Если ADMIN_TOKEN не задан, служебные эндпоинты считаются отсутствующими (404).
+    """
+    if not settings.admin_token:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Not Found")
+    if not x_admin_token or not hmac.compare_digest(x_admin_token, settings.admin_token):
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Недостаточно прав")
+
+
+def require_metrics_token(authorization: Optional[str] = Header(default=None)) -> None:
+    """
+    Доступ к /metrics по заголовку "Authorization: Bearer <METRICS_TOKEN>" (bearer_token в Prometheus).
+    Если METRICS_TOKEN не задан, эндпоинт считается отсутствующим (404).
+    """
+    if not settings.metrics_token:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Not Found")
+    scheme, _, token = (authorization or "").partition(" ")
+    if scheme.lower() != "bearer" or not hmac.compare_digest(token.strip(), settings.metrics_token):
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Не удалось проверить учетные данные",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+
+
+def _etag_matches(if_none_match: str, etag: str) -> bool:
+    """Слабое сравнение из If-None-Match (RFC 9110): W/ не учитывается, "*" совпадает с любым."""
+    for candidate in if_none_match.split(","):
+        candidate = candidate.strip()
+        if candidate == "*" or candidate.removeprefix("W/") == etag:
+            return True
+    return False
+
+
+def user_etag(*extra_parts: Callable[[Session], str]):
+    """
+    Зависимость для GET-эндпоинтов: ETag из версии данных пользователя (и дополнительных частей).
+    Если If-None-Match совпадает, отвечает 304 до запросов к сущностям: стоимость - чтение
+    одной строки user_versions по первичному ключу. Подключается первой в dependencies=[...].
+    """
+    def dependency(
+        request: Request,
+        response: Response,
+        token: str = Depends(oauth2_scheme),
+        db: Session = Depends(get_db),
+    ) -> None:
+        try:
+            user_id = int(decode_access_token(token)["sub"])
+        except Exception:
+            # Невалидный токен: ответ 401 сформирует get_current_user
+            return
+        parts = [f"u{user_id}", f"v{get_user_version(db, user_id)}"]
+        parts.extend(part(db) for part in extra_parts)
+        etag = '"' + "-".join(parts) + '"'
+        headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+        if_none_match = request.headers.get("if-none-match")
+        if if_none_match and _etag_matches(if_none_match, etag):
+            raise HTTPException(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+        response.headers.update(headers)
+
+    return Depends(dependency)
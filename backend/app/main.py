@@ -1,31 +1,37 @@
 from contextlib import asynccontextmanager
-from fastapi import FastAPI, Request
+from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
-from starlette.middleware.base import BaseHTTPMiddleware
 import logging
 
 from .routers import health, auth
-from .routers import crud, webhook, settings
-from .db import engine, Base
-
-# Настройка логирования
-logging.basicConfig(level=logging.INFO)
+from .routers import crud, batch, todo_items, workspace, webhook, settings, metrics, internal
+from .db import engine, Base, migrate_schema
+from .services.search_service import ensure_notes_fts
+from .services.tag_service import backfill_tag_usage
+from .services.todo_service import backfill_todo_items
+from .core.logs import configure_logging
+from .core.request_stats import instrument_routes
+from .middleware import AccessLogMiddleware
+from .profiling import install_profiling, profiling_enabled
+
+# Настройка логирования (LOG_LEVEL, LOG_LEVELS, LOG_FORMAT, LOG_TRACE_SAMPLE_RATE)
+configure_logging()
 logger = logging.getLogger(__name__)
 
 
-class LoggingMiddleware(BaseHTTPMiddleware):
-    async def dispatch(self, request: Request, call_next):
-        logger.info(f"{request.method} {request.url.path} - Headers: {dict(request.headers)}")
-        response = await call_next(request)
-        logger.info(f"{request.method} {request.url.path} - Status: {response.status_code}")
-        return response
-
-
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     # Startup
     from . import models  # noqa: F401
     Base.metadata.create_all(bind=engine)
+    # Новые колонки и индексы для уже существующих таблиц
+    migrate_schema(engine)
+    # Полнотекстовый индекс заметок (FTS5): создание и дозаполнение
+    ensure_notes_fts(engine)
+    # Построчная копия пунктов todo-заметок (todo_items) для заметок, созданных до ее появления
+    backfill_todo_items(engine)
+    # Счетчики тегов пользователей (tag_usage) для данных, созданных до ее появления
+    backfill_tag_usage(engine)
     
     # Выполняем миграцию user_settings если нужно
     try:
@@ -131,8 +137,8 @@ async def lifespan(app: FastAPI):
 def create_app() -> FastAPI:
     app = FastAPI(title="UniTask Tracker", version="0.1.0", lifespan=lifespan)
 
-    # Добавляем логирование запросов
-    app.add_middleware(LoggingMiddleware)
+    # Журнал запросов и гистограммы задержек по маршрутам
+    app.add_middleware(AccessLogMiddleware)
 
     app.add_middleware(
         CORSMiddleware,
@@ -146,8 +152,20 @@ def create_app() -> FastAPI:
     app.include_router(health.router)
     app.include_router(auth.router)
     app.include_router(crud.router)
+    app.include_router(batch.router)
+    app.include_router(todo_items.router)
+    app.include_router(workspace.router)
     app.include_router(webhook.router)
     app.include_router(settings.router)
+    app.include_router(metrics.router)
+    app.include_router(internal.router)
+
+    # Отметка окончания эндпоинта для serialize в Server-Timing
+    instrument_routes(app)
+
+    # Профилирование по требованию: без ADMIN_TOKEN и PROFILE_SAMPLE_RATE ничего не подключается
+    if profiling_enabled():
+        install_profiling(app)
 
     return app
 
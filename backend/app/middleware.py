@@ -0,0 +1,75 @@
+"""
+ASGI-middleware для журнала запросов и измерения времени.
+"""
+import logging
+import time
+
+from .core.logs import log_event, reset_request_trace, start_request_trace
+from .core.metrics import REQUEST_LATENCY, REQUESTS_IN_FLIGHT
+from .core.request_stats import reset_request_stats, start_request_stats, current_request_stats
+
+access_logger = logging.getLogger("app.access")
+
+
+class AccessLogMiddleware:
+    """
+    Чистое ASGI-middleware (без BaseHTTPMiddleware и промежуточных задач/потоков):
+    одна структурированная строка на запрос (method, route, status, bytes, duration_ms,
+    queries, db_ms) и наблюдение в гистограмме задержек по шаблону маршрута.
+
+    В ответ добавляется заголовок Server-Timing: db (время и число SQL-запросов),
+    serialize (от конца эндпоинта до отправки заголовков) и total.
+
+    Заголовки запроса не логируются. Отключить строки журнала: LOG_LEVELS=app.access=WARNING.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        start = time.perf_counter()
+        status_code = 500
+        response_bytes = 0
+        stats_token = start_request_stats()
+        stats = current_request_stats()
+
+        async def send_wrapper(message):
+            nonlocal status_code, response_bytes
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                headers = list(message.get("headers", []))
+                headers.append((b"server-timing", stats.server_timing().encode("latin-1")))
+                message = {**message, "headers": headers}
+            elif message["type"] == "http.response.body":
+                response_bytes += len(message.get("body", b""))
+            await send(message)
+
+        trace_token = start_request_trace()
+        REQUESTS_IN_FLIGHT.inc()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            REQUESTS_IN_FLIGHT.dec()
+            duration = time.perf_counter() - start
+            # Шаблон маршрута ("/api/notes/{note_id}") вместо пути, чтобы не раздувать число меток
+            route = scope.get("route")
+            route_path = getattr(route, "path", None) or "<unmatched>"
+            REQUEST_LATENCY.observe(duration, scope["method"], route_path, str(status_code))
+            log_event(
+                access_logger,
+                logging.INFO,
+                "request",
+                method=scope["method"],
+                route=route_path,
+                status=status_code,
+                bytes=response_bytes,
+                duration_ms=round(duration * 1000, 2),
+                queries=stats.queries,
+                db_ms=round(stats.db_time * 1000, 2),
+            )
+            reset_request_trace(trace_token)
+            reset_request_stats(stats_token)
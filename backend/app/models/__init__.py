@@ -1,5 +1,6 @@
 from .user import User
-from .todo import Task, Note, Tag, Deadline, DeadlineNotification
+from .todo import Task, Note, Tag, TagUsage, TodoItem, Deadline, DeadlineNotification
 from .user_settings import UserSettings
 
 
+from .sync import UserVersion, ChangeLog
@@ -0,0 +1,37 @@
+from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Index, UniqueConstraint
+from sqlalchemy.sql import func
+
+from ..db import Base
+
+
+class UserVersion(Base):
+    """Версия данных пользователя: увеличивается при каждом изменении (для ETag / 304 и /api/sync)."""
+    __tablename__ = "user_versions"
+
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), primary_key=True)
+    version = Column(Integer, nullable=False, default=0)
+    # Версия, до которой (включительно) удаления уже вычищены из change_log:
+    # клиенты с since меньше нее получают полную пересинхронизацию
+    compacted_version = Column(Integer, nullable=False, default=0, server_default="0")
+
+
+class ChangeLog(Base):
+    """
+    Последнее изменение каждой сущности пользователя (одна строка на сущность).
+    op="delete" - надгробие (tombstone) удаленной сущности; старые надгробия удаляет компактация.
+    Для дедлайнов entity_id - это note_id.
+    """
+    __tablename__ = "change_log"
+
+    id = Column(Integer, primary_key=True)
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
+    entity_type = Column(String(16), nullable=False)  # "note", "folder", "deadline", "settings"
+    entity_id = Column(Integer, nullable=False)
+    op = Column(String(8), nullable=False)  # "upsert" или "delete"
+    version = Column(Integer, nullable=False)
+    changed_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
+
+    __table_args__ = (
+        UniqueConstraint("user_id", "entity_type", "entity_id", name="uq_change_log_entity"),
+        Index("ix_change_log_user_version", "user_id", "version"),
+    )
@@ -1,7 +1,8 @@
-from sqlalchemy import Column, Integer, String, Text, DateTime, Boolean, ForeignKey, Table, UniqueConstraint
+from sqlalchemy import BigInteger, Column, Integer, String, Text, DateTime, Boolean, ForeignKey, Index, Table, UniqueConstraint
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 
+from ..core.compression import CompressedText
 from ..db import Base
 
 
@@ -11,6 +12,8 @@ task_tag = Table(
     Base.metadata,
     Column("task_id", ForeignKey("tasks.id", ondelete="CASCADE"), primary_key=True),
     Column("tag_id", ForeignKey("tags.id", ondelete="CASCADE"), primary_key=True),
+    # Фильтр задач по тегам: WHERE tag_id IN (...) -> task_id - покрывающий индекс
+    Index("ix_task_tag_tag_task", "tag_id", "task_id"),
 )
 
 note_tag = Table(
@@ -18,6 +21,8 @@ note_tag = Table(
     Base.metadata,
     Column("note_id", ForeignKey("notes.id", ondelete="CASCADE"), primary_key=True),
     Column("tag_id", ForeignKey("tags.id", ondelete="CASCADE"), primary_key=True),
+    # Фильтр заметок по тегам: WHERE tag_id IN (...) -> note_id - покрывающий индекс
+    Index("ix_note_tag_tag_note", "tag_id", "note_id"),
 )
 
 
@@ -29,6 +34,23 @@ class Tag(Base):
     color = Column(String(7), nullable=True)  # hex color like #FF5733
 
 
+class TagUsage(Base):
+    """
+    Теги пользователя: сколько его заметок и задач отмечено тегом. Таблица tags общая
+    для всех пользователей, список тегов пользователя читается отсюда по первичному ключу.
+    Счетчики поддерживаются в tag_service при изменении связей note_tag/task_tag;
+    строка удаляется, когда оба счетчика становятся нулевыми.
+    """
+    __tablename__ = "tag_usage"
+
+    user_id = Column(Integer, ForeignKey("users.id"), primary_key=True)
+    tag_id = Column(Integer, ForeignKey("tags.id", ondelete="CASCADE"), primary_key=True)
+    note_count = Column(Integer, nullable=False, default=0, server_default="0")
+    task_count = Column(Integer, nullable=False, default=0, server_default="0")
+    # Когда тег последний раз добавлялся к заметке или задаче
+    last_used_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
+
+
 class Task(Base):
     __tablename__ = "tasks"
     
@@ -42,6 +64,11 @@ class Task(Base):
 
     tags = relationship("Tag", secondary=task_tag, backref="tasks", lazy="joined")
 
+    __table_args__ = (
+        # Список задач: WHERE user_id = ? ORDER BY created_at DESC, id DESC LIMIT ? OFFSET ?
+        Index("ix_tasks_user_created", "user_id", "created_at", "id"),
+    )
+
 
 class Folder(Base):
     __tablename__ = "folders"
@@ -62,14 +89,47 @@ class Note(Base):
     user_id = Column(Integer, ForeignKey("users.id"), nullable=False, index=True)
     folder_id = Column(Integer, ForeignKey("folders.id", ondelete="SET NULL"), nullable=True, index=True)
     title = Column(String(200), nullable=False)
-    content = Column(Text, nullable=True)
+    content = Column(CompressedText, nullable=True)  # большие значения хранятся сжатыми
     is_favorite = Column(Boolean, nullable=False, default=False, index=True)
+    # Увеличивается при каждом изменении title/content; проверяется при изменении отдельных пунктов todo
+    version = Column(Integer, nullable=False, default=1, server_default="1")
     created_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
     updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now(), nullable=False)
 
     folder = relationship("Folder", back_populates="notes")
     tags = relationship("Tag", secondary=note_tag, backref="notes", lazy="joined")
     deadline = relationship("Deadline", back_populates="note", uselist=False, cascade="all, delete-orphan")
+    todo_items = relationship("TodoItem", cascade="all, delete-orphan")
+
+    __table_args__ = (
+        # Keyset-пагинация списка заметок: WHERE user_id = ? ORDER BY is_favorite DESC, updated_at DESC, id DESC
+        Index("ix_notes_user_favorite_updated", "user_id", "is_favorite", "updated_at", "id"),
+    )
+
+
+class TodoItem(Base):
+    """
+    Пункт todo-заметки - копия элемента items из Note.content для запросов по всем заметкам
+    (открытые пункты, прогресс). Поддерживается в todo_service при каждой записи content.
+    """
+    __tablename__ = "todo_items"
+
+    id = Column(Integer, primary_key=True)
+    note_id = Column(Integer, ForeignKey("notes.id", ondelete="CASCADE"), nullable=False)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    item_id = Column(BigInteger, nullable=True)  # id пункта в JSON (клиент использует Date.now())
+    position = Column(Integer, nullable=False)  # индекс в массиве items
+    text = Column(Text, nullable=False, default="")
+    done = Column(Boolean, nullable=False, default=False)
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now(), nullable=False)
+
+    __table_args__ = (
+        Index("ix_todo_items_note_position", "note_id", "position"),
+        # Открытые пункты: WHERE user_id = ? AND done = ? ORDER BY note_id, position
+        Index("ix_todo_items_user_done_note", "user_id", "done", "note_id", "position"),
+        # Прогресс: WHERE user_id = ? GROUP BY note_id - покрывающий индекс
+        Index("ix_todo_items_user_note_done", "user_id", "note_id", "done"),
+    )
 
 
 class Deadline(Base):
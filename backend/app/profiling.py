@@ -0,0 +1,209 @@
+"""
+Профилирование отдельных запросов по требованию.
+
+Включается только если задан ADMIN_TOKEN (профилирование по заголовку X-Profile-Token)
+или PROFILE_SAMPLE_RATE > 0 (случайная выборка). Иначе install_profiling() не вызывается,
+и ни middleware, ни обработчики событий движка не подключаются.
+
+Профилируется функция эндпоинта (cProfile в том потоке, где она выполняется) и все
+SQL-запросы, выполненные в рамках запроса. Отчет пишется в PROFILE_DIR:
+<время>_<метод>_<маршрут>_u<user_id>.txt (статистика, дерево вызовов, SQL) и .prof для snakeviz.
+"""
+import asyncio
+import contextvars
+import cProfile
+import functools
+import hmac
+import io
+import logging
+import os
+import pstats
+import random
+import re
+import threading
+import time
+from datetime import datetime
+from typing import List, Optional
+
+from fastapi import FastAPI
+from fastapi.routing import APIRoute
+from sqlalchemy import event
+
+from .core.config import settings
+from .db import engine
+from .models.user import User
+
+logger = logging.getLogger(__name__)
+
+PROFILE_HEADER = b"x-profile-token"
+
+_current_profile: contextvars.ContextVar[Optional["RequestProfile"]] = contextvars.ContextVar("request_profile", default=None)
+
+# cProfile в одном потоке не допускает вложенных профилировщиков, поэтому одновременно
+# профилируется только один запрос; остальные в это время выполняются как обычно
+_profile_lock = threading.Lock()
+
+
+class RequestProfile:
+    """Данные профилируемого запроса: профилировщик, SQL-запросы, пользователь."""
+
+    def __init__(self, method: str, path: str):
+        self.method = method
+        self.path = path
+        self.route: Optional[str] = None
+        self.user_id: Optional[int] = None
+        self.status: Optional[int] = None
+        self.profiler = cProfile.Profile()
+        self.statements: List[tuple] = []  # (duration, statement, parameters)
+
+
+def profiling_enabled() -> bool:
+    return bool(settings.admin_token) or settings.profile_sample_rate > 0
+
+
+def _requested_by_admin(scope) -> bool:
+    if not settings.admin_token:
+        return False
+    for name, value in scope.get("headers", ()):
+        if name == PROFILE_HEADER:
+            return hmac.compare_digest(value.decode("latin-1"), settings.admin_token)
+    return False
+
+
+def _should_profile(scope) -> bool:
+    rate = settings.profile_sample_rate
+    return _requested_by_admin(scope) or (rate > 0 and random.random() < rate)
+
+
+class ProfilingMiddleware:
+    """ASGI-middleware: выбирает запросы для профилирования и пишет отчет по завершении."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not _should_profile(scope):
+            await self.app(scope, receive, send)
+            return
+        if not _profile_lock.acquire(blocking=False):
+            logger.info("Профилирование %s пропущено: уже профилируется другой запрос", scope["path"])
+            await self.app(scope, receive, send)
+            return
+
+        profile = RequestProfile(scope["method"], scope["path"])
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                profile.status = message["status"]
+            await send(message)
+
+        token = _current_profile.set(profile)
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            duration = time.perf_counter() - start
+            _current_profile.reset(token)
+            _profile_lock.release()
+            profile.route = getattr(scope.get("route"), "path", None)
+            try:
+                _write_report(profile, duration)
+            except Exception:
+                logger.exception("Не удалось сохранить профиль запроса %s %s", profile.method, profile.path)
+
+
+def _profiled(call):
+    """Оборачивает функцию эндпоинта, сохраняя sync/async (FastAPI выбирает threadpool по этому признаку)."""
+
+    def note_user(kwargs, profile):
+        for value in kwargs.values():
+            if isinstance(value, User):
+                profile.user_id = value.id
+                break
+
+    if asyncio.iscoroutinefunction(call):
+        @functools.wraps(call)
+        async def async_wrapper(*args, **kwargs):
+            profile = _current_profile.get()
+            if profile is None:
+                return await call(*args, **kwargs)
+            note_user(kwargs, profile)
+            profile.profiler.enable()
+            try:
+                return await call(*args, **kwargs)
+            finally:
+                profile.profiler.disable()
+        return async_wrapper
+
+    @functools.wraps(call)
+    def sync_wrapper(*args, **kwargs):
+        profile = _current_profile.get()
+        if profile is None:
+            return call(*args, **kwargs)
+        note_user(kwargs, profile)
+        profile.profiler.enable()
+        try:
+            return call(*args, **kwargs)
+        finally:
+            profile.profiler.disable()
+    return sync_wrapper
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if _current_profile.get() is not None:
+        conn.info.setdefault("profile_query_start", []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    profile = _current_profile.get()
+    starts = conn.info.get("profile_query_start")
+    if profile is not None and starts:
+        profile.statements.append((time.perf_counter() - starts.pop(), statement, parameters))
+
+
+def _write_report(profile: RequestProfile, duration: float) -> None:
+    os.makedirs(settings.profile_dir, exist_ok=True)
+    route_slug = re.sub(r"[^A-Za-z0-9]+", "_", profile.route or profile.path).strip("_") or "root"
+    base_name = f"{datetime.now().strftime('%Y%m%d_%H%M%S_%f')}_{profile.method}_{route_slug}_u{profile.user_id or 'anon'}"
+    base_path = os.path.join(settings.profile_dir, base_name)
+
+    out = io.StringIO()
+    out.write(f"{profile.method} {profile.path}\n")
+    out.write(f"route: {profile.route}\nuser_id: {profile.user_id}\nstatus: {profile.status}\n")
+    out.write(f"duration_ms: {duration * 1000:.2f}\n")
+    db_time = sum(item[0] for item in profile.statements)
+    out.write(f"\n=== SQL: {len(profile.statements)} запросов, {db_time * 1000:.2f} ms ===\n")
+    for number, (elapsed, statement, parameters) in enumerate(profile.statements, 1):
+        out.write(f"\n[{number}] {elapsed * 1000:.2f} ms\n{statement}\nparams: {parameters!r}\n")
+
+    try:
+        stats = pstats.Stats(profile.profiler, stream=out)
+    except TypeError:
+        # Функция эндпоинта не выполнялась (например, 401 на зависимостях)
+        stats = None
+    if stats is not None:
+        out.write("\n=== Функции по суммарному времени ===\n")
+        stats.sort_stats(pstats.SortKey.CUMULATIVE).print_stats(60)
+        out.write("\n=== Дерево вызовов (callees) ===\n")
+        stats.print_callees(30)
+        profile.profiler.dump_stats(base_path + ".prof")
+
+    with open(base_path + ".txt", "w", encoding="utf-8") as f:
+        f.write(out.getvalue())
+    logger.info("Профиль запроса %s %s сохранен: %s.txt", profile.method, profile.path, base_path)
+
+
+def install_profiling(app: FastAPI) -> None:
+    """Подключает профилирование к приложению. Вызывается после подключения всех роутеров."""
+    for route in app.routes:
+        if isinstance(route, APIRoute):
+            route.dependant.call = _profiled(route.dependant.call)
+    event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+    app.add_middleware(ProfilingMiddleware)
+    logger.info(
+        "Профилирование запросов включено: заголовок %s, выборка %.3f, каталог %s",
+        "X-Profile-Token" if settings.admin_token else "выключен",
+        settings.profile_sample_rate,
+        settings.profile_dir,
+    )
@@ -1,20 +1,22 @@
-import time
 import logging
-from datetime import datetime
 from fastapi import APIRouter, Depends, HTTPException, status
+from jose import JWTError
 from sqlalchemy.orm import Session
 from pydantic import BaseModel
 from typing import Any, Dict
 import json
 from urllib.parse import parse_qsl
 
+from ..core.logs import trace
 from ..db import get_db
 from ..models.user import User
 from ..schemas import UserCreate, UserOut, Token, LoginRequest
-from ..security import create_access_token
-from ..deps import get_current_user
+from ..security import create_access_token, decode_refreshable_token
+from ..deps import get_current_user, oauth2_scheme
+from ..services.user_service import extract_identity, upsert_user
 
 
+logger = logging.getLogger(__name__)
 router = APIRouter(prefix="/auth", tags=["auth"]) 
 
 
@@ -106,10 +108,8 @@ def _parse_init_data(raw: str) -> Dict[str, Any]:
 
 @router.post("/webapp-init", response_model=Token)
 def auth_webapp(body: WebAppInit, db: Session = Depends(get_db)):
-    logger = logging.getLogger(__name__)
-    
     data = _parse_init_data(body.initData)
-    logger.info(f"Parsed initData: {data}")
+    trace(logger, "Parsed initData: %s", data)
 
     # TODO: ПРОВЕРКА ПОДПИСИ initData (HMAC и срок годности) согласно Max WebApps.
     # Сейчас проверка отключена для дев-окружения. НЕ ОСТАВЛЯЙТЕ ТАК В PROD!
@@ -145,219 +145,53 @@ def auth_webapp(body: WebAppInit, db: Session = Depends(get_db)):
         logger.error(f"No user_id found in user object. User keys: {list(user.keys())}")
         raise HTTPException(status_code=400, detail="No user id in initData.user")
 
-    # Формируем имя пользователя: first_name + last_name или username или fallback
-    first_name = user.get("first_name") or user.get("name") or ""
-    last_name = user.get("last_name") or ""
-    username_from_user = user.get("username")
-    
-    # Собираем полное имя
-    if first_name and last_name:
-        full_name = f"{first_name} {last_name}".strip()
-    elif first_name:
-        full_name = first_name
-    elif username_from_user:
-        full_name = username_from_user
-    else:
-        full_name = f"user_{user_id}"
-    
-    # Используем username из Max, если есть, иначе используем полное имя
-    # Для уникальности добавляем префикс max_ если нет username
-    if username_from_user:
-        username = username_from_user
-    else:
-        username = f"max_{user_id}_{full_name}".strip()
-    
-    uuid = str(user_id)
-    
-    logger.info(f"Extracted user: id={user_id}, username={username}, name={full_name}")
+    uuid, username = extract_identity(user)
+    trace(logger, "Extracted user", user_id=user_id, username=username)
 
-    # --- FIX: Повторные попытки для решения race condition ---
-    # Проблема: webhook-сервер и API-сервер работают в разных процессах.
-    # bot_started создает юзера через webhook, а фронтенд почти одновременно стучится в /webapp-init.
-    # Из-за задержки репликации или транзакции, /webapp-init может не найти юзера и попытаться создать своего,
-    # что вызовет ошибку уникальности (конфликт по uuid).
-    # Решение: сделать несколько попыток с небольшой задержкой, чтобы дать webhook-серверу время.
-    
-    existing = None
-    max_search_attempts = 10  # Увеличено до 10 попыток (всего до 5 секунд ожидания)
-    for attempt in range(max_search_attempts):
-        existing = db.query(User).filter(User.uuid == uuid).first()
-        if existing:
-            logger.info(f"✅ Пользователь найден в БД на попытке {attempt + 1}/{max_search_attempts}")
-            break
-        if attempt < max_search_attempts - 1:
-            logger.info(f"🔍 Пользователь не найден на попытке {attempt + 1}/{max_search_attempts}. Ожидание 0.5s...")
-            time.sleep(0.5)  # задержка 0.5 секунды
-    # ---------------------------------------------------------
-    
-    if existing:
-        # Пользователь уже есть в БД (был сохранен при bot_started через вебхук)
-        logger.info(f"✅ Пользователь найден в БД (сохранен при bot_started): id={existing.id}, username={existing.username}, uuid={existing.uuid}")
-        logger.info(f"   Автоматический вход в аккаунт для пользователя из вебхука")
-        
-        # Обновляем username, если он изменился
-        updated = False
-        if username_from_user and existing.username != username_from_user:
-            existing.username = username_from_user
-            updated = True
-        elif not username_from_user and existing.username != username:
-            existing.username = username
-            updated = True
-        
-        if updated:
-            db.add(existing)
-            db.commit()
-            db.refresh(existing)
-            logger.info(f"Обновлен username: {existing.username}")
-        
-        # Возвращаем токен для существующего пользователя
-        token = create_access_token(str(existing.id))
-        return Token(access_token=token)
+    # Атомарный upsert по uuid: webhook-сервер (bot_started) и API-сервер работают в разных
+    # процессах и могут создавать пользователя одновременно. INSERT ... ON CONFLICT(uuid)
+    # либо создает запись, либо возвращает существующую — без опроса БД и без sleep.
+    db_user = upsert_user(db, uuid, username)
 
-    # если юзера нет в БД — создаем (fallback, если вебхук не пришел)
-    # дополнительно проверим уникальность username
-    logger.info("🔍 Пользователь не найден в БД после всех попыток. Создаем нового пользователя...")
-    
-    # Сохраняем оригинальный username для использования
-    base_username = username
-    
-    # Пытаемся создать пользователя с обработкой ошибок уникальности
-    max_creation_attempts = 3
-    new_user = None
-    
-    for creation_attempt in range(max_creation_attempts):
-        try:
-            # Проверяем, не появился ли пользователь в БД за это время
-            existing = db.query(User).filter(User.uuid == uuid).first()
-            if existing:
-                logger.info(f"✅ Пользователь найден в БД на попытке создания {creation_attempt + 1}")
-                new_user = existing
-                break
-            
-            # Формируем username для текущей попытки
-            current_username = base_username
-            if creation_attempt > 0:
-                # Для повторных попыток добавляем суффикс
-                current_username = f"{base_username}_{user_id}_{creation_attempt}"
-                logger.info(f"Попытка создания с username: {current_username}")
-            else:
-                # Для первой попытки проверяем, не занят ли username
-                if db.query(User).filter(User.username == base_username).first() is not None:
-                    current_username = f"{base_username}_{user_id}"
-                    logger.info(f"Username занят, используем: {current_username}")
-            
-            # Создаем нового пользователя
-            new_user = User(username=current_username, uuid=uuid)
-            db.add(new_user)
-            db.commit()
-            db.refresh(new_user)
-            logger.info(f"✅ Создан новый пользователь: id={new_user.id}, username={new_user.username}, uuid={new_user.uuid}")
-            break
-            
-        except Exception as e:
-            db.rollback()
-            error_str = str(e).lower()
-            
-            # Импортируем IntegrityError для проверки ошибок уникальности
-            from sqlalchemy.exc import IntegrityError
-            
-            # Проверяем, является ли ошибка ошибкой уникальности (uuid или username)
-            if isinstance(e, IntegrityError) or "unique" in error_str or "duplicate" in error_str or "constraint" in error_str:
-                logger.warning(f"⚠️ Ошибка уникальности при создании пользователя (попытка {creation_attempt + 1}): {e}")
-                
-                # Если ошибка по uuid, значит пользователь был создан параллельно (через вебхук)
-                # Пытаемся найти его в БД
-                if "uuid" in error_str or "uuid" in str(e) or (isinstance(e, IntegrityError) and "uuid" in str(e.orig).lower()):
-                    logger.info("🔄 Пользователь был создан параллельно (через вебхук). Ищем в БД...")
-                    # Делаем дополнительную попытку найти пользователя
-                    for retry in range(3):
-                        time.sleep(0.3)
-                        existing = db.query(User).filter(User.uuid == uuid).first()
-                        if existing:
-                            logger.info(f"✅ Пользователь найден в БД после ошибки уникальности (попытка {retry + 1})")
-                            new_user = existing
-                            break
-                    
-                    if new_user:
-                        break
-                
-                # Если ошибка по username, пробуем с другим username
-                if new_user is None and creation_attempt < max_creation_attempts - 1:
-                    logger.info(f"Повторная попытка создания пользователя с другим username...")
-                    continue
-                else:
-                    # Если не удалось создать, пытаемся найти пользователя по uuid
-                    logger.info(f"Ищем пользователя в БД по uuid...")
-                    existing = db.query(User).filter(User.uuid == uuid).first()
-                    if existing:
-                        logger.info(f"✅ Пользователь найден в БД после ошибки уникальности")
-                        new_user = existing
-                        break
-                    else:
-                        # Если это последняя попытка и пользователь не найден, пробуем еще раз
-                        if creation_attempt < max_creation_attempts - 1:
-                            logger.info(f"Пользователь не найден, повторная попытка создания...")
-                            time.sleep(0.5)
-                            continue
-                        else:
-                            logger.error(f"❌ КРИТИЧЕСКАЯ ОШИБКА: Не удалось создать пользователя и найти его в БД после {max_creation_attempts} попыток")
-                            raise HTTPException(
-                                status_code=500, 
-                                detail=f"Не удалось создать или найти пользователя после {max_creation_attempts} попыток. Попробуйте позже."
-                            )
-            else:
-                # Другая ошибка
-                logger.error(f"❌ Ошибка при создании пользователя: {e}")
-                import traceback
-                logger.error(f"Трассировка: {traceback.format_exc()}")
-                if creation_attempt < max_creation_attempts - 1:
-                    logger.info(f"Повторная попытка создания пользователя...")
-                    time.sleep(0.5)
-                    continue
-                else:
-                    raise HTTPException(status_code=500, detail=f"Ошибка при создании пользователя: {str(e)}")
-    
-    # Проверяем, что пользователь был создан или найден
-    if not new_user:
-        logger.error(f"❌ КРИТИЧЕСКАЯ ОШИБКА: Пользователь не был создан и не найден в БД")
-        raise HTTPException(status_code=500, detail="Не удалось создать или найти пользователя")
-    
-    # Обновляем username, если он изменился (используем username_from_user из initData)
-    if username_from_user and new_user.username != username_from_user:
-        try:
-            # Проверяем, не занят ли новый username
-            existing_username = db.query(User).filter(User.username == username_from_user).filter(User.id != new_user.id).first()
-            if not existing_username:
-                new_user.username = username_from_user
-                db.add(new_user)
-                db.commit()
-                db.refresh(new_user)
-                logger.info(f"✅ Обновлен username: {new_user.username}")
-            else:
-                logger.warning(f"⚠️ Username {username_from_user} уже занят, оставляем текущий: {new_user.username}")
-        except Exception as e:
-            logger.warning(f"⚠️ Не удалось обновить username: {e}")
-            db.rollback()
-    
-    # Возвращаем токен для созданного или найденного пользователя
-    token = create_access_token(str(new_user.id))
-    logger.info(f"✅ Авторизация успешна: пользователь id={new_user.id}, username={new_user.username}, uuid={new_user.uuid}")
+    token = create_access_token(str(db_user.id))
+    trace(logger, "✅ Авторизация успешна", user_id=db_user.id, username=db_user.username, uuid=db_user.uuid)
     return Token(access_token=token)
 
 
+@router.post("/refresh", response_model=Token)
+def refresh_token(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)):
+    """
+    Выдает новый токен по действующему или недавно истекшему (в пределах
+    TOKEN_REFRESH_GRACE_MINUTES) токену. Скользящая сессия без разбора initData:
+    полный /auth/webapp-init нужен при первом открытии мини-приложения и после
+    SESSION_MAX_AGE_MINUTES от входа (время входа переносится в новый токен).
+    """
+    try:
+        payload = decode_refreshable_token(token)
+        user_id = int(payload.get("sub"))
+    except (JWTError, TypeError, ValueError) as e:
+        logger.info("[refresh_token] Токен не может быть продлен: %s", e)
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Сессия истекла. Пожалуйста, войдите заново."
+        )
+
+    # Пользователь мог быть удален: проверяем одним запросом по первичному ключу
+    if db.get(User, user_id) is None:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail=f"Пользователь с id={user_id} не найден в базе данных"
+        )
+
+    return Token(access_token=create_access_token(str(user_id), auth_time=payload["auth_time"]))
+
+
 @router.get("/me", response_model=UserOut)
 def get_me(user: User = Depends(get_current_user)):
     """
     Получает данные текущего авторизованного пользователя.
     Используется для получения информации о пользователе после авторизации.
     """
-    # Конвертируем created_at в строку перед возвратом модели
-    # Это необходимо, так как Pydantic v2 с from_attributes=True может не вызывать field_serializer правильно
-    user_dict = {
-        "id": user.id,
-        "username": user.username,
-        "uuid": user.uuid,
-        "created_at": user.created_at.isoformat() if isinstance(user.created_at, datetime) else str(user.created_at)
-    }
-    return UserOut(**user_dict)
+    # created_at приводится к ISO-строке сериализатором UserOut
+    return UserOut.model_validate(user)
 
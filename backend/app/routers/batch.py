@@ -0,0 +1,234 @@
+"""
+Пакетные изменения: POST /api/batch выполняет упорядоченный список операций над заметками,
+задачами, папками и дедлайнами в одной транзакции (один запрос, один commit).
+
+Операции выполняются теми же функциями, что и одиночные эндпоинты crud.py: в режиме пакета
+их commit заменяется на flush (см. crud._commit). Подряд идущие удаления заметок или задач
+и перемещения заметок в одну папку выполняются групповыми запросами.
+Ошибка любой операции откатывает весь пакет; в ответе - индекс операции и описание ошибки.
+"""
+import logging
+from typing import List, Optional
+
+from fastapi import APIRouter, Depends, HTTPException
+from fastapi.exceptions import RequestValidationError
+from pydantic import BaseModel, ValidationError
+from sqlalchemy import delete, select
+from sqlalchemy.orm import Session
+
+from . import crud
+from ..db import get_db
+from ..deps import get_current_user
+from ..models.todo import Deadline, DeadlineNotification, Folder, Note, Task, TodoItem, note_tag, task_tag
+from ..schemas import (
+    BatchOperation,
+    BatchOut,
+    BatchRequest,
+    BatchResult,
+    DeadlineCreate,
+    DeadlineUpdate,
+    FolderCreate,
+    FolderUpdate,
+    NoteCreate,
+    NoteUpdate,
+    TaskCreate,
+    TaskUpdate,
+)
+from ..services.search_service import unindex_notes
+from ..services.tag_service import release_tags_by_item_ids
+from ..services.version_service import ENTITY_DEADLINE, ENTITY_NOTE, OP_DELETE, OP_UPSERT, record_changes
+
+logger = logging.getLogger(__name__)
+router = APIRouter(prefix="/api", tags=["batch"])
+
+# Максимум операций в одном пакете
+BATCH_MAX_OPERATIONS = 200
+
+# (entity, op) -> (схема data, функция одиночного эндпоинта)
+_HANDLERS = {
+    ("note", "create"): (NoteCreate, crud.create_note),
+    ("note", "update"): (NoteUpdate, crud.update_note),
+    ("note", "delete"): (None, crud.delete_note),
+    ("task", "create"): (TaskCreate, crud.create_task),
+    ("task", "update"): (TaskUpdate, crud.update_task),
+    ("task", "delete"): (None, crud.delete_task),
+    ("folder", "create"): (FolderCreate, crud.create_folder),
+    ("folder", "update"): (FolderUpdate, crud.update_folder),
+    ("folder", "delete"): (None, crud.delete_folder),
+    ("deadline", "create"): (DeadlineCreate, crud.create_deadline),
+    ("deadline", "update"): (DeadlineUpdate, crud.update_deadline),
+    ("deadline", "delete"): (None, crud.delete_deadline),
+}
+
+_NOT_FOUND = {"note": "Заметка не найдена", "task": "Задача не найдена"}
+
+
+class BatchOperationError(Exception):
+    def __init__(self, index: int, status_code: int, detail):
+        self.index = index
+        self.status_code = status_code
+        self.detail = detail
+
+
+def _validate(operations: List[BatchOperation]) -> list:
+    """Проверяет все операции до выполнения; возвращает разобранные data (None для delete)."""
+    errors = []
+    payloads = []
+    for index, operation in enumerate(operations):
+        payload = None
+        if operation.op != "create" and operation.id is None:
+            errors.append({
+                "type": "missing",
+                "loc": ("body", "operations", index, "id"),
+                "msg": "id обязателен для update и delete",
+                "input": None,
+            })
+        schema, _ = _HANDLERS[(operation.entity, operation.op)]
+        if schema is not None:
+            try:
+                payload = schema.model_validate(operation.data)
+            except ValidationError as e:
+                for error in e.errors(include_url=False):
+                    errors.append({**error, "loc": ("body", "operations", index, "data", *error["loc"])})
+        payloads.append(payload)
+    if errors:
+        raise RequestValidationError(errors)
+    return payloads
+
+
+def _group_key(operation: BatchOperation, payload) -> Optional[tuple]:
+    """Ключ для объединения подряд идущих операций в групповой запрос (None - выполнять по одной)."""
+    if operation.op == "delete" and operation.entity in ("note", "task"):
+        return (operation.entity, "delete")
+    if operation.entity == "note" and operation.op == "update" and payload.model_fields_set == {"folder_id"}:
+        return ("note", "move", payload.folder_id)
+    return None
+
+
+def _check_found(entity: str, items: list, found_ids: set) -> None:
+    seen = set()
+    for index, item_id in items:
+        if item_id not in found_ids or item_id in seen:
+            raise BatchOperationError(index, 404, _NOT_FOUND[entity])
+        seen.add(item_id)
+
+
+def _delete_many(db: Session, user, entity: str, items: list) -> None:
+    """
+    Удаляет несколько заметок или задач без загрузки объектов: одна выборка id, один
+    сгруппированный запрос для счетчиков тегов и по одному DELETE ... WHERE id IN (...)
+    на каждую таблицу (связи с тегами, пункты todo, дедлайны и их уведомления).
+    """
+    model = Note if entity == "note" else Task
+    ids = [item_id for _, item_id in items]
+    found = {item_id for (item_id,) in db.execute(select(model.id).where(model.id.in_(ids), model.user_id == user.id))}
+    _check_found(entity, items, found)
+    found = list(found)
+
+    release_tags_by_item_ids(db, user.id, found, is_note=model is Note)
+    changes = []
+    if model is Note:
+        deadline_notes = db.execute(select(Deadline.note_id).where(Deadline.note_id.in_(found))).scalars().all()
+        changes += [(ENTITY_NOTE, note_id, OP_DELETE) for note_id in found]
+        changes += [(ENTITY_DEADLINE, note_id, OP_DELETE) for note_id in deadline_notes]
+        if deadline_notes:
+            deadline_ids = select(Deadline.id).where(Deadline.note_id.in_(deadline_notes)).scalar_subquery()
+            db.execute(delete(DeadlineNotification).where(DeadlineNotification.deadline_id.in_(deadline_ids)))
+            db.execute(delete(Deadline).where(Deadline.note_id.in_(deadline_notes)))
+        db.execute(delete(TodoItem).where(TodoItem.note_id.in_(found)))
+        db.execute(delete(note_tag).where(note_tag.c.note_id.in_(found)))
+        unindex_notes(db, found)
+    else:
+        db.execute(delete(task_tag).where(task_tag.c.task_id.in_(found)))
+    db.execute(delete(model).where(model.id.in_(found)))
+    record_changes(db, user.id, changes)
+    db.flush()
+
+
+def _move_notes(db: Session, user, folder_id: Optional[int], items: list) -> None:
+    """Перемещает несколько заметок в одну папку одним UPDATE."""
+    if folder_id is not None:
+        folder_exists = db.query(Folder.id).filter(Folder.id == folder_id, Folder.user_id == user.id).first()
+        if folder_exists is None:
+            raise BatchOperationError(items[0][0], 404, "Папка не найдена")
+    note_ids = [item_id for _, item_id in items]
+    found = {note_id for (note_id,) in db.query(Note.id).filter(Note.id.in_(note_ids), Note.user_id == user.id)}
+    # Повтор одной заметки в группе перемещений не ошибка: результат тот же
+    for index, note_id in items:
+        if note_id not in found:
+            raise BatchOperationError(index, 404, _NOT_FOUND["note"])
+    db.query(Note).filter(Note.id.in_(found)).update({Note.folder_id: folder_id}, synchronize_session="evaluate")
+    record_changes(db, user.id, [(ENTITY_NOTE, note_id, OP_UPSERT) for note_id in found])
+    db.flush()
+
+
+def _run_group(db: Session, user, key: tuple, items: list) -> None:
+    if key[1] == "delete":
+        _delete_many(db, user, key[0], items)
+    else:
+        _move_notes(db, user, key[2], items)
+
+
+def _run_single(db: Session, user, index: int, operation: BatchOperation, payload) -> BatchResult:
+    _, handler = _HANDLERS[(operation.entity, operation.op)]
+    try:
+        if operation.op == "create":
+            result = handler(payload, db=db, user=user)
+        elif operation.op == "update":
+            result = handler(operation.id, payload, db=db, user=user)
+        else:
+            result = handler(operation.id, db=db, user=user)
+    except HTTPException as e:
+        raise BatchOperationError(index, e.status_code, e.detail)
+
+    if not isinstance(result, BaseModel):
+        return BatchResult(index=index, status=200, id=operation.id)
+    # Дедлайны адресуются по note_id
+    result_id = result.note_id if operation.entity == "deadline" else result.id
+    return BatchResult(index=index, status=200, id=result_id, data=result.model_dump())
+
+
+def _execute(db: Session, user, operations: List[BatchOperation], payloads: list) -> List[BatchResult]:
+    results = []
+    position = 0
+    while position < len(operations):
+        key = _group_key(operations[position], payloads[position])
+        end = position + 1
+        if key is not None:
+            while end < len(operations) and _group_key(operations[end], payloads[end]) == key:
+                end += 1
+        if end - position > 1:
+            items = [(index, operations[index].id) for index in range(position, end)]
+            _run_group(db, user, key, items)
+            results.extend(BatchResult(index=index, status=200, id=item_id) for index, item_id in items)
+        else:
+            results.append(_run_single(db, user, position, operations[position], payloads[position]))
+        position = end
+    return results
+
+
+@router.post("/batch", response_model=BatchOut)
+def run_batch(payload: BatchRequest, db: Session = Depends(get_db), user=Depends(get_current_user)):
+    """
+    Выполняет операции по порядку в одной транзакции. data каждой операции - тело
+    соответствующего одиночного запроса, id - идентификатор из его пути.
+    При ошибке ничего не сохраняется: ответ с ее кодом и detail = {"index", "detail"}.
+    """
+    operations = payload.operations
+    if len(operations) > BATCH_MAX_OPERATIONS:
+        raise HTTPException(status_code=400, detail=f"В пакете не больше {BATCH_MAX_OPERATIONS} операций")
+    payloads = _validate(operations)
+    if not operations:
+        return BatchOut(results=[])
+
+    db.info["batch"] = True
+    try:
+        results = _execute(db, user, operations, payloads)
+        db.commit()
+    except BatchOperationError as e:
+        db.rollback()
+        logger.info("Пакет отменен: операция %s завершилась с кодом %s", e.index, e.status_code)
+        raise HTTPException(status_code=e.status_code, detail={"index": e.index, "detail": e.detail})
+    finally:
+        db.info.pop("batch", None)
+    return BatchOut(results=results)
@@ -1,125 +1,242 @@
 from datetime import datetime, timezone
-from typing import List, Set, Tuple
+from typing import Dict, List, Literal, Set, Tuple
 import re
-import hashlib
+import base64
+import binascii
 import json
+import logging
+import time
 
-from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session, joinedload
-from sqlalchemy import delete, insert
+from fastapi import APIRouter, Depends, HTTPException, Query, Response
+from sqlalchemy.orm import Session, joinedload, selectinload
+from sqlalchemy import String, and_, case, delete, exists, func, insert, inspect, literal_column, null, or_, select, tuple_, type_coerce
 
+from ..core.compression import is_compressed_sql, stored_column
+from ..core.logs import trace
+from ..core.responses import list_response, rows_response
 from ..db import get_db
-from ..deps import get_current_user
-from ..models.todo import Task, Note, Tag, Folder, note_tag, task_tag, Deadline, DeadlineNotification
+from ..deps import get_current_user, user_etag
+from ..models.user import User
+from ..models.todo import Task, Note, Tag, TagUsage, Folder, note_tag, task_tag, Deadline, DeadlineNotification
 from ..schemas import (
     TaskCreate,
     TaskOut,
     TaskUpdate,
     NoteCreate,
     NoteOut,
+    NoteSearchOut,
+    NoteSummaryOut,
     NoteUpdate,
     TagOut,
+    TagUsageOut,
     FolderCreate,
     FolderOut,
     FolderUpdate,
     DeadlineCreate,
     DeadlineUpdate,
     DeadlineOut,
+    SyncDeleted,
+    SyncOut,
+)
+from ..models.sync import ChangeLog, UserVersion
+from ..models.user_settings import UserSettings
+from ..services.search_service import index_notes, search_notes as run_note_search, unindex_notes
+from ..services.tag_service import change_tag_usage, release_item_tags, resolve_tag_ids
+from ..services.todo_service import parse_todo_items, sync_todo_items
+from ..services.version_service import (
+    ENTITY_DEADLINE,
+    ENTITY_FOLDER,
+    ENTITY_NOTE,
+    ENTITY_SETTINGS,
+    OP_DELETE,
+    OP_UPSERT,
+    record_changes,
 )
 
 
+logger = logging.getLogger(__name__)
 router = APIRouter(prefix="/api", tags=["crud"])
 
+# Поиск по заметкам: размер страницы по умолчанию и максимум
+NOTES_SEARCH_DEFAULT_LIMIT = 20
+NOTES_SEARCH_MAX_LIMIT = 100
+# Постраничная выдача заметок: размер страницы по умолчанию (если передан только cursor) и максимум
+NOTES_PAGE_DEFAULT_LIMIT = 100
+NOTES_PAGE_MAX_LIMIT = 500
+# Страница списка задач: максимум limit
+TASKS_PAGE_MAX_LIMIT = 500
+# Длина превью заметки в кратком представлении (view=summary)
+NOTE_PREVIEW_LENGTH = 120
+# Фильтр по тегам: максимум id в tag_ids и exclude_tag_ids
+TAG_FILTER_MAX_IDS = 50
+# Хэштег в tags_text: "#Учеба #Math"
+HASHTAG_PATTERN = re.compile(r"#([A-Za-zА-Яа-я0-9_]+)")
+
 
 def _extract_hashtags(text: str | None) -> Set[str]:
     """Извлекает имена тегов из текста с хэштегами"""
     if not text:
         return set()
-    pattern = re.compile(r"#([A-Za-zА-Яа-я0-9_]+)")
-    return {m.group(1).lower() for m in pattern.finditer(text)}
-
-
-def _generate_color(name: str) -> str:
-    """Генерирует цвет на основе имени тега"""
-    hash_obj = hashlib.md5(name.encode())
-    hash_int = int(hash_obj.hexdigest(), 16)
-    colors = [
-        "#FF6B6B", "#4ECDC4", "#45B7D1", "#FFA07A", "#98D8C8",
-        "#F7DC6F", "#BB8FCE", "#85C1E2", "#F8B739", "#52BE80",
-        "#EC7063", "#5DADE2", "#F4D03F", "#82E0AA", "#F1948A",
-        "#7FB3D3", "#F5B041", "#AED6F1", "#A9DFBF", "#F9E79F"
-    ]
-    return colors[hash_int % len(colors)]
+    return {m.group(1).lower() for m in HASHTAG_PATTERN.finditer(text)}
 
 
-def _get_or_create_tags(db: Session, tag_names: Set[str]) -> List[Tag]:
-    """Получает существующие теги или создает новые"""
-    if not tag_names:
-        return []
-    
-    # Получаем существующие теги
-    existing_tags = db.query(Tag).filter(Tag.name.in_(list(tag_names))).all()
-    existing_names = {tag.name for tag in existing_tags}
-    
-    # Создаем новые теги
-    new_tags = []
-    for name in tag_names:
-        if name not in existing_names:
-            tag = Tag(name=name, color=_generate_color(name))
-            db.add(tag)
-            new_tags.append(tag)
-    
-    if new_tags:
-        db.flush()  # Сохраняем новые теги, но не коммитим
-    
-    return existing_tags + new_tags
+def _notes_sort_key(db: Session):
+    """
+    Колонки keyset-сортировки заметок (is_favorite, updated_at, id).
+    На SQLite updated_at сравнивается как хранимая строка: значения записаны в разных форматах
+    (с микросекундами и без), и ORDER BY тоже сравнивает строки.
+    """
+    updated_at = Note.updated_at
+    if db.get_bind().dialect.name == "sqlite":
+        updated_at = type_coerce(Note.updated_at, String)
+    return Note.is_favorite, updated_at, Note.id
+
+
+def _encode_notes_cursor(key) -> str:
+    is_favorite, updated_at, note_id = key
+    if isinstance(updated_at, datetime):
+        updated_at = updated_at.isoformat()
+    raw = json.dumps([int(is_favorite), updated_at, note_id], separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def _decode_notes_cursor(db: Session, cursor: str):
+    """Разбирает непрозрачный курсор в значения (is_favorite, updated_at, id) последней заметки страницы."""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        is_favorite, updated_at, note_id = json.loads(raw)
+        if db.get_bind().dialect.name != "sqlite":
+            updated_at = datetime.fromisoformat(updated_at)
+        return bool(is_favorite), updated_at, int(note_id)
+    except (binascii.Error, ValueError, TypeError):
+        raise HTTPException(status_code=400, detail="Неверный курсор")
+
+
+def _commit(db: Session) -> None:
+    """
+    Фиксирует транзакцию. Внутри POST /api/batch (db.info["batch"]) только сбрасывает изменения
+    и помечает объекты устаревшими, как это делает commit: фиксирует весь пакет сам batch.
+    """
+    if db.info.get("batch"):
+        db.flush()
+        for obj in list(db.identity_map.values()):
+            if not isinstance(obj, User):
+                db.expire(obj)
+    else:
+        db.commit()
+
+
+def _current_item_tags(db: Session, item, association_table, id_column: str, item_id: int) -> Dict[str, int]:
+    """Текущие теги задачи или заметки {имя: id}: из загруженной коллекции item.tags или одним запросом."""
+    if "tags" not in inspect(item).unloaded:
+        return {tag.name: tag.id for tag in item.tags}
+    return dict(db.execute(
+        select(Tag.name, Tag.id)
+        .join(association_table, association_table.c.tag_id == Tag.id)
+        .where(association_table.c[id_column] == item_id)
+    ).all())
 
 
 def _update_tags_for_item(db: Session, item, tag_names: Set[str], item_id: int, is_note: bool = False):
-    """Обновляет теги для задачи или заметки через прямой SQL"""
-    # Получаем или создаем теги
-    tags = _get_or_create_tags(db, tag_names)
-    
-    # Определяем промежуточную таблицу
+    """
+    Приводит теги задачи или заметки к набору tag_names через прямой SQL: удаляются и добавляются
+    только отличающиеся связи. Если набор не изменился (автосохранение с тем же tags_text),
+    ничего не пишется. Счетчики tag_usage меняются на ту же разницу.
+    """
     association_table = note_tag if is_note else task_tag
     id_column = "note_id" if is_note else "task_id"
-    
-    # Удаляем все существующие связи
-    db.execute(delete(association_table).where(association_table.c[id_column] == item_id))
-    
-    # Добавляем новые связи
-    if tags:
-        values = [{id_column: item_id, "tag_id": tag.id} for tag in tags]
-        db.execute(insert(association_table).values(values))
-    
-    db.flush()
+
+    current = _current_item_tags(db, item, association_table, id_column, item_id)
+    removed = [tag_id for name, tag_id in current.items() if name not in tag_names]
+    added = tag_names - current.keys()
+
+    if removed:
+        db.execute(delete(association_table).where(
+            association_table.c[id_column] == item_id,
+            association_table.c.tag_id.in_(removed),
+        ))
+    usage = {tag_id: -1 for tag_id in removed}
+    if added:
+        tag_ids = resolve_tag_ids(db, added)
+        db.execute(insert(association_table).values([{id_column: item_id, "tag_id": tag_id} for tag_id in tag_ids.values()]))
+        usage.update((tag_id, 1) for tag_id in tag_ids.values())
+    change_tag_usage(db, item.user_id, usage, is_note)
+
+
+def _tag_filters(
+    item_id_column,
+    association_table,
+    id_column: str,
+    tag_id: int | None,
+    tag_ids: List[int] | None,
+    mode: str,
+    exclude_tag_ids: List[int] | None,
+) -> list:
+    """
+    Условия фильтра задач или заметок по тегам для query.filter(*...).
+    tag_id - прежний фильтр по одному тегу; mode=any - есть хотя бы один из tag_ids, mode=all -
+    есть все (GROUP BY ... HAVING count); exclude_tag_ids - нет ни одного из них.
+    Подзапросы читают только индекс (tag_id, <id сущности>).
+    """
+    linked = association_table.c[id_column]
+    conditions = []
+    if tag_id is not None:
+        conditions.append(item_id_column.in_(select(linked).where(association_table.c.tag_id == tag_id)))
+    tag_ids = set(tag_ids or ())
+    if tag_ids:
+        tagged = select(linked).where(association_table.c.tag_id.in_(tag_ids))
+        if mode == "all" and len(tag_ids) > 1:
+            tagged = tagged.group_by(linked).having(func.count() == len(tag_ids))
+        conditions.append(item_id_column.in_(tagged))
+    if exclude_tag_ids:
+        conditions.append(item_id_column.not_in(
+            select(linked).where(association_table.c.tag_id.in_(set(exclude_tag_ids)))
+        ))
+    return conditions
 
 
 # Tags
-@router.get("/tags", response_model=List[TagOut])
-def list_tags(db: Session = Depends(get_db), user=Depends(get_current_user)):
-    return db.query(Tag).order_by(Tag.name.asc()).all()
+@router.get("/tags", response_model=List[TagUsageOut], dependencies=[user_etag()])
+def list_tags(response: Response, db: Session = Depends(get_db), user=Depends(get_current_user)):
+    """Теги пользователя (есть хотя бы у одной его заметки или задачи) со счетчиками, по имени."""
+    rows = (
+        db.query(Tag.name, Tag.id, Tag.color, TagUsage.note_count, TagUsage.task_count, TagUsage.last_used_at)
+        .join(TagUsage, TagUsage.tag_id == Tag.id)
+        .filter(TagUsage.user_id == user.id)
+        .order_by(Tag.name.asc())
+        .all()
+    )
+    return rows_response([row._asdict() for row in rows], response)
 
 
 # Tasks
 @router.get("/tasks", response_model=List[TaskOut])
-def list_tasks(tag_id: int | None = None, db: Session = Depends(get_db), user=Depends(get_current_user)):
-    query = db.query(Task).options(joinedload(Task.tags)).filter(
-        Task.user_id == user.id
+def list_tasks(
+    response: Response,
+    tag_id: int | None = None,
+    tag_ids: List[int] | None = Query(default=None, max_length=TAG_FILTER_MAX_IDS),
+    mode: Literal["all", "any"] = "all",
+    exclude_tag_ids: List[int] | None = Query(default=None, max_length=TAG_FILTER_MAX_IDS),
+    limit: int | None = Query(default=None, ge=1, le=TASKS_PAGE_MAX_LIMIT),
+    offset: int = Query(default=0, ge=0),
+    db: Session = Depends(get_db),
+    user=Depends(get_current_user),
+):
+    """
+    Задачи пользователя, новые первыми. Фильтр по тегам: tag_ids (mode=all - все теги,
+    any - любой из них) и exclude_tag_ids. Без limit возвращаются все задачи (как раньше);
+    с limit - страница, следующая запрашивается с offset + limit.
+    """
+    # selectinload: теги страницы - отдельный запрос по первичному ключу task_tag
+    # (joinedload с LIMIT соединяет task_tag с tags целиком)
+    query = db.query(Task).options(selectinload(Task.tags)).filter(
+        Task.user_id == user.id,
+        *_tag_filters(Task.id, task_tag, "task_id", tag_id, tag_ids, mode, exclude_tag_ids),
     )
-    
-    # Фильтр по тегу
-    if tag_id is not None:
-        # Используем exists для более надежной фильтрации
-        from sqlalchemy import exists
-        query = query.filter(
-            exists().where(
-                (task_tag.c.task_id == Task.id) & 
-                (task_tag.c.tag_id == tag_id)
-            )
-        )
-    
-    tasks = query.order_by(Task.created_at.desc()).all()
+    query = query.order_by(Task.created_at.desc(), Task.id.desc())
+    if limit is not None:
+        query = query.limit(limit).offset(offset)
+    tasks = query.all()
     
     result = []
     for t in tasks:
@@ -133,7 +250,7 @@ def list_tasks(tag_id: int | None = None, db: Session = Depends(get_db), user=De
             is_completed=t.is_completed,
             tags=tags_list
         ))
-    return result
+    return list_response(TaskOut, result, response)
 
 
 @router.post("/tasks", response_model=TaskOut)
@@ -155,7 +272,8 @@ def create_task(payload: TaskCreate, db: Session = Depends(get_db), user=Depends
         tag_names = _extract_hashtags(payload.tags_text)
         _update_tags_for_item(db, task, tag_names, task_id, is_note=False)
     
-    db.commit()
+    record_changes(db, user.id)
+    _commit(db)
     
     # Перезагружаем с тегами
     task = db.query(Task).options(joinedload(Task.tags)).filter(Task.id == task_id).first()
@@ -196,7 +314,8 @@ def update_task(task_id: int, payload: TaskUpdate, db: Session = Depends(get_db)
         tag_names = _extract_hashtags(payload.tags_text)
         _update_tags_for_item(db, task, tag_names, task_id, is_note=False)
     
-    db.commit()
+    record_changes(db, user.id)
+    _commit(db)
     
     # Перезагружаем с тегами
     task = db.query(Task).options(joinedload(Task.tags)).filter(Task.id == task_id).first()
@@ -217,8 +336,10 @@ def delete_task(task_id: int, db: Session = Depends(get_db), user=Depends(get_cu
     task = db.get(Task, task_id)
     if task is None or task.user_id != user.id:
         raise HTTPException(status_code=404, detail="Задача не найдена")
+    release_item_tags(db, user.id, [task], is_note=False)
     db.delete(task)
-    db.commit()
+    record_changes(db, user.id)
+    _commit(db)
     return {"ok": True}
 
 
@@ -245,9 +366,10 @@ def _get_or_create_default_folder(db: Session, user_id: int, commit_if_new: bool
             db.add(default_folder)
             db.flush()  # Используем flush вместо commit, чтобы не нарушать транзакцию
             db.refresh(default_folder)
+            record_changes(db, user_id, [(ENTITY_FOLDER, default_folder.id, OP_UPSERT)])
             was_created = True
             if commit_if_new:
-                db.commit()
+                _commit(db)
         
         if default_folder is None:
             raise ValueError(f"Не удалось создать или получить папку 'Все' для пользователя {user_id}")
@@ -260,8 +382,8 @@ def _get_or_create_default_folder(db: Session, user_id: int, commit_if_new: bool
         raise
 
 
-@router.get("/folders", response_model=List[FolderOut])
-def list_folders(db: Session = Depends(get_db), user=Depends(get_current_user)):
+@router.get("/folders", response_model=List[FolderOut], dependencies=[user_etag()])
+def list_folders(response: Response, db: Session = Depends(get_db), user=Depends(get_current_user)):
     # Убеждаемся что папка "Все" существует
     _, was_created = _get_or_create_default_folder(db, user.id, commit_if_new=True)
     
@@ -275,9 +397,9 @@ def list_folders(db: Session = Depends(get_db), user=Depends(get_current_user)):
             id=f.id,
             name=f.name,
             is_default=f.is_default,
-            created_at=f.created_at.isoformat() if f.created_at else ""
+            created_at=f.created_at
         ))
-    return result
+    return list_response(FolderOut, result, response)
 
 
 @router.post("/folders", response_model=FolderOut)
@@ -289,14 +411,16 @@ def create_folder(payload: FolderCreate, db: Session = Depends(get_db), user=Dep
     )
     
     db.add(folder)
-    db.commit()
+    db.flush()
+    record_changes(db, user.id, [(ENTITY_FOLDER, folder.id, OP_UPSERT)])
+    _commit(db)
     db.refresh(folder)
     
     return FolderOut(
         id=folder.id,
         name=folder.name,
         is_default=folder.is_default,
-        created_at=folder.created_at.isoformat() if folder.created_at else ""
+        created_at=folder.created_at
     )
 
 
@@ -316,14 +440,15 @@ def update_folder(folder_id: int, payload: FolderUpdate, db: Session = Depends(g
     if payload.name is not None:
         folder.name = payload.name
     
-    db.commit()
+    record_changes(db, user.id, [(ENTITY_FOLDER, folder.id, OP_UPSERT)])
+    _commit(db)
     db.refresh(folder)
     
     return FolderOut(
         id=folder.id,
         name=folder.name,
         is_default=folder.is_default,
-        created_at=folder.created_at.isoformat() if folder.created_at else ""
+        created_at=folder.created_at
     )
 
 
@@ -342,111 +467,285 @@ def delete_folder(folder_id: int, db: Session = Depends(get_db), user=Depends(ge
     
     # Перемещаем заметки из удаляемой папки в папку "Все"
     default_folder, _ = _get_or_create_default_folder(db, user.id, commit_if_new=True)
+    moved_note_ids = [note_id for (note_id,) in db.query(Note.id).filter(Note.folder_id == folder_id)]
     db.query(Note).filter(Note.folder_id == folder_id).update({Note.folder_id: default_folder.id})
     
     db.delete(folder)
-    db.commit()
+    record_changes(
+        db,
+        user.id,
+        [(ENTITY_FOLDER, folder_id, OP_DELETE)] + [(ENTITY_NOTE, note_id, OP_UPSERT) for note_id in moved_note_ids],
+    )
+    _commit(db)
     return {"ok": True}
 
 
 # Notes
-@router.get("/notes", response_model=List[NoteOut])
-def list_notes(folder_id: int | None = None, tag_id: int | None = None, db: Session = Depends(get_db), user=Depends(get_current_user)):
-    try:
-        query = db.query(Note).options(joinedload(Note.tags)).filter(
-            Note.user_id == user.id
+def _filter_notes(query, db: Session, user, folder_id: int | None, tag_filters: list):
+    """
+    Фильтры списка заметок для запроса по Note или по его колонкам: пользователь, папка
+    и условия по тегам (_tag_filters).
+    """
+    query = query.filter(Note.user_id == user.id)
+
+    # Если folder_id указан, проверяем, является ли это папкой "Все"
+    # Если это папка "Все" (is_default=True), показываем все заметки пользователя
+    # Иначе фильтруем по папке
+    if folder_id is not None:
+        folder = db.query(Folder).filter(
+            Folder.id == folder_id,
+            Folder.user_id == user.id
+        ).first()
+
+        # Если папка существует и это не папка "Все", фильтруем по папке
+        # Если это папка "Все" (is_default=True), не фильтруем - показываем все заметки
+        if folder and not folder.is_default:
+            query = query.filter(Note.folder_id == folder_id)
+        # Если folder не найдена или это папка "Все", не фильтруем по folder_id
+
+    if tag_filters:
+        query = query.filter(*tag_filters)
+    return query
+
+
+def _paginate_notes(query, db: Session, after, limit: int | None, response: Response) -> list:
+    """Сортировка и keyset-страница списка заметок; курсор следующей страницы - в X-Next-Cursor."""
+    if after is not None:
+        query = query.filter(tuple_(*_notes_sort_key(db)) < tuple_(*after))
+
+    # Сортируем: сначала избранные (только одна), потом по дате обновления; id - для однозначности
+    query = query.order_by(Note.is_favorite.desc(), Note.updated_at.desc(), Note.id.desc())
+    page_size = limit or (NOTES_PAGE_DEFAULT_LIMIT if after is not None else None)
+    if page_size is None:
+        return query.all()
+
+    rows = query.limit(page_size + 1).all()
+    if len(rows) > page_size:
+        rows = rows[:page_size]
+        last_key = db.query(*_notes_sort_key(db)).filter(Note.id == rows[-1].id).one()
+        response.headers["X-Next-Cursor"] = _encode_notes_cursor(last_key)
+    return rows
+
+
+def _note_summary_columns(db: Session):
+    """
+    Колонки краткого представления заметки, вычисляемые в БД: превью и прогресс todo.
+    На SQLite используется JSON1, и content в Python не загружается. Сжатый content
+    (core/compression.py) SQL-функциям недоступен: он возвращается колонкой summary_content
+    и разбирается в Python (_summary_from_content).
+    На других СУБД в SQL считается только превью обычного текста; content, который может
+    быть JSON (начинается с "{"), тоже разбирается в Python: приведение невалидного JSON
+    к jsonb в PostgreSQL прервало бы весь запрос.
+    """
+    content = stored_column(Note.content)
+    if db.get_bind().dialect.name != "sqlite":
+        maybe_json = func.ltrim(content).like("{%")
+        return (
+            func.substr(content, 1, NOTE_PREVIEW_LENGTH).label("preview"),
+            null().label("todo_total"),
+            null().label("todo_completed"),
+            case((or_(is_compressed_sql(Note.content), maybe_json), Note.content)).label("summary_content"),
         )
-        
-        # Если folder_id указан, проверяем, является ли это папкой "Все"
-        # Если это папка "Все" (is_default=True), показываем все заметки пользователя
-        # Иначе фильтруем по папке
-        if folder_id is not None:
-            folder = db.query(Folder).filter(
-                Folder.id == folder_id,
-                Folder.user_id == user.id
-            ).first()
-            
-            # Если папка существует и это не папка "Все", фильтруем по папке
-            # Если это папка "Все" (is_default=True), не фильтруем - показываем все заметки
-            if folder and not folder.is_default:
-                query = query.filter(Note.folder_id == folder_id)
-            # Если folder не найдена или это папка "Все", не фильтруем по folder_id
-        
-        # Фильтр по тегу
-        if tag_id is not None:
-            # Используем exists для более надежной фильтрации
-            from sqlalchemy import exists
-            query = query.filter(
-                exists().where(
-                    (note_tag.c.note_id == Note.id) & 
-                    (note_tag.c.tag_id == tag_id)
-                )
-            )
-        
-        # Сортируем: сначала избранные (только одна), потом по дате обновления
-        notes = query.order_by(Note.is_favorite.desc(), Note.updated_at.desc()).all()
-        
-        # Получаем все дедлайны с включенными уведомлениями для заметок пользователя
-        note_ids = [n.id for n in notes]
-        deadlines_with_notifications = {}
-        if note_ids:
-            deadlines = db.query(Deadline).filter(
-                Deadline.note_id.in_(note_ids),
-                Deadline.notification_enabled == True
-            ).all()
-            for deadline in deadlines:
-                deadlines_with_notifications[deadline.note_id] = True
-        
-        result = []
-        for n in notes:
-            try:
-                # Явно преобразуем теги, обрабатывая возможные ошибки
-                tags_list = []
-                if n.tags:
-                    for tag in n.tags:
-                        try:
-                            tags_list.append(TagOut(id=tag.id, name=tag.name, color=tag.color))
-                        except Exception as tag_error:
-                            print(f"Error processing tag {tag.id}: {tag_error}")
-                            continue
-                
-                # Проверяем, есть ли у заметки дедлайн с включенными уведомлениями
-                has_deadline_notifications = deadlines_with_notifications.get(n.id, False)
-                
-                result.append(NoteOut(
-                    id=n.id,
-                    title=n.title,
-                    content=n.content,
-                    folder_id=n.folder_id,
-                    is_favorite=n.is_favorite if hasattr(n, 'is_favorite') else False,
-                    tags=tags_list,
-                    has_deadline_notifications=has_deadline_notifications
-                ))
-            except Exception as note_error:
-                print(f"Error processing note {n.id}: {note_error}")
-                import traceback
-                traceback.print_exc()
-                continue
-        
-        return result
-    except Exception as e:
-        import traceback
-        print(f"Error in list_notes: {e}")
-        print(traceback.format_exc())
-        raise HTTPException(status_code=500, detail=f"Ошибка при получении заметок: {str(e)}")
+    summary_content = case((is_compressed_sql(Note.content), Note.content)).label("summary_content")
+
+    is_todo = and_(func.json_valid(content) == 1, func.json_extract(content, "$.type") == "todo")
+    items = func.json_each(content, "$.items").table_valued("value").alias("items")
+    first_items = (
+        select(items.c.value)
+        .where(func.trim(func.coalesce(func.json_extract(items.c.value, "$.text"), "")) != "")
+        .limit(3)
+        .subquery("first_items")
+    )
+    todo_preview = (
+        select(func.group_concat(func.json_extract(first_items.c.value, "$.text"), ", "))
+        .scalar_subquery()
+    )
+    todo_total = select(func.count()).select_from(items).scalar_subquery()
+    todo_completed = (
+        select(func.count())
+        .select_from(items)
+        .where(func.json_extract(items.c.value, "$.completed") == 1)
+        .scalar_subquery()
+    )
+    return (
+        case(
+            (is_todo, func.substr(func.coalesce(todo_preview, ""), 1, NOTE_PREVIEW_LENGTH)),
+            else_=func.substr(content, 1, NOTE_PREVIEW_LENGTH),
+        ).label("preview"),
+        case((is_todo, todo_total)).label("todo_total"),
+        case((is_todo, todo_completed)).label("todo_completed"),
+        summary_content,
+    )
+
+
+def _summary_from_content(content: str) -> dict:
+    """Превью и прогресс todo в Python - то же, что _note_summary_columns вычисляет в SQLite."""
+    items = parse_todo_items(content)
+    if items is None:
+        return {"preview": content[:NOTE_PREVIEW_LENGTH], "todo_total": None, "todo_completed": None}
+    texts = [
+        str(item.get("text") or "") for item in items
+        if isinstance(item, dict) and str(item.get("text") or "").strip()
+    ]
+    return {
+        "preview": ", ".join(texts[:3])[:NOTE_PREVIEW_LENGTH],
+        "todo_total": len(items),
+        "todo_completed": sum(1 for item in items if isinstance(item, dict) and item.get("completed") == 1),
+    }
+
+
+def _note_tags_column(db: Session):
+    """Теги заметки одним JSON-массивом [{id, name, color}] - коррелированный подзапрос вместо joinedload."""
+    if db.get_bind().dialect.name == "postgresql":
+        tags = func.coalesce(
+            func.json_agg(func.json_build_object("id", Tag.id, "name", Tag.name, "color", Tag.color)),
+            literal_column("'[]'::json"),
+        )
+    else:
+        tags = func.json_group_array(func.json_object("id", Tag.id, "name", Tag.name, "color", Tag.color))
+    return (
+        select(tags)
+        .select_from(note_tag.join(Tag, Tag.id == note_tag.c.tag_id))
+        .where(note_tag.c.note_id == Note.id)
+        .scalar_subquery()
+        .label("tags")
+    )
+
+
+def _has_deadline_notifications_column():
+    return exists().where(
+        Deadline.note_id == Note.id,
+        Deadline.notification_enabled == True
+    ).label("has_deadline_notifications")
+
+
+def _parse_tags(value) -> list:
+    # SQLite отдает JSON строкой, PostgreSQL - уже разобранным
+    if isinstance(value, str):
+        return json.loads(value)
+    return value or []
+
+
+def _list_note_rows(db: Session, user, folder_id, tag_filters, after, limit, response: Response) -> list:
+    """Полные заметки одним запросом: колонки заметки, теги JSON-агрегатом и флаг дедлайна через EXISTS."""
+    query = db.query(
+        Note.id,
+        Note.title,
+        Note.content,
+        Note.folder_id,
+        Note.is_favorite,
+        Note.version,
+        _note_tags_column(db),
+        _has_deadline_notifications_column(),
+    )
+    rows = _paginate_notes(_filter_notes(query, db, user, folder_id, tag_filters), db, after, limit, response)
+    return [
+        {
+            "id": row.id,
+            "title": row.title,
+            "content": row.content,
+            "folder_id": row.folder_id,
+            "is_favorite": bool(row.is_favorite),
+            "tags": _parse_tags(row.tags),
+            "has_deadline_notifications": bool(row.has_deadline_notifications),
+            "version": row.version,
+        }
+        for row in rows
+    ]
+
+
+def _list_note_summaries(db: Session, user, folder_id, tag_filters, after, limit, response: Response) -> list:
+    """Краткий список заметок тем же одним запросом, но с превью и прогрессом todo вместо content."""
+    query = db.query(
+        Note.id,
+        Note.title,
+        Note.folder_id,
+        Note.is_favorite,
+        _note_tags_column(db),
+        _has_deadline_notifications_column(),
+        *_note_summary_columns(db),
+    )
+    rows = _paginate_notes(_filter_notes(query, db, user, folder_id, tag_filters), db, after, limit, response)
+    return [
+        {
+            "id": row.id,
+            "title": row.title,
+            "folder_id": row.folder_id,
+            "is_favorite": bool(row.is_favorite),
+            "tags": _parse_tags(row.tags),
+            "has_deadline_notifications": bool(row.has_deadline_notifications),
+            **(
+                _summary_from_content(row.summary_content) if row.summary_content is not None else {
+                    "preview": row.preview or "",
+                    "todo_total": row.todo_total,
+                    "todo_completed": row.todo_completed,
+                }
+            ),
+        }
+        for row in rows
+    ]
+
+
+@router.get("/notes", response_model=List[NoteOut] | List[NoteSummaryOut], dependencies=[user_etag()])
+def list_notes(
+    response: Response,
+    folder_id: int | None = None,
+    tag_id: int | None = None,
+    tag_ids: List[int] | None = Query(default=None, max_length=TAG_FILTER_MAX_IDS),
+    mode: Literal["all", "any"] = "all",
+    exclude_tag_ids: List[int] | None = Query(default=None, max_length=TAG_FILTER_MAX_IDS),
+    limit: int | None = Query(default=None, ge=1, le=NOTES_PAGE_MAX_LIMIT),
+    cursor: str | None = None,
+    view: Literal["full", "summary"] = "full",
+    db: Session = Depends(get_db),
+    user=Depends(get_current_user),
+):
+    """
+    Заметки пользователя. Без limit и cursor возвращаются все заметки (как раньше).
+    С limit выдача постраничная по (is_favorite, updated_at, id): если есть следующая
+    страница, курсор для нее приходит в заголовке X-Next-Cursor.
+
+    Фильтр по тегам: tag_ids=1&tag_ids=2 с mode=all (заметки со всеми тегами) или mode=any
+    (хотя бы с одним), exclude_tag_ids - без этих тегов. tag_id - прежний фильтр по одному тегу.
+
+    view=summary - краткое представление для списков: без content, с превью и прогрессом todo.
+    """
+    after = _decode_notes_cursor(db, cursor) if cursor else None
+    tag_filters = _tag_filters(Note.id, note_tag, "note_id", tag_id, tag_ids, mode, exclude_tag_ids)
+    if view == "summary":
+        rows = _list_note_summaries(db, user, folder_id, tag_filters, after, limit, response)
+    else:
+        rows = _list_note_rows(db, user, folder_id, tag_filters, after, limit, response)
+    return rows_response(rows, response)
+
+
+@router.get("/notes/search", response_model=NoteSearchOut, dependencies=[user_etag()])
+def search_notes(
+    q: str = Query(min_length=1, max_length=200),
+    folder_id: int | None = None,
+    limit: int = Query(default=NOTES_SEARCH_DEFAULT_LIMIT, ge=1, le=NOTES_SEARCH_MAX_LIMIT),
+    offset: int = Query(default=0, ge=0),
+    db: Session = Depends(get_db),
+    user=Depends(get_current_user),
+):
+    """
+    Полнотекстовый поиск по заголовку и тексту заметок (включая пункты todo).
+    Результаты упорядочены по релевантности; следующая страница - offset=next_offset.
+    """
+    hits, has_more = run_note_search(db, user.id, q, folder_id=folder_id, limit=limit, offset=offset)
+    return NoteSearchOut(items=hits, next_offset=offset + limit if has_more else None)
 
 
 @router.post("/notes", response_model=NoteOut)
 def create_note(payload: NoteCreate, db: Session = Depends(get_db), user=Depends(get_current_user)):
     try:
-        print(f"Creating note for user {user.id}, payload: {payload}")
+        trace(logger, "Creating note", user_id=user.id, folder_id=payload.folder_id)
         
         # Если folder_id не указан, используем папку "Все"
         folder_id = payload.folder_id
         if folder_id is None:
             default_folder, _ = _get_or_create_default_folder(db, user.id)
             folder_id = default_folder.id
-            print(f"Using default folder with id: {folder_id}")
         else:
             # Проверяем, что папка существует и принадлежит пользователю
             folder = db.query(Folder).filter(
@@ -455,7 +754,6 @@ def create_note(payload: NoteCreate, db: Session = Depends(get_db), user=Depends
             ).first()
             if folder is None:
                 raise HTTPException(status_code=404, detail="Папка не найдена")
-            print(f"Using folder with id: {folder_id}")
         
         note = Note(
             user_id=user.id,
@@ -467,15 +765,16 @@ def create_note(payload: NoteCreate, db: Session = Depends(get_db), user=Depends
         db.add(note)
         db.flush()  # Сохраняем заметку чтобы получить ID
         note_id = note.id
-        print(f"Note created with id: {note_id}")
         
         # Обрабатываем теги ПОСЛЕ добавления заметки в сессию
         if payload.tags_text:
             tag_names = _extract_hashtags(payload.tags_text)
             _update_tags_for_item(db, note, tag_names, note_id, is_note=True)
         
-        db.commit()
-        print(f"Note committed, reloading...")
+        index_notes(db, [note])
+        sync_todo_items(db, note_id, user.id, note.content)
+        record_changes(db, user.id, [(ENTITY_NOTE, note_id, OP_UPSERT)])
+        _commit(db)
         
         # Перезагружаем с тегами
         note = db.query(Note).options(joinedload(Note.tags)).filter(Note.id == note_id).first()
@@ -499,9 +798,10 @@ def create_note(payload: NoteCreate, db: Session = Depends(get_db), user=Depends
             folder_id=note.folder_id,
             is_favorite=note.is_favorite if hasattr(note, 'is_favorite') else False,
             tags=tags_list,
-            has_deadline_notifications=has_deadline_notifications
+            has_deadline_notifications=has_deadline_notifications,
+            version=note.version
         )
-        print(f"Note created successfully: {result.id}")
+        trace(logger, "Note created", note_id=result.id)
         return result
     except HTTPException:
         raise
@@ -539,7 +839,14 @@ def update_note(note_id: int, payload: NoteUpdate, db: Session = Depends(get_db)
         tag_names = _extract_hashtags(payload_dict['tags_text'] or '')
         _update_tags_for_item(db, note, tag_names, note_id, is_note=True)
     
-    db.commit()
+    if 'title' in payload_dict or 'content' in payload_dict:
+        # Версия документа заметки: по ней проверяются поэлементные изменения todo (todo_items.py)
+        note.version = Note.version + 1
+        index_notes(db, [note])
+    if 'content' in payload_dict:
+        sync_todo_items(db, note_id, user.id, payload_dict['content'])
+    record_changes(db, user.id, [(ENTITY_NOTE, note_id, OP_UPSERT)])
+    _commit(db)
     
     # Перезагружаем с тегами
     note = db.query(Note).options(joinedload(Note.tags)).filter(Note.id == note_id).first()
@@ -560,7 +867,8 @@ def update_note(note_id: int, payload: NoteUpdate, db: Session = Depends(get_db)
         folder_id=note.folder_id,
         is_favorite=note.is_favorite if hasattr(note, 'is_favorite') else False,
         tags=tags_list,
-        has_deadline_notifications=has_deadline_notifications
+        has_deadline_notifications=has_deadline_notifications,
+        version=note.version
     )
 
 
@@ -576,6 +884,7 @@ def toggle_favorite_note(note_id: int, db: Session = Depends(get_db), user=Depen
     if note is None:
         raise HTTPException(status_code=404, detail="Заметка не найдена")
     
+    changed_note_ids = [note_id]
     # Если заметка уже в избранном, просто снимаем её
     if note.is_favorite:
         note.is_favorite = False
@@ -588,6 +897,10 @@ def toggle_favorite_note(note_id: int, db: Session = Depends(get_db), user=Depen
         note.updated_at = note.created_at + timedelta(seconds=1)
     else:
         # Снимаем избранное со всех других заметок пользователя
+        changed_note_ids += [other_id for (other_id,) in db.query(Note.id).filter(
+            Note.user_id == user.id,
+            Note.is_favorite == True
+        )]
         db.query(Note).filter(
             Note.user_id == user.id,
             Note.is_favorite == True
@@ -597,7 +910,8 @@ def toggle_favorite_note(note_id: int, db: Session = Depends(get_db), user=Depen
         # При установке в избранное НЕ обновляем updated_at,
         # чтобы заметка сохраняла свою позицию
     
-    db.commit()
+    record_changes(db, user.id, [(ENTITY_NOTE, changed_id, OP_UPSERT) for changed_id in changed_note_ids])
+    _commit(db)
     
     # Перезагружаем с тегами для ответа
     note = db.query(Note).options(joinedload(Note.tags)).filter(Note.id == note_id).first()
@@ -617,11 +931,12 @@ def toggle_favorite_note(note_id: int, db: Session = Depends(get_db), user=Depen
         folder_id=note.folder_id,
         is_favorite=note.is_favorite,
         tags=tags_list,
-        has_deadline_notifications=has_deadline_notifications
+        has_deadline_notifications=has_deadline_notifications,
+        version=note.version
     )
 
 
-@router.get("/notes/favorite", response_model=NoteOut | None)
+@router.get("/notes/favorite", response_model=NoteOut | None, dependencies=[user_etag()])
 def get_favorite_note(db: Session = Depends(get_db), user=Depends(get_current_user)):
     """Получает избранную заметку пользователя"""
     note = db.query(Note).options(joinedload(Note.tags)).filter(
@@ -648,7 +963,8 @@ def get_favorite_note(db: Session = Depends(get_db), user=Depends(get_current_us
         folder_id=note.folder_id,
         is_favorite=note.is_favorite,
         tags=tags_list,
-        has_deadline_notifications=has_deadline_notifications
+        has_deadline_notifications=has_deadline_notifications,
+        version=note.version
     )
 
 
@@ -657,8 +973,15 @@ def delete_note(note_id: int, db: Session = Depends(get_db), user=Depends(get_cu
     note = db.get(Note, note_id)
     if note is None or note.user_id != user.id:
         raise HTTPException(status_code=404, detail="Заметка не найдена")
+    changes = [(ENTITY_NOTE, note_id, OP_DELETE)]
+    if note.deadline is not None:
+        # Дедлайн удаляется вместе с заметкой (cascade)
+        changes.append((ENTITY_DEADLINE, note_id, OP_DELETE))
+    release_item_tags(db, user.id, [note], is_note=True)
     db.delete(note)
-    db.commit()
+    unindex_notes(db, [note_id])
+    record_changes(db, user.id, changes)
+    _commit(db)
     return {"ok": True}
 
 
@@ -771,7 +1094,9 @@ def create_deadline(payload: DeadlineCreate, db: Session = Depends(get_db), user
     )
     
     db.add(deadline)
-    db.commit()
+    # has_deadline_notifications заметки зависит от дедлайна, поэтому заметка тоже считается измененной
+    record_changes(db, user.id, [(ENTITY_DEADLINE, payload.note_id, OP_UPSERT), (ENTITY_NOTE, payload.note_id, OP_UPSERT)])
+    _commit(db)
     db.refresh(deadline)
     
     # Вычисляем информацию о дедлайне
@@ -788,8 +1113,13 @@ def create_deadline(payload: DeadlineCreate, db: Session = Depends(get_db), user
     )
 
 
-@router.get("/deadlines", response_model=List[DeadlineOut])
-def get_all_deadlines(db: Session = Depends(get_db), user=Depends(get_current_user)):
+def _deadlines_etag_part(db: Session) -> str:
+    # days_remaining, status и time_remaining_text зависят от текущего времени: ETag меняется раз в минуту
+    return f"m{int(time.time() // 60)}"
+
+
+@router.get("/deadlines", response_model=List[DeadlineOut], dependencies=[user_etag(_deadlines_etag_part)])
+def get_all_deadlines(response: Response, db: Session = Depends(get_db), user=Depends(get_current_user)):
     """Получает все дедлайны пользователя."""
     # Получаем все дедлайны пользователя
     deadlines = db.query(Deadline).filter(Deadline.user_id == user.id).all()
@@ -808,10 +1138,10 @@ def get_all_deadlines(db: Session = Depends(get_db), user=Depends(get_current_us
             time_remaining_text=info["time_remaining_text"]
         ))
     
-    return result
+    return list_response(DeadlineOut, result, response)
 
 
-@router.get("/deadlines/{note_id}", response_model=DeadlineOut)
+@router.get("/deadlines/{note_id}", response_model=DeadlineOut, dependencies=[user_etag(_deadlines_etag_part)])
 def get_deadline(note_id: int, db: Session = Depends(get_db), user=Depends(get_current_user)):
     """Получает дедлайн для заметки."""
     # Проверяем, что заметка существует и принадлежит пользователю
@@ -911,7 +1241,8 @@ def update_deadline(note_id: int, payload: DeadlineUpdate, db: Session = Depends
                 DeadlineNotification.notification_type != "expired"
             ).delete(synchronize_session=False)
     
-    db.commit()
+    record_changes(db, user.id, [(ENTITY_DEADLINE, note_id, OP_UPSERT), (ENTITY_NOTE, note_id, OP_UPSERT)])
+    _commit(db)
     db.refresh(deadline)
     
     # Вычисляем информацию о дедлайне
@@ -947,7 +1278,8 @@ def delete_deadline(note_id: int, db: Session = Depends(get_db), user=Depends(ge
         raise HTTPException(status_code=404, detail="Дедлайн не найден")
     
     db.delete(deadline)
-    db.commit()
+    record_changes(db, user.id, [(ENTITY_DEADLINE, note_id, OP_DELETE), (ENTITY_NOTE, note_id, OP_UPSERT)])
+    _commit(db)
     return {"ok": True}
 
 
@@ -981,7 +1313,8 @@ def toggle_deadline_notifications(note_id: int, db: Session = Depends(get_db), u
             DeadlineNotification.notification_type != "expired"
         ).delete(synchronize_session=False)
     
-    db.commit()
+    record_changes(db, user.id, [(ENTITY_DEADLINE, note_id, OP_UPSERT), (ENTITY_NOTE, note_id, OP_UPSERT)])
+    _commit(db)
     db.refresh(deadline)
     
     # Вычисляем информацию о дедлайне
@@ -1095,3 +1428,124 @@ def test_deadline_notification(note_id: int, db: Session = Depends(get_db), user
         
         # Возвращаем ошибку с понятным сообщением
         raise HTTPException(status_code=400, detail=user_message)
+
+
+# Sync
+def _deadline_out(deadline: Deadline) -> DeadlineOut:
+    info = _calculate_deadline_info(deadline.deadline_at)
+    return DeadlineOut(
+        id=deadline.id,
+        note_id=deadline.note_id,
+        deadline_at=deadline.deadline_at.isoformat(),
+        notification_enabled=deadline.notification_enabled,
+        days_remaining=info["days_remaining"],
+        status=info["status"],
+        time_remaining_text=info["time_remaining_text"]
+    )
+
+
+def _sync_notes(db: Session, notes: List[Note]) -> List[NoteOut]:
+    note_ids = [n.id for n in notes]
+    notified = set()
+    if note_ids:
+        notified = {
+            note_id for (note_id,) in db.query(Deadline.note_id).filter(
+                Deadline.note_id.in_(note_ids),
+                Deadline.notification_enabled == True
+            )
+        }
+    return [
+        NoteOut(
+            id=n.id,
+            title=n.title,
+            content=n.content,
+            folder_id=n.folder_id,
+            is_favorite=n.is_favorite,
+            tags=[TagOut(id=tag.id, name=tag.name, color=tag.color) for tag in n.tags],
+            has_deadline_notifications=n.id in notified,
+            version=n.version
+        )
+        for n in notes
+    ]
+
+
+def _sync_folder(f: Folder) -> FolderOut:
+    return FolderOut(
+        id=f.id,
+        name=f.name,
+        is_default=f.is_default,
+        created_at=f.created_at
+    )
+
+
+@router.get("/sync", response_model=SyncOut, dependencies=[user_etag(_deadlines_etag_part)])
+def sync(since: int = Query(default=0, ge=0), db: Session = Depends(get_db), user=Depends(get_current_user)):
+    """
+    Дельта-синхронизация: заметки, папки, дедлайны и настройки, измененные после версии since,
+    и id удаленных с тех пор сущностей. Новое значение since - поле version ответа.
+
+    Полная выдача (full_resync=true) возвращается при since=0, а также если надгробия
+    после since уже удалены компактацией или since больше текущей версии.
+    """
+    row = db.query(UserVersion.version, UserVersion.compacted_version).filter(UserVersion.user_id == user.id).first()
+    version, compacted_version = (row.version, row.compacted_version) if row else (0, 0)
+
+    if since == 0 or since < compacted_version or since > version:
+        notes = db.query(Note).options(joinedload(Note.tags)).filter(Note.user_id == user.id).all()
+        folders = db.query(Folder).filter(Folder.user_id == user.id).order_by(Folder.is_default.desc(), Folder.created_at.asc()).all()
+        deadlines = db.query(Deadline).filter(Deadline.user_id == user.id).all()
+        user_settings = db.query(UserSettings).filter(UserSettings.user_id == user.id).first()
+        return SyncOut(
+            version=version,
+            full_resync=True,
+            notes=_sync_notes(db, notes),
+            folders=[_sync_folder(f) for f in folders],
+            deadlines=[_deadline_out(d) for d in deadlines],
+            settings=user_settings,
+        )
+
+    changes = db.query(ChangeLog.entity_type, ChangeLog.entity_id, ChangeLog.op).filter(
+        ChangeLog.user_id == user.id,
+        ChangeLog.version > since
+    ).all()
+    upserted = {ENTITY_NOTE: set(), ENTITY_FOLDER: set(), ENTITY_DEADLINE: set(), ENTITY_SETTINGS: set()}
+    deleted = {ENTITY_NOTE: set(), ENTITY_FOLDER: set(), ENTITY_DEADLINE: set()}
+    for entity_type, entity_id, op in changes:
+        if op == OP_DELETE and entity_type in deleted:
+            deleted[entity_type].add(entity_id)
+        elif entity_type in upserted:
+            upserted[entity_type].add(entity_id)
+
+    notes, folders, deadlines, user_settings = [], [], [], None
+    if upserted[ENTITY_NOTE]:
+        notes = db.query(Note).options(joinedload(Note.tags)).filter(
+            Note.user_id == user.id,
+            Note.id.in_(upserted[ENTITY_NOTE])
+        ).all()
+    if upserted[ENTITY_FOLDER]:
+        folders = db.query(Folder).filter(Folder.user_id == user.id, Folder.id.in_(upserted[ENTITY_FOLDER])).all()
+    if upserted[ENTITY_DEADLINE]:
+        deadlines = db.query(Deadline).filter(
+            Deadline.user_id == user.id,
+            Deadline.note_id.in_(upserted[ENTITY_DEADLINE])
+        ).all()
+    if upserted[ENTITY_SETTINGS]:
+        user_settings = db.query(UserSettings).filter(UserSettings.user_id == user.id).first()
+
+    # Сущность из журнала, которой уже нет (например, удалена каскадом), отдаем как удаленную
+    deleted[ENTITY_NOTE] |= upserted[ENTITY_NOTE] - {n.id for n in notes}
+    deleted[ENTITY_FOLDER] |= upserted[ENTITY_FOLDER] - {f.id for f in folders}
+    deleted[ENTITY_DEADLINE] |= upserted[ENTITY_DEADLINE] - {d.note_id for d in deadlines}
+
+    return SyncOut(
+        version=version,
+        notes=_sync_notes(db, notes),
+        folders=[_sync_folder(f) for f in folders],
+        deadlines=[_deadline_out(d) for d in deadlines],
+        settings=user_settings,
+        deleted=SyncDeleted(
+            notes=sorted(deleted[ENTITY_NOTE]),
+            folders=sorted(deleted[ENTITY_FOLDER]),
+            deadlines=sorted(deleted[ENTITY_DEADLINE]),
+        ),
+    )
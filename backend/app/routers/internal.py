@@ -0,0 +1,32 @@
+from fastapi import APIRouter, Depends
+from sqlalchemy.orm import Session
+
+from ..core import slow_queries
+from ..db import get_db
+from ..deps import require_admin
+from ..services.compression_service import note_storage_report
+
+
+router = APIRouter(prefix="/internal", tags=["internal"], dependencies=[Depends(require_admin)], include_in_schema=False)
+
+
+@router.get("/slow-queries")
+def list_slow_queries():
+    """Медленные SQL-запросы по отпечаткам: количество, время, последние параметры и план."""
+    log = slow_queries.slow_query_log
+    if log is None:
+        return {"enabled": False, "threshold_ms": 0, "queries": []}
+    return {"enabled": True, "threshold_ms": log.threshold * 1000, "queries": log.entries()}
+
+
+@router.delete("/slow-queries")
+def reset_slow_queries():
+    if slow_queries.slow_query_log is not None:
+        slow_queries.slow_query_log.reset()
+    return {"status": "ok"}
+
+
+@router.get("/note-storage")
+def get_note_storage(db: Session = Depends(get_db)):
+    """Хранение текста заметок: сколько сжато и сколько места сэкономлено (байт)."""
+    return note_storage_report(db)
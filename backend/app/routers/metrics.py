@@ -0,0 +1,14 @@
+from fastapi import APIRouter, Depends
+from fastapi.responses import PlainTextResponse
+
+from ..core.metrics import CONTENT_TYPE, render_metrics
+from ..deps import require_metrics_token
+
+
+router = APIRouter(tags=["metrics"], dependencies=[Depends(require_metrics_token)])
+
+
+@router.get("/metrics", response_class=PlainTextResponse, include_in_schema=False)
+def metrics():
+    """Метрики процесса в текстовом формате Prometheus (только in-process коллекторы)."""
+    return PlainTextResponse(render_metrics(), media_type=CONTENT_TYPE)
@@ -3,16 +3,17 @@ from sqlalchemy.orm import Session
 import logging
 
 from ..db import get_db
-from ..deps import get_current_user
+from ..deps import get_current_user, user_etag
 from ..models.user import User
 from ..models.user_settings import UserSettings
 from ..schemas import UserSettingsOut, UserSettingsUpdate
+from ..services.version_service import ENTITY_SETTINGS, OP_UPSERT, record_changes
 
 logger = logging.getLogger(__name__)
 router = APIRouter(prefix="/api", tags=["settings"])
 
 
-@router.get("/settings", response_model=UserSettingsOut)
+@router.get("/settings", response_model=UserSettingsOut, dependencies=[user_etag()])
 def get_user_settings(db: Session = Depends(get_db), user: User = Depends(get_current_user)):
     """Получить настройки пользователя"""
     settings = db.query(UserSettings).filter(UserSettings.user_id == user.id).first()
@@ -117,6 +118,7 @@ def update_user_settings(
                     ).delete(synchronize_session=False)
                     logger.info(f"Удалены существующие уведомления для {len(deadline_ids)} дедлайнов пользователя {user.id} после обновления времен уведомлений")
     
+    record_changes(db, user.id, [(ENTITY_SETTINGS, user.id, OP_UPSERT)])
     db.commit()
     db.refresh(settings)
     
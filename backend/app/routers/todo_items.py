@@ -0,0 +1,190 @@
+"""
+Пункты todo-заметок.
+
+Поэлементные изменения: добавление, правка, отметка, перестановка и удаление одного пункта
+без отправки всего content (см. services/todo_service.py). Каждый запрос - один UPDATE
+заметки плюс запись в журнал изменений; ответ - только измененный пункт и новая версия
+заметки. Переданная version проверяется: 409, если заметку успели изменить.
+
+Запросы по всем заметкам (открытые пункты, прогресс) читают таблицу todo_items по индексам,
+не разбирая content.
+"""
+from typing import List
+
+from fastapi import APIRouter, Depends, HTTPException, Query, Response
+from sqlalchemy import Integer, case, func
+from sqlalchemy.orm import Session
+
+from ..core.responses import rows_response
+from ..db import get_db
+from ..deps import get_current_user, user_etag
+from ..models.todo import Note, TodoItem
+from ..schemas import (
+    TodoFolderProgressOut,
+    TodoItemChangeOut,
+    TodoItemCreate,
+    TodoItemMove,
+    TodoItemOut,
+    TodoItemUpdate,
+    TodoNoteProgressOut,
+    TodoOpenItemOut,
+)
+from ..services import todo_service
+from ..services.search_service import index_note_values
+from ..services.todo_service import TodoPatchError, TodoPatchResult
+from ..services.version_service import ENTITY_NOTE, OP_UPSERT, record_changes
+
+router = APIRouter(prefix="/api", tags=["todo"])
+
+# Открытых пунктов на страницу по умолчанию и максимум
+TODO_OPEN_DEFAULT_LIMIT = 100
+TODO_OPEN_MAX_LIMIT = 500
+
+
+def _finish(db: Session, user, note_id: int, result: TodoPatchResult) -> TodoItemChangeOut:
+    if result.content is not None:
+        index_note_values(db, [(note_id, user.id, result.title, result.content)])
+    record_changes(db, user.id, [(ENTITY_NOTE, note_id, OP_UPSERT)])
+    db.commit()
+    item = TodoItemOut.model_validate(result.item) if result.item is not None else None
+    return TodoItemChangeOut(note_id=note_id, version=result.version, item=item)
+
+
+def _run(db: Session, user, note_id: int, change, *args, **kwargs) -> TodoItemChangeOut:
+    try:
+        result = change(db, note_id, user.id, *args, **kwargs)
+    except TodoPatchError as e:
+        db.rollback()
+        raise HTTPException(status_code=e.status_code, detail=e.detail)
+    return _finish(db, user, note_id, result)
+
+
+@router.post("/notes/{note_id}/items", response_model=TodoItemChangeOut)
+def add_todo_item(note_id: int, payload: TodoItemCreate, db: Session = Depends(get_db), user=Depends(get_current_user)):
+    """Добавляет пункт после after_id (или в конец). id нового пункта назначает сервер."""
+    return _run(
+        db, user, note_id, todo_service.add_item,
+        payload.text, completed=payload.completed, after_id=payload.after_id, version=payload.version,
+    )
+
+
+@router.patch("/notes/{note_id}/items/{item_id}", response_model=TodoItemChangeOut)
+def update_todo_item(
+    note_id: int,
+    item_id: int,
+    payload: TodoItemUpdate,
+    db: Session = Depends(get_db),
+    user=Depends(get_current_user),
+):
+    """Меняет text и/или completed пункта."""
+    return _run(
+        db, user, note_id, todo_service.update_item,
+        item_id, item_text=payload.text, completed=payload.completed, version=payload.version,
+    )
+
+
+@router.post("/notes/{note_id}/items/{item_id}/toggle", response_model=TodoItemChangeOut)
+def toggle_todo_item(
+    note_id: int,
+    item_id: int,
+    version: int | None = None,
+    db: Session = Depends(get_db),
+    user=Depends(get_current_user),
+):
+    """Инвертирует completed пункта."""
+    return _run(db, user, note_id, todo_service.toggle_item, item_id, version=version)
+
+
+@router.post("/notes/{note_id}/items/{item_id}/move", response_model=TodoItemChangeOut)
+def move_todo_item(
+    note_id: int,
+    item_id: int,
+    payload: TodoItemMove,
+    db: Session = Depends(get_db),
+    user=Depends(get_current_user),
+):
+    """Переставляет пункт после after_id (after_id = null - в начало)."""
+    return _run(db, user, note_id, todo_service.move_item, item_id, after_id=payload.after_id, version=payload.version)
+
+
+@router.delete("/notes/{note_id}/items/{item_id}", response_model=TodoItemChangeOut)
+def delete_todo_item(
+    note_id: int,
+    item_id: int,
+    version: int | None = None,
+    db: Session = Depends(get_db),
+    user=Depends(get_current_user),
+):
+    """Удаляет пункт; в ответе item = null."""
+    return _run(db, user, note_id, todo_service.delete_item, item_id, version=version)
+
+
+def _done_count():
+    return func.coalesce(func.sum(case((TodoItem.done == True, 1), else_=0)), 0).cast(Integer)
+
+
+@router.get("/todo/open", response_model=List[TodoOpenItemOut], dependencies=[user_etag()])
+def list_open_todo_items(
+    response: Response,
+    folder_id: int | None = None,
+    limit: int = Query(default=TODO_OPEN_DEFAULT_LIMIT, ge=1, le=TODO_OPEN_MAX_LIMIT),
+    offset: int = Query(default=0, ge=0),
+    db: Session = Depends(get_db),
+    user=Depends(get_current_user),
+):
+    """Невыполненные пункты всех todo-заметок пользователя по порядку заметок и пунктов."""
+    query = (
+        db.query(
+            TodoItem.note_id,
+            Note.title.label("note_title"),
+            Note.folder_id,
+            TodoItem.item_id,
+            TodoItem.position,
+            TodoItem.text,
+            TodoItem.updated_at,
+        )
+        .join(Note, Note.id == TodoItem.note_id)
+        .filter(TodoItem.user_id == user.id, TodoItem.done == False)
+    )
+    if folder_id is not None:
+        query = query.filter(Note.folder_id == folder_id)
+    rows = query.order_by(TodoItem.note_id, TodoItem.position).limit(limit).offset(offset).all()
+    return rows_response([row._asdict() for row in rows], response)
+
+
+@router.get("/todo/progress", response_model=List[TodoNoteProgressOut], dependencies=[user_etag()])
+def get_todo_progress(
+    response: Response,
+    folder_id: int | None = None,
+    db: Session = Depends(get_db),
+    user=Depends(get_current_user),
+):
+    """Прогресс по каждой todo-заметке: всего пунктов и выполнено (пустые заметки не попадают)."""
+    query = db.query(
+        TodoItem.note_id,
+        func.count().label("total"),
+        _done_count().label("completed"),
+    ).filter(TodoItem.user_id == user.id)
+    if folder_id is not None:
+        query = query.join(Note, Note.id == TodoItem.note_id).filter(Note.folder_id == folder_id)
+    rows = query.group_by(TodoItem.note_id).order_by(TodoItem.note_id).all()
+    return rows_response([row._asdict() for row in rows], response)
+
+
+@router.get("/todo/progress/folders", response_model=List[TodoFolderProgressOut], dependencies=[user_etag()])
+def get_todo_folder_progress(response: Response, db: Session = Depends(get_db), user=Depends(get_current_user)):
+    """Прогресс по папкам: пункты всех todo-заметок папки (folder_id = null - заметки без папки)."""
+    rows = (
+        db.query(
+            Note.folder_id,
+            func.count().label("total"),
+            _done_count().label("completed"),
+        )
+        .select_from(TodoItem)
+        .join(Note, Note.id == TodoItem.note_id)
+        .filter(TodoItem.user_id == user.id)
+        .group_by(Note.folder_id)
+        .order_by(Note.folder_id)
+        .all()
+    )
+    return rows_response([row._asdict() for row in rows], response)
@@ -0,0 +1,61 @@
+from datetime import datetime, timezone
+import logging
+
+from fastapi import APIRouter, Depends, HTTPException, Request
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from ..db import get_db
+from ..deps import get_current_user
+from ..schemas import ImportOut
+from ..services.workspace_service import (
+    ImportFormatError,
+    ImportTooLargeError,
+    export_workspace_file,
+    import_workspace_file,
+    iter_file,
+    spool_upload,
+)
+
+logger = logging.getLogger(__name__)
+router = APIRouter(prefix="/api", tags=["workspace"])
+
+
+@router.get("/export")
+def export_workspace(user=Depends(get_current_user)):
+    """
+    Экспорт папок, задач, заметок (с тегами) и дедлайнов пользователя в NDJSON. Файл сначала
+    собирается одной короткой транзакцией, затем отдается потоком.
+    """
+    filename = f"tuti-fruti-{datetime.now(timezone.utc):%Y%m%d}.ndjson"
+    return StreamingResponse(
+        iter_file(export_workspace_file(user.id)),
+        media_type="application/x-ndjson",
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+    )
+
+
+@router.post("/import", response_model=ImportOut)
+async def import_workspace(request: Request, db: Session = Depends(get_db), user=Depends(get_current_user)):
+    """
+    Импорт файла из GET /api/export (тело запроса - NDJSON). Данные добавляются к существующим
+    в одной транзакции: при ошибке в любой строке ничего не сохраняется. Тело сначала
+    загружается целиком, транзакция начинается после окончания загрузки.
+    """
+    try:
+        upload = await spool_upload(request.stream())
+    except ImportTooLargeError as e:
+        raise HTTPException(status_code=413, detail=str(e))
+    try:
+        return await run_in_threadpool(import_workspace_file, db, user.id, upload)
+    except ImportFormatError as e:
+        await run_in_threadpool(db.rollback)
+        raise HTTPException(status_code=400, detail=str(e))
+    except IntegrityError as e:
+        await run_in_threadpool(db.rollback)
+        logger.info("Импорт отклонен: нарушение ограничения БД: %s", e.orig)
+        raise HTTPException(status_code=400, detail="Файл содержит конфликтующие записи (например, два дедлайна одной заметки)")
+    finally:
+        upload.close()
@@ -1,6 +1,6 @@
-from typing import Optional, Any
+from typing import Optional, Any, Literal
 from datetime import datetime
-from pydantic import BaseModel, field_serializer, model_validator
+from pydantic import BaseModel, field_serializer
 
 
 class UserCreate(BaseModel):
@@ -12,40 +12,12 @@ class UserOut(BaseModel):
     id: int
     username: str
     uuid: str
-    created_at: str
-
-    @model_validator(mode='before')
-    @classmethod
-    def convert_created_at(cls, data: Any) -> Any:
-        """Конвертирует datetime в ISO строку перед созданием модели"""
-        if isinstance(data, dict):
-            created_at = data.get('created_at')
-            if isinstance(created_at, datetime):
-                data['created_at'] = created_at.isoformat()
-        elif hasattr(data, 'created_at'):
-            # Если это SQLAlchemy модель
-            created_at = getattr(data, 'created_at', None)
-            if isinstance(created_at, datetime):
-                # Создаем словарь с конвертированным значением
-                if not isinstance(data, dict):
-                    # Если data - это объект SQLAlchemy, преобразуем в словарь
-                    result = {
-                        'id': getattr(data, 'id', None),
-                        'username': getattr(data, 'username', None),
-                        'uuid': getattr(data, 'uuid', None),
-                        'created_at': created_at.isoformat()
-                    }
-                    return result
-                else:
-                    data['created_at'] = created_at.isoformat()
-        return data
+    created_at: datetime
 
     @field_serializer('created_at')
-    def serialize_created_at(self, value: Any, _info) -> str:
-        """Конвертирует datetime в ISO строку для сериализации (дополнительная проверка)"""
-        if isinstance(value, datetime):
-            return value.isoformat()
-        return str(value)
+    def serialize_created_at(self, value: datetime) -> str:
+        """datetime отдается в ISO-формате datetime.isoformat() (как и раньше, без замены +00:00 на Z)"""
+        return value.isoformat()
 
     class Config:
         from_attributes = True
@@ -78,6 +50,13 @@ class TagOut(TagBase):
         from_attributes = True
 
 
+class TagUsageOut(TagOut):
+    """Тег пользователя в GET /api/tags: сколько заметок и задач им отмечено."""
+    note_count: int
+    task_count: int
+    last_used_at: datetime
+
+
 # Tasks
 class TaskBase(BaseModel):
     title: str
@@ -127,40 +106,12 @@ class FolderOut(BaseModel):
     id: int
     name: str
     is_default: bool
-    created_at: str
-
-    @model_validator(mode='before')
-    @classmethod
-    def convert_created_at(cls, data: Any) -> Any:
-        """Конвертирует datetime в ISO строку перед созданием модели"""
-        if isinstance(data, dict):
-            created_at = data.get('created_at')
-            if isinstance(created_at, datetime):
-                data['created_at'] = created_at.isoformat()
-        elif hasattr(data, 'created_at'):
-            # Если это SQLAlchemy модель
-            created_at = getattr(data, 'created_at', None)
-            if isinstance(created_at, datetime):
-                # Создаем словарь с конвертированным значением
-                if not isinstance(data, dict):
-                    # Если data - это объект SQLAlchemy, преобразуем в словарь
-                    result = {
-                        'id': getattr(data, 'id', None),
-                        'name': getattr(data, 'name', None),
-                        'is_default': getattr(data, 'is_default', None),
-                        'created_at': created_at.isoformat()
-                    }
-                    return result
-                else:
-                    data['created_at'] = created_at.isoformat()
-        return data
+    created_at: datetime
 
     @field_serializer('created_at')
-    def serialize_created_at(self, value: Any, _info) -> str:
-        """Конвертирует datetime в ISO строку для сериализации (дополнительная проверка)"""
-        if isinstance(value, datetime):
-            return value.isoformat()
-        return str(value)
+    def serialize_created_at(self, value: datetime) -> str:
+        """datetime отдается в ISO-формате datetime.isoformat() (как и раньше, без замены +00:00 на Z)"""
+        return value.isoformat()
 
     class Config:
         from_attributes = True
@@ -193,11 +144,95 @@ class NoteOut(BaseModel):
     is_favorite: bool = False
     tags: list[TagOut]
     has_deadline_notifications: bool = False  # Есть ли дедлайн с включенными уведомлениями
+    version: int = 1  # версия документа заметки (см. эндпоинты /api/notes/{id}/items)
 
     class Config:
         from_attributes = True
 
 
+class TodoItemOut(BaseModel):
+    """Пункт todo-заметки. Неизвестные поля пункта в content сохраняются, но не возвращаются."""
+    id: int
+    text: str = ""
+    completed: bool = False
+
+
+class TodoItemCreate(BaseModel):
+    text: str = ""
+    completed: bool = False
+    after_id: int | None = None  # вставить после этого пункта; None - в конец
+    version: int | None = None  # ожидаемая версия заметки; None - без проверки
+
+
+class TodoItemUpdate(BaseModel):
+    text: str | None = None
+    completed: bool | None = None
+    version: int | None = None
+
+
+class TodoItemMove(BaseModel):
+    after_id: int | None = None  # поставить после этого пункта; None - в начало
+    version: int | None = None
+
+
+class TodoOpenItemOut(BaseModel):
+    """Невыполненный пункт (GET /api/todo/open)."""
+    note_id: int
+    note_title: str
+    folder_id: int | None
+    item_id: int | None  # None, если у пункта в content нет числового id
+    position: int
+    text: str
+    updated_at: datetime
+
+
+class TodoNoteProgressOut(BaseModel):
+    note_id: int
+    total: int
+    completed: int
+
+
+class TodoFolderProgressOut(BaseModel):
+    folder_id: int | None
+    total: int
+    completed: int
+
+
+class TodoItemChangeOut(BaseModel):
+    """Результат изменения одного пункта: новая версия заметки и сам пункт (None после удаления)."""
+    note_id: int
+    version: int
+    item: TodoItemOut | None = None
+
+
+class NoteSummaryOut(BaseModel):
+    """Краткое представление заметки для списков (GET /api/notes?view=summary)."""
+    id: int
+    title: str
+    folder_id: int | None
+    is_favorite: bool = False
+    tags: list[TagOut]
+    has_deadline_notifications: bool = False
+    preview: str = ""  # начало текста или тексты первых пунктов todo
+    todo_total: int | None = None  # только для todo-заметок
+    todo_completed: int | None = None
+
+
+class NoteSearchHit(BaseModel):
+    """Результат поиска по заметкам (GET /api/notes/search)."""
+    id: int
+    title: str
+    folder_id: int | None
+    is_favorite: bool = False
+    snippet: str = ""  # HTML-экранированный фрагмент, совпадения обернуты в <mark>
+    rank: float | None = None  # bm25: меньше - релевантнее; None, если FTS5 недоступен
+
+
+class NoteSearchOut(BaseModel):
+    items: list[NoteSearchHit]
+    next_offset: int | None = None  # offset следующей страницы, None - больше результатов нет
+
+
 # Deadlines
 class DeadlineCreate(BaseModel):
     note_id: int
@@ -239,3 +274,86 @@ class UserSettingsUpdate(BaseModel):
     theme: str | None = None  # "light" or "dark"
     notification_times_minutes: list[int] | None = None  # Массив минут до дедлайна (до 10 штук)
 
+
+
+# Sync
+class SyncDeleted(BaseModel):
+    notes: list[int] = []
+    folders: list[int] = []
+    deadlines: list[int] = []  # note_id заметок, у которых удален дедлайн
+
+
+class SyncOut(BaseModel):
+    version: int  # Передается как since в следующем запросе
+    full_resync: bool = False  # True - ответ содержит все данные, локальную копию нужно заменить
+    notes: list[NoteOut] = []
+    folders: list[FolderOut] = []
+    deadlines: list[DeadlineOut] = []
+    settings: UserSettingsOut | None = None
+    deleted: SyncDeleted = SyncDeleted()
+
+
+# Batch
+class BatchOperation(BaseModel):
+    op: Literal["create", "update", "delete"]
+    entity: Literal["note", "task", "folder", "deadline"]
+    id: int | None = None  # Для update и delete; у дедлайна - note_id
+    data: dict[str, Any] = {}  # Тело соответствующего одиночного запроса (NoteCreate, TaskUpdate, ...)
+
+
+class BatchRequest(BaseModel):
+    operations: list[BatchOperation]
+
+
+class BatchResult(BaseModel):
+    index: int
+    status: int
+    id: int | None = None
+    data: dict[str, Any] | None = None  # Ответ одиночного эндпоинта; у групповых операций не заполняется
+
+
+class BatchOut(BaseModel):
+    results: list[BatchResult]
+
+
+# Export / import (NDJSON: по одной записи на строку, первая строка - {"type": "meta", ...})
+class ExportFolderRecord(BaseModel):
+    id: int
+    name: str
+    is_default: bool = False
+    created_at: datetime | None = None
+
+
+class ExportTaskRecord(BaseModel):
+    id: int | None = None
+    title: str
+    description: str | None = None
+    due_at: datetime | None = None
+    is_completed: bool = False
+    created_at: datetime | None = None
+    tags: list[str] = []
+
+
+class ExportNoteRecord(BaseModel):
+    id: int
+    folder_id: int | None = None
+    title: str
+    content: str | None = None
+    is_favorite: bool = False
+    created_at: datetime | None = None
+    updated_at: datetime | None = None
+    tags: list[str] = []
+
+
+class ExportDeadlineRecord(BaseModel):
+    note_id: int
+    deadline_at: datetime
+    notification_enabled: bool = False
+
+
+class ImportOut(BaseModel):
+    folders: int = 0
+    tasks: int = 0
+    notes: int = 0
+    deadlines: int = 0
+    tags: int = 0  # Привязок тегов к задачам и заметкам
@@ -6,70 +6,72 @@ from jose import jwt
 from jose.exceptions import ExpiredSignatureError, JWTError, JWTClaimsError
 
 from .core.config import settings
+from .core.logs import trace
 
 logger = logging.getLogger(__name__)
 
 
-def create_access_token(subject: str, expires_minutes: Optional[int] = None) -> str:
+def create_access_token(subject: str, expires_minutes: Optional[int] = None, auth_time: Optional[int] = None) -> str:
+    """
+    Выдает JWT. auth_time - время исходного входа (unix-время); при продлении копируется
+    из старого токена, иначе это новый вход. Срок действия не выходит за пределы
+    SESSION_MAX_AGE_MINUTES от auth_time.
+    """
+    now = datetime.now(tz=timezone.utc)
+    if auth_time is None:
+        auth_time = int(now.timestamp())
     expire_delta = expires_minutes or settings.access_token_expire_minutes
-    expire = datetime.now(tz=timezone.utc) + timedelta(minutes=expire_delta)
-    to_encode = {"sub": subject, "exp": expire}
-    
-    logger.info(f"[create_access_token] Создание токена для user_id={subject}, expire_minutes={expire_delta}")
-    logger.info(f"[create_access_token] Токен истечет: {expire}")
-    
+    session_end = datetime.fromtimestamp(auth_time, tz=timezone.utc) + timedelta(minutes=settings.session_max_age_minutes)
+    expire = min(now + timedelta(minutes=expire_delta), session_end)
+    to_encode = {"sub": subject, "exp": expire, "iat": now, "auth_time": auth_time}
+
     token = jwt.encode(to_encode, settings.secret_key, algorithm="HS256")
-    logger.info(f"[create_access_token] ✅ Токен создан, длина: {len(token)} символов")
+    trace(logger, "[create_access_token] Токен создан", user_id=subject, expire_minutes=expire_delta, auth_time=auth_time)
     return token
 
 
 def decode_access_token(token: str) -> dict:
     """
-    Декодирует JWT токен с детальным логированием ошибок.
+    Декодирует JWT токен. Ошибки логируются одной строкой и пробрасываются дальше.
     """
-    logger.info(f"[decode_access_token] Начало декодирования токена")
-    logger.info(f"[decode_access_token] Длина токена: {len(token)} символов")
-    logger.info(f"[decode_access_token] Токен (первые 30 символов): {token[:30]}...")
-    logger.info(f"[decode_access_token] Токен (последние 10 символов): ...{token[-10:]}")
-    logger.info(f"[decode_access_token] Используемый secret_key: {'установлен' if settings.secret_key else 'НЕ УСТАНОВЛЕН'}")
-    if settings.secret_key:
-        logger.info(f"[decode_access_token] Длина secret_key: {len(settings.secret_key)} символов")
-    
     try:
         payload = jwt.decode(token, settings.secret_key, algorithms=["HS256"])
-        logger.info(f"[decode_access_token] ✅ Токен успешно декодирован: {payload}")
-        
-        # Проверяем срок действия токена
-        exp = payload.get("exp")
-        if exp:
-            exp_datetime = datetime.fromtimestamp(exp, tz=timezone.utc)
-            now = datetime.now(tz=timezone.utc)
-            time_until_expiry = exp_datetime - now
-            logger.info(f"[decode_access_token] Токен истечет: {exp_datetime}")
-            logger.info(f"[decode_access_token] Осталось времени: {time_until_expiry}")
-            if time_until_expiry.total_seconds() < 0:
-                logger.error(f"[decode_access_token] ❌ Токен уже истек! Время истечения: {exp_datetime}, сейчас: {now}")
-        
+        trace(logger, "[decode_access_token] Токен декодирован", sub=payload.get("sub"), exp=payload.get("exp"))
         return payload
-        
+
     except ExpiredSignatureError as e:
-        logger.error(f"[decode_access_token] ❌ ОШИБКА: Токен истек: {e}")
-        logger.error(f"[decode_access_token] Трассировка:\n{type(e).__name__}: {e}")
+        trace(logger, "[decode_access_token] Токен истек: %s", e)
         raise
     except JWTClaimsError as e:
-        logger.error(f"[decode_access_token] ❌ ОШИБКА: Неверные claims в токене: {e}")
-        logger.error(f"[decode_access_token] Трассировка:\n{type(e).__name__}: {e}")
+        logger.warning("[decode_access_token] Неверные claims в токене: %s", e)
         raise
     except JWTError as e:
-        logger.error(f"[decode_access_token] ❌ ОШИБКА: Ошибка JWT: {e}")
-        logger.error(f"[decode_access_token] Тип ошибки: {type(e).__name__}")
-        logger.error(f"[decode_access_token] Трассировка:\n{str(e)}")
+        logger.warning("[decode_access_token] Ошибка JWT (%s): %s", type(e).__name__, e)
+        raise
+    except Exception:
+        logger.exception("[decode_access_token] Неожиданная ошибка при декодировании токена")
         raise
-    except Exception as e:
-        logger.error(f"[decode_access_token] ❌ ОШИБКА: Неожиданная ошибка при декодировании токена: {e}")
-        logger.error(f"[decode_access_token] Тип ошибки: {type(e).__name__}")
-        import traceback
-        logger.error(f"[decode_access_token] Трассировка:\n{traceback.format_exc()}")
-        raise 
 
 
+def decode_refreshable_token(token: str) -> dict:
+    """
+    Декодирует токен для продления сессии: подпись проверяется, а срок действия может
+    быть истекшим не более чем на settings.token_refresh_grace_minutes. Сессия продлевается
+    не дольше settings.session_max_age_minutes от исходного входа (auth_time); токены
+    без auth_time (выданные до его появления) не продлеваются.
+    """
+    payload = jwt.decode(token, settings.secret_key, algorithms=["HS256"], options={"verify_exp": False})
+    exp = payload.get("exp")
+    if exp is None:
+        raise JWTClaimsError("Token has no expiration")
+    auth_time = payload.get("auth_time")
+    if not isinstance(auth_time, int):
+        raise JWTClaimsError("Token has no auth_time")
+    now = datetime.now(tz=timezone.utc)
+    grace = timedelta(minutes=settings.token_refresh_grace_minutes)
+    if datetime.fromtimestamp(exp, tz=timezone.utc) + grace < now:
+        raise ExpiredSignatureError("Token refresh window has expired")
+    if datetime.fromtimestamp(auth_time, tz=timezone.utc) + timedelta(minutes=settings.session_max_age_minutes) <= now:
+        raise ExpiredSignatureError("Session has reached its maximum age")
+    trace(logger, "[decode_refreshable_token] Токен принят для продления", sub=payload.get("sub"), exp=exp, auth_time=auth_time)
+    return payload
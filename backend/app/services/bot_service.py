@@ -2,16 +2,41 @@
 Сервис для отправки сообщений пользователям через Max Bot API.
 """
 import logging
+import time
 import requests
 from typing import Optional, Dict, Any
 
 from ..core.config import settings
+from ..core.logs import trace
+from ..core.metrics import BOT_API_LATENCY, BOT_API_REQUESTS
 
 logger = logging.getLogger(__name__)
 
 MAX_BOT_API_URL = "https://platform-api.max.ru"
 
 
+def _bot_request(operation: str, method: str, url: str, **kwargs) -> requests.Response:
+    """
+    HTTP-запрос к Max Bot API с учетом метрик: длительность и результат
+    (HTTP-статус или тип сетевой ошибки) по операции.
+    """
+    start = time.perf_counter()
+    outcome = "exception"
+    try:
+        response = requests.request(method, url, **kwargs)
+        outcome = str(response.status_code)
+        return response
+    except requests.exceptions.Timeout:
+        outcome = "timeout"
+        raise
+    except requests.exceptions.ConnectionError:
+        outcome = "connection_error"
+        raise
+    finally:
+        BOT_API_LATENCY.observe(time.perf_counter() - start, operation)
+        BOT_API_REQUESTS.inc(operation, outcome)
+
+
 def send_message_to_user(user_uuid: str, text: str, image_url: Optional[str] = None) -> Dict[str, Any]:
     """
     Отправляет сообщение пользователю через Max Bot API.
@@ -45,14 +70,6 @@ def send_message_to_user(user_uuid: str, text: str, image_url: Optional[str] = N
         
         url = f"{MAX_BOT_API_URL}/messages"
         
-        # Логируем информацию о запросе
-        logger.info(f"🔍 ========================================")
-        logger.info(f"🔍 Отправка сообщения через Max Bot API")
-        logger.info(f"🔍 URL: {url}")
-        logger.info(f"🔍 user_id: {user_uuid} (type: {type(user_uuid).__name__})")
-        logger.info(f"🔍 Текст: {text[:50]}...")
-        logger.info(f"🔍 Изображение: {image_url if image_url else 'нет'}")
-        
         # Пробуем отправить с исходным форматом user_id
         params = {
             "access_token": token,
@@ -73,20 +90,15 @@ def send_message_to_user(user_uuid: str, text: str, image_url: Optional[str] = N
                     }
                 }
             ]
-            logger.info(f"📷 Прикрепляем изображение к сообщению: {image_url}")
         
-        # Логируем параметры запроса (без токена)
-        logger.info(f"🔍 Параметры запроса: user_id={user_uuid}")
-        logger.info(f"🔍 Payload: {payload}")
+        trace(logger, "Отправка сообщения через Max Bot API", user_id=user_uuid, has_image=bool(image_url))
         
-        response = requests.post(url, params=params, json=payload, timeout=10)
+        response = _bot_request("send_message", "POST", url, params=params, json=payload, timeout=10)
         
-        logger.info(f"🔍 Статус ответа: {response.status_code}")
-        logger.info(f"🔍 Ответ API (первые 500 символов): {response.text[:500]}")
+        trace(logger, "Ответ Max Bot API: %s %.500s", response.status_code, response.text)
         
         if response.status_code == 200:
             result = response.json()
-            logger.info(f"📥 Полный ответ API при отправке сообщения: {result}")
             
             # Пробуем разные варианты извлечения message_id
             message_id = None
@@ -126,20 +138,19 @@ def send_message_to_user(user_uuid: str, text: str, image_url: Optional[str] = N
                     message_id = result.get("id")
             
             if message_id:
-                logger.info(f"✅ Сообщение отправлено пользователю {user_uuid}: {text[:50]}... (message_id: {message_id})")
+                trace(logger, "Сообщение отправлено", user_id=user_uuid, message_id=message_id)
             else:
-                logger.warning(f"⚠️ Сообщение отправлено пользователю {user_uuid}, но message_id не найден в ответе. Пробуем найти по тексту...")
+                logger.warning("⚠️ Сообщение отправлено пользователю %s, но message_id не найден в ответе. Пробуем найти по тексту...", user_uuid)
                 # Пробуем найти сообщение по тексту
                 import time
                 time.sleep(1)  # Небольшая задержка, чтобы сообщение успело сохраниться
                 found_message_id = find_message_by_text(user_uuid, text)
                 if found_message_id:
                     message_id = found_message_id
-                    logger.info(f"✅ message_id найден по тексту: {message_id}")
+                    trace(logger, "message_id найден по тексту", message_id=message_id)
                 else:
-                    logger.error(f"❌ Не удалось найти message_id ни в ответе, ни по тексту сообщения")
+                    logger.error("❌ Не удалось найти message_id ни в ответе, ни по тексту сообщения")
             
-            logger.info(f"🔍 ========================================")
             return {
                 "success": True,
                 "message_id": str(message_id) if message_id else None,
@@ -150,8 +161,7 @@ def send_message_to_user(user_uuid: str, text: str, image_url: Optional[str] = N
             }
         elif response.status_code == 403:
             # Обрабатываем ошибку 403 отдельно
-            logger.error(f"❌ Ошибка 403 при отправке сообщения пользователю {user_uuid}")
-            logger.error(f"❌ Ответ API: {response.text}")
+            logger.error("❌ Ошибка 403 при отправке сообщения пользователю %s: %s", user_uuid, response.text)
             
             error_code = None
             error_message = None
@@ -161,30 +171,26 @@ def send_message_to_user(user_uuid: str, text: str, image_url: Optional[str] = N
                 error_data = response.json()
                 error_code = error_data.get("code")
                 error_message = error_data.get("message")
-                logger.error(f"❌ Код ошибки: {error_code}")
-                logger.error(f"❌ Сообщение ошибки: {error_message}")
                 
                 # Если ошибка "chat.denied" или "error.dialog.suspended", пытаемся отправить с числовым user_id
                 if error_code == "chat.denied" or (error_message and "dialog.suspended" in error_message):
-                    logger.warning(f"⚠️ Диалог приостановлен для строкового user_id. Пробуем отправить с числовым user_id...")
+                    logger.warning("⚠️ Диалог приостановлен для строкового user_id. Пробуем отправить с числовым user_id...")
                     
                     # Пробуем преобразовать user_id в число, если это строка
                     try:
                         numeric_user_id = int(user_uuid)
-                        logger.info(f"🔍 Пробуем отправить с числовым user_id: {numeric_user_id}")
                         
                         params_numeric = {
                             "access_token": token,
                             "user_id": numeric_user_id
                         }
                         
-                        response_numeric = requests.post(url, params=params_numeric, json=payload, timeout=10)
-                        logger.info(f"🔍 Статус ответа (числовой user_id): {response_numeric.status_code}")
-                        logger.info(f"🔍 Ответ API (числовой user_id): {response_numeric.text[:500]}")
+                        response_numeric = _bot_request("send_message", "POST", url, params=params_numeric, json=payload, timeout=10)
+                        trace(logger, "Ответ Max Bot API (числовой user_id): %s %.500s", response_numeric.status_code, response_numeric.text)
                         
                         if response_numeric.status_code == 200:
                             result_numeric = response_numeric.json()
-                            logger.info(f"✅ Сообщение успешно отправлено с числовым user_id!")
+                            logger.info("✅ Сообщение успешно отправлено с числовым user_id %s", numeric_user_id)
                             
                             # Извлекаем message_id
                             message_id = None
@@ -198,7 +204,6 @@ def send_message_to_user(user_uuid: str, text: str, image_url: Optional[str] = N
                                 if not message_id:
                                     message_id = result_numeric.get("message_id") or result_numeric.get("id")
                             
-                            logger.info(f"🔍 ========================================")
                             return {
                                 "success": True,
                                 "message_id": str(message_id) if message_id else None,
@@ -208,15 +213,14 @@ def send_message_to_user(user_uuid: str, text: str, image_url: Optional[str] = N
                                 "result": result_numeric
                             }
                         else:
-                            logger.error(f"❌ Ошибка при отправке с числовым user_id: {response_numeric.status_code} - {response_numeric.text}")
+                            logger.error("❌ Ошибка при отправке с числовым user_id: %s - %s", response_numeric.status_code, response_numeric.text)
                     except (ValueError, TypeError) as e:
-                        logger.warning(f"⚠️ Не удалось преобразовать user_id в число: {e}")
+                        logger.warning("⚠️ Не удалось преобразовать user_id в число: %s", e)
                 
             except Exception as e:
-                logger.warning(f"⚠️ Не удалось распарсить ответ ошибки как JSON: {e}")
+                logger.warning("⚠️ Не удалось распарсить ответ ошибки как JSON: %s", e)
                 error_message = response.text
             
-            logger.info(f"🔍 ========================================")
             return {
                 "success": False,
                 "message_id": None,
@@ -227,8 +231,7 @@ def send_message_to_user(user_uuid: str, text: str, image_url: Optional[str] = N
             }
         else:
             # Другие ошибки
-            logger.error(f"❌ Ошибка {response.status_code} при отправке сообщения пользователю {user_uuid}")
-            logger.error(f"❌ Ответ API: {response.text}")
+            logger.error("❌ Ошибка %s при отправке сообщения пользователю %s: %s", response.status_code, user_uuid, response.text)
             
             error_code = None
             error_message = None
@@ -237,13 +240,10 @@ def send_message_to_user(user_uuid: str, text: str, image_url: Optional[str] = N
                 error_data = response.json()
                 error_code = error_data.get("code")
                 error_message = error_data.get("message")
-                logger.error(f"❌ Код ошибки: {error_code}")
-                logger.error(f"❌ Сообщение ошибки: {error_message}")
             except Exception as e:
-                logger.warning(f"⚠️ Не удалось распарсить ответ ошибки как JSON: {e}")
+                logger.warning("⚠️ Не удалось распарсить ответ ошибки как JSON: %s", e)
                 error_message = response.text
             
-            logger.info(f"🔍 ========================================")
             return {
                 "success": False,
                 "message_id": None,
@@ -254,8 +254,7 @@ def send_message_to_user(user_uuid: str, text: str, image_url: Optional[str] = N
             }
             
     except requests.exceptions.Timeout as e:
-        logger.exception(f"❌ Таймаут при отправке сообщения пользователю {user_uuid}: {e}")
-        logger.info(f"🔍 ========================================")
+        logger.warning("❌ Таймаут при отправке сообщения пользователю %s: %s", user_uuid, e)
         return {
             "success": False,
             "message_id": None,
@@ -265,8 +264,7 @@ def send_message_to_user(user_uuid: str, text: str, image_url: Optional[str] = N
             "result": None
         }
     except requests.exceptions.ConnectionError as e:
-        logger.exception(f"❌ Ошибка соединения при отправке сообщения пользователю {user_uuid}: {e}")
-        logger.info(f"🔍 ========================================")
+        logger.warning("❌ Ошибка соединения при отправке сообщения пользователю %s: %s", user_uuid, e)
         return {
             "success": False,
             "message_id": None,
@@ -276,8 +274,7 @@ def send_message_to_user(user_uuid: str, text: str, image_url: Optional[str] = N
             "result": None
         }
     except Exception as e:
-        logger.exception(f"❌ Исключение при отправке сообщения пользователю {user_uuid}: {e}")
-        logger.info(f"🔍 ========================================")
+        logger.exception("❌ Исключение при отправке сообщения пользователю %s", user_uuid)
         return {
             "success": False,
             "message_id": None,
@@ -312,7 +309,7 @@ def get_messages_from_chat(user_uuid: str, limit: int = 50) -> Optional[list]:
             "limit": limit
         }
         
-        response = requests.get(url, params=params, timeout=10)
+        response = _bot_request("get_messages", "GET", url, params=params, timeout=10)
         
         if response.status_code == 200:
             result = response.json()
@@ -403,24 +400,12 @@ def delete_message(message_id: str, user_uuid: str) -> bool:
             "message_id": message_id
         }
         
-        logger.info(f"🗑️ Пытаемся удалить сообщение {message_id} для пользователя {user_uuid}")
-        logger.info(f"   URL: {url}")
-        logger.info(f"   Params: {params}")
-        logger.info(f"   Полный URL: {url}?access_token={token[:20]}...&message_id={message_id}")
-        
-        response = requests.delete(url, params=params, timeout=10)
+        trace(logger, "Удаление сообщения через Max Bot API", message_id=message_id, user_id=user_uuid)
         
-        logger.info(f"   Статус ответа: {response.status_code}")
-        logger.info(f"   Заголовки ответа: {dict(response.headers)}")
-        logger.info(f"   Тело ответа (raw): {response.text}")
+        response = _bot_request("delete_message", "DELETE", url, params=params, timeout=10)
         
         if response.status_code == 200:
-            try:
-                result = response.json()
-                logger.info(f"✅ Сообщение {message_id} успешно удалено для пользователя {user_uuid}")
-                logger.info(f"   Ответ API (JSON): {result}")
-            except:
-                logger.info(f"✅ Сообщение {message_id} успешно удалено для пользователя {user_uuid} (ответ не JSON)")
+            trace(logger, "Сообщение удалено: %.500s", response.text, message_id=message_id, user_id=user_uuid)
             return True
         else:
             logger.error(f"❌ Ошибка при удалении сообщения {message_id} для пользователя {user_uuid}: {response.status_code} - {response.text}")
@@ -0,0 +1,113 @@
+"""
+Фоновое сжатие текста существующих заметок и отчет об экономии места.
+
+Заметки, записанные через ORM, сжимаются при записи (core/compression.py). Задача
+планировщика дожимает остальные: заметки, сохраненные до включения сжатия или при большем
+пороге, и todo-заметки, выросшие через поэлементные изменения (JSON1 пишет без сжатия).
+Перезапись меняет только хранимое представление: версия, updated_at и журнал изменений
+не затрагиваются, а условие content = <прочитанное значение> защищает от гонки с обычной записью.
+"""
+import logging
+from typing import Optional
+
+from sqlalchemy import LargeBinary, cast, func, select, text
+from sqlalchemy.orm import Session
+
+from ..core.compression import encode_content, is_compressed_sql, stored_column, stored_raw_length
+from ..core.config import settings
+from ..db import engine
+from ..models.todo import Note
+
+logger = logging.getLogger(__name__)
+
+# Заметок за одну транзакцию перезаписи
+REWRITE_BATCH_SIZE = 200
+# Заголовок сжатого значения (маркер и исходная длина) заведомо короче
+_HEADER_LENGTH = 32
+
+
+def _byte_length(dialect_name: str):
+    """Длина хранимого content в байтах."""
+    content = stored_column(Note.content)
+    if dialect_name == "postgresql":
+        return func.octet_length(content)
+    return func.length(cast(content, LargeBinary))
+
+
+def rewrite_note_contents(bind, threshold: Optional[int] = None) -> dict:
+    """
+    Сжимает несжатые заметки длиннее порога. Возвращает количество перезаписанных заметок
+    и их размер до и после (байт).
+    """
+    if threshold is None:
+        threshold = settings.note_compression_threshold
+    stats = {"notes": 0, "bytes_before": 0, "bytes_after": 0}
+    if threshold <= 0:
+        return stats
+
+    content = stored_column(Note.content)
+    byte_length = _byte_length(bind.dialect.name)
+    last_id = 0
+    while True:
+        with bind.begin() as conn:
+            rows = conn.execute(
+                select(Note.id, content.label("content"))
+                .where(Note.id > last_id, byte_length > threshold, ~is_compressed_sql(Note.content))
+                .order_by(Note.id)
+                .limit(REWRITE_BATCH_SIZE)
+            ).all()
+            if not rows:
+                break
+            updates = []
+            for row in rows:
+                packed = encode_content(row.content, threshold)
+                if packed != row.content:
+                    updates.append({"note_id": row.id, "old": row.content, "packed": packed})
+                    stats["bytes_before"] += len(row.content.encode("utf-8"))
+                    stats["bytes_after"] += len(packed)
+            if updates:
+                # text(): значение уже сжато, CompressedText не должен обрабатывать его повторно
+                conn.execute(text("UPDATE notes SET content = :packed WHERE id = :note_id AND content = :old"), updates)
+            stats["notes"] += len(updates)
+        last_id = rows[-1].id
+    return stats
+
+
+def note_storage_report(db: Session) -> dict:
+    """Сколько заметок хранится сжатыми и сколько места это экономит (без распаковки)."""
+    byte_length = _byte_length(db.get_bind().dialect.name)
+    plain_notes, plain_bytes = db.query(func.count(), func.coalesce(func.sum(byte_length), 0)).filter(
+        Note.content.isnot(None), ~is_compressed_sql(Note.content)
+    ).one()
+    compressed_notes = compressed_bytes = original_bytes = 0
+    rows = db.execute(
+        select(func.substr(stored_column(Note.content), 1, _HEADER_LENGTH), byte_length)
+        .where(is_compressed_sql(Note.content))
+        .execution_options(yield_per=1000)
+    )
+    for header, stored_bytes in rows:
+        compressed_notes += 1
+        compressed_bytes += stored_bytes
+        original_bytes += stored_raw_length(header)
+    return {
+        "threshold": settings.note_compression_threshold,
+        "plain_notes": plain_notes,
+        "plain_bytes": plain_bytes,
+        "compressed_notes": compressed_notes,
+        "compressed_bytes": compressed_bytes,
+        "original_bytes": original_bytes,
+        "saved_bytes": original_bytes - compressed_bytes,
+    }
+
+
+def run_note_compression() -> None:
+    """Задача планировщика: сжатие заметок, записанных без сжатия."""
+    try:
+        stats = rewrite_note_contents(engine)
+        if stats["notes"]:
+            logger.info(
+                "Сжато заметок: %s, %s -> %s байт",
+                stats["notes"], stats["bytes_before"], stats["bytes_after"],
+            )
+    except Exception:
+        logger.exception("Ошибка фонового сжатия заметок")
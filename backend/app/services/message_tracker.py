@@ -8,6 +8,7 @@ from datetime import datetime, timedelta
 
 from .bot_service import delete_message
 from ..core.config import settings
+from ..core.metrics import Gauge
 
 logger = logging.getLogger(__name__)
 
@@ -15,6 +16,12 @@ logger = logging.getLogger(__name__)
 _sent_messages: Dict[str, Dict] = {}
 _lock = threading.Lock()
 
+TRACKED_MESSAGES = Gauge(
+    "tracked_messages",
+    "Отправленные уведомления, ожидающие удаления",
+    callback=lambda: len(_sent_messages),
+)
+
 
 def track_message(message_id: str, user_id: str, text: str) -> None:
     """
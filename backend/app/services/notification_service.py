@@ -2,12 +2,14 @@
 Сервис для отправки уведомлений о дедлайнах через планировщик задач.
 """
 import logging
+import time
 from datetime import datetime, timedelta
 from typing import Optional
 from apscheduler.schedulers.background import BackgroundScheduler
 from apscheduler.triggers.interval import IntervalTrigger
 from sqlalchemy.orm import Session
 
+from ..core.metrics import SCHEDULER_LAST_TICK, SCHEDULER_TICK_DURATION, SCHEDULER_TICKS
 from ..db import SessionLocal
 from ..models.todo import Deadline, DeadlineNotification, Note
 from ..models.user import User
@@ -271,6 +273,21 @@ def check_and_send_notifications():
         db.close()
 
 
+def _timed_job(job_id: str, func):
+    """Обертка задачи планировщика: количество запусков, длительность и время последнего запуска."""
+    def run():
+        start = time.perf_counter()
+        outcome = "error"
+        try:
+            func()
+            outcome = "ok"
+        finally:
+            SCHEDULER_TICK_DURATION.observe(time.perf_counter() - start, job_id)
+            SCHEDULER_TICKS.inc(job_id, outcome)
+            SCHEDULER_LAST_TICK.set(time.time(), job_id)
+    return run
+
+
 def start_scheduler():
     """Запускает планировщик уведомлений."""
     global scheduler
@@ -281,12 +298,30 @@ def start_scheduler():
     
     scheduler = BackgroundScheduler()
     scheduler.add_job(
-        check_and_send_notifications,
+        _timed_job('deadline_notifications', check_and_send_notifications),
         trigger=IntervalTrigger(minutes=1),
         id='deadline_notifications',
         name='Проверка и отправка уведомлений о дедлайнах',
         replace_existing=True
     )
+    # Компактация журнала изменений для /api/sync (старые надгробия)
+    from .version_service import run_change_log_compaction
+    scheduler.add_job(
+        _timed_job('change_log_compaction', run_change_log_compaction),
+        trigger=IntervalTrigger(hours=6),
+        id='change_log_compaction',
+        name='Компактация журнала изменений',
+        replace_existing=True
+    )
+    # Сжатие текста заметок, сохраненных без сжатия (NOTE_COMPRESSION_THRESHOLD)
+    from .compression_service import run_note_compression
+    scheduler.add_job(
+        _timed_job('note_compression', run_note_compression),
+        trigger=IntervalTrigger(hours=1),
+        id='note_compression',
+        name='Сжатие текста заметок',
+        replace_existing=True
+    )
     scheduler.start()
     logger.info("Планировщик уведомлений о дедлайнах запущен (проверка каждую минуту)")
 
@@ -0,0 +1,297 @@
+"""
+Полнотекстовый поиск по заметкам.
+
+На SQLite используется виртуальная таблица FTS5 notes_fts (rowid = notes.id) с колонками
+title, body и owner. body - текст заметки, для todo-заметок - тексты пунктов из JSON.
+owner - токен владельца "u<id>": он входит в выражение MATCH, поэтому FTS5 сам сужает
+поиск до заметок пользователя, а не перебирает совпадения во всей базе.
+
+Токенизатор unicode61 приводит кириллицу к нижнему регистру, но "ё" не сводит к "е",
+поэтому эта замена выполняется при индексации и в запросе (normalize_text); фрагмент
+с подсветкой, построенный по индексу, переносится на исходный текст (_restore_original).
+Каждое слово запроса ищется как префикс ("экзам" найдет "экзамен"), что частично
+заменяет стемминг для русских словоформ.
+
+Индекс обновляется в путях записи заметок (index_notes / unindex_notes) в той же транзакции
+и дозаполняется при старте приложения (ensure_notes_fts). Если FTS5 недоступен (другая СУБД
+или сборка SQLite без FTS5), поиск выполняется через LIKE без ранжирования; текст сжатых
+заметок (см. core/compression.py) при этом не просматривается, только заголовок.
+"""
+import html
+import json
+import logging
+import re
+from typing import Iterable, List, Optional, Tuple
+
+from sqlalchemy import bindparam, or_, text
+from sqlalchemy.orm import Session
+
+from ..core.compression import decode_content
+from ..models.todo import Note
+
+logger = logging.getLogger(__name__)
+
+# Сколько слов запроса учитывается и длина фрагмента (в токенах) вокруг совпадения
+MAX_QUERY_TERMS = 10
+SNIPPET_TOKENS = 12
+# Длина фрагмента в символах для поиска без FTS5
+FALLBACK_SNIPPET_LENGTH = 120
+# Заметок за один проход дозаполнения индекса при старте
+BACKFILL_BATCH_SIZE = 500
+
+_TERM = re.compile(r"\w+")
+# Маркеры подсветки внутри snippet(): заменяются на <mark> после экранирования HTML
+_MARK_START, _MARK_END = "\x02", "\x03"
+_YO = str.maketrans("ёЁ", "еЕ")
+
+# Выставляется ensure_notes_fts() при старте; без него индекс не обновляется и поиск идет через LIKE
+_fts_ready = False
+
+
+def extract_note_text(content: Optional[str]) -> str:
+    """Текст заметки для индекса: для todo-заметок - тексты пунктов, иначе content как есть."""
+    if not content:
+        return ""
+    if content.lstrip().startswith("{"):
+        try:
+            parsed = json.loads(content)
+        except ValueError:
+            return content
+        if isinstance(parsed, dict) and parsed.get("type") == "todo" and isinstance(parsed.get("items"), list):
+            return "\n".join(
+                str(item.get("text") or "") for item in parsed["items"] if isinstance(item, dict)
+            )
+    return content
+
+
+def normalize_text(value: str) -> str:
+    """Приводит текст к виду, в котором он хранится в индексе (ё -> е)."""
+    return value.translate(_YO)
+
+
+def _owner_token(user_id: int) -> str:
+    return f"u{user_id}"
+
+
+def _index_row(note_id: int, user_id: int, title: Optional[str], content: Optional[str]) -> dict:
+    return {
+        "id": note_id,
+        "title": normalize_text(title or ""),
+        "body": normalize_text(extract_note_text(content)),
+        "owner": _owner_token(user_id),
+    }
+
+
+_INSERT_ROW = text("INSERT INTO notes_fts (rowid, title, body, owner) VALUES (:id, :title, :body, :owner)")
+
+
+def ensure_notes_fts(bind) -> bool:
+    """
+    Создает notes_fts (если СУБД - SQLite с FTS5), удаляет строки удаленных заметок
+    и индексирует заметки, которых в индексе еще нет. Таблица прежнего формата (с колонкой
+    user_id вместо owner) пересоздается и заполняется заново. Возвращает, доступен ли FTS5.
+    """
+    global _fts_ready
+    if bind.dialect.name != "sqlite":
+        return False
+    try:
+        with bind.begin() as conn:
+            columns = {row[1] for row in conn.exec_driver_sql("PRAGMA table_info(notes_fts)")}
+            if columns and "owner" not in columns:
+                logger.info("Полнотекстовый индекс заметок прежнего формата: пересоздание")
+                conn.exec_driver_sql("DROP TABLE notes_fts")
+            conn.exec_driver_sql(
+                "CREATE VIRTUAL TABLE IF NOT EXISTS notes_fts USING fts5("
+                "title, body, owner, tokenize = 'unicode61 remove_diacritics 2')"
+            )
+    except Exception as e:
+        logger.warning("FTS5 недоступен, поиск по заметкам будет работать через LIKE: %s", e)
+        return False
+
+    with bind.begin() as conn:
+        conn.exec_driver_sql("DELETE FROM notes_fts WHERE rowid NOT IN (SELECT id FROM notes)")
+    indexed = 0
+    last_id = 0
+    while True:
+        with bind.begin() as conn:
+            rows = conn.execute(
+                text(
+                    "SELECT id, user_id, title, content FROM notes "
+                    "WHERE id > :last_id AND id NOT IN (SELECT rowid FROM notes_fts) "
+                    "ORDER BY id LIMIT :batch"
+                ),
+                {"last_id": last_id, "batch": BACKFILL_BATCH_SIZE},
+            ).all()
+            if not rows:
+                break
+            conn.execute(
+                _INSERT_ROW,
+                # text() возвращает хранимое значение: сжатый content распаковывается здесь
+                [_index_row(row.id, row.user_id, row.title, decode_content(row.content)) for row in rows],
+            )
+        indexed += len(rows)
+        last_id = rows[-1].id
+    if indexed:
+        logger.info("Полнотекстовый индекс заметок дозаполнен: %s заметок", indexed)
+    _fts_ready = True
+    return True
+
+
+def index_notes(db: Session, notes: Iterable[Note]) -> None:
+    """Переиндексирует заметки в текущей транзакции. Заметки должны иметь id (после flush)."""
+    index_note_values(db, ((note.id, note.user_id, note.title, note.content) for note in notes))
+
+
+def index_note_values(db: Session, values: Iterable[Tuple[int, int, Optional[str], Optional[str]]]) -> None:
+    """То же для кортежей (id, user_id, title, content) - для массовой вставки без ORM-объектов."""
+    if not _fts_ready:
+        return
+    rows = [_index_row(*value) for value in values]
+    if not rows:
+        return
+    unindex_notes(db, [row["id"] for row in rows])
+    db.execute(_INSERT_ROW, rows)
+
+
+def unindex_notes(db: Session, note_ids: Iterable[int]) -> None:
+    """Удаляет заметки из индекса в текущей транзакции."""
+    note_ids = list(note_ids)
+    if not _fts_ready or not note_ids:
+        return
+    db.execute(
+        text("DELETE FROM notes_fts WHERE rowid IN :ids").bindparams(bindparam("ids", expanding=True)),
+        {"ids": note_ids},
+    )
+
+
+def _query_terms(query: str) -> List[str]:
+    return _TERM.findall(normalize_text(query))[:MAX_QUERY_TERMS]
+
+
+def _restore_original(snippet: str, source: str) -> str:
+    """
+    snippet() строится по тексту индекса, где "ё" заменена на "е". Замена не меняет длину
+    строки, поэтому фрагмент находится в нормализованном исходном тексте, и его символы
+    берутся из исходного текста с теми же позициями. Маркеры подсветки и "…" по краям
+    (если фрагмент обрезан) сохраняются. Если фрагмент не найден, он возвращается как есть.
+    """
+    plain = snippet.replace(_MARK_START, "").replace(_MARK_END, "")
+    normalized = normalize_text(source)
+    ellipsis = "…"
+    for lead in (0, len(ellipsis)):
+        for trail in (0, len(ellipsis)):
+            if lead and not plain.startswith(ellipsis) or trail and not plain.endswith(ellipsis):
+                continue
+            core = plain[lead:len(plain) - trail]
+            start = normalized.find(core) if core else -1
+            if start < 0:
+                continue
+            original = source[start:start + len(core)]
+            result = []
+            position = 0  # позиция в plain
+            for char in snippet:
+                if char in (_MARK_START, _MARK_END):
+                    result.append(char)
+                    continue
+                if lead <= position < lead + len(core):
+                    char = original[position - lead]
+                result.append(char)
+                position += 1
+            return "".join(result)
+    return snippet
+
+
+def _highlight(snippet: str) -> str:
+    """Экранирует HTML во фрагменте и оборачивает совпадения в <mark>."""
+    return html.escape(snippet).replace(_MARK_START, "<mark>").replace(_MARK_END, "</mark>")
+
+
+def search_notes(
+    db: Session,
+    user_id: int,
+    query: str,
+    folder_id: Optional[int] = None,
+    limit: int = 20,
+    offset: int = 0,
+) -> Tuple[list, bool]:
+    """
+    Ищет заметки пользователя. Возвращает (строки, есть_еще), строки - словари
+    id, title, folder_id, is_favorite, snippet, rank (меньше - релевантнее; None без FTS5).
+    """
+    terms = _query_terms(query)
+    if not terms:
+        return [], False
+    if _fts_ready:
+        rows = _search_fts(db, user_id, terms, folder_id, limit + 1, offset)
+    else:
+        rows = _search_like(db, user_id, terms, folder_id, limit + 1, offset)
+    return rows[:limit], len(rows) > limit
+
+
+def _search_fts(db: Session, user_id: int, terms: List[str], folder_id, limit: int, offset: int) -> list:
+    # Каждое слово - строка в кавычках с префиксным поиском: спецсимволы FTS5 из запроса не интерпретируются.
+    # Слова ищутся только в title и body, токен владельца - только в owner
+    words = " ".join('"' + term.replace('"', '""') + '"*' for term in terms)
+    match = f'owner : "{_owner_token(user_id)}" AND {{title body}} : ({words})'
+    folder_filter = "AND n.folder_id = :folder_id" if folder_id is not None else ""
+    rows = db.execute(
+        text(
+            "SELECT n.id, n.title, n.content, n.folder_id, n.is_favorite, "
+            f"snippet(notes_fts, 1, :mark_start, :mark_end, '…', {SNIPPET_TOKENS}) AS body_snippet, "
+            f"snippet(notes_fts, 0, :mark_start, :mark_end, '…', {SNIPPET_TOKENS}) AS title_snippet, "
+            # Совпадение в заголовке весит больше, чем в тексте; owner не влияет на ранжирование
+            "bm25(notes_fts, 5.0, 1.0, 0.0) AS rank "
+            "FROM notes_fts JOIN notes n ON n.id = notes_fts.rowid "
+            f"WHERE notes_fts MATCH :match AND n.user_id = :user_id {folder_filter} "
+            "ORDER BY rank, n.id LIMIT :limit OFFSET :offset"
+        ),
+        {
+            "match": match,
+            "user_id": user_id,
+            "folder_id": folder_id,
+            "mark_start": _MARK_START,
+            "mark_end": _MARK_END,
+            "limit": limit,
+            "offset": offset,
+        },
+    ).all()
+    return [
+        {
+            "id": row.id,
+            "title": row.title,
+            "folder_id": row.folder_id,
+            "is_favorite": bool(row.is_favorite),
+            "snippet": _highlight(_row_snippet(row)),
+            "rank": row.rank,
+        }
+        for row in rows
+    ]
+
+
+def _row_snippet(row) -> str:
+    """Фрагмент текста с совпадением, если оно есть в тексте, иначе - фрагмент заголовка."""
+    if _MARK_START in (row.body_snippet or "") or _MARK_START not in (row.title_snippet or ""):
+        # text() возвращает хранимое значение: сжатый content распаковывается здесь
+        return _restore_original(row.body_snippet or "", extract_note_text(decode_content(row.content)))
+    return _restore_original(row.title_snippet, row.title or "")
+
+
+def _search_like(db: Session, user_id: int, terms: List[str], folder_id, limit: int, offset: int) -> list:
+    query = db.query(Note).filter(Note.user_id == user_id)
+    if folder_id is not None:
+        query = query.filter(Note.folder_id == folder_id)
+    for term in terms:
+        pattern = f"%{term}%"
+        query = query.filter(or_(Note.title.ilike(pattern), Note.content.ilike(pattern)))
+    notes = query.order_by(Note.updated_at.desc(), Note.id.desc()).limit(limit).offset(offset).all()
+    return [
+        {
+            "id": note.id,
+            "title": note.title,
+            "folder_id": note.folder_id,
+            "is_favorite": bool(note.is_favorite),
+            "snippet": html.escape(extract_note_text(note.content)[:FALLBACK_SNIPPET_LENGTH]),
+            "rank": None,
+        }
+        for note in notes
+    ]
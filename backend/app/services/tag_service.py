@@ -0,0 +1,219 @@
+"""
+Общие операции с тегами: цвет тега по имени и пакетное получение тегов по именам.
+
+Имя тега глобально уникально, а id и цвет тега не меняются, поэтому соответствие
+имя -> (id, цвет) кэшируется в памяти процесса (ограниченный LRU, TAG_CACHE_SIZE).
+Недостающие теги создаются через INSERT ... ON CONFLICT DO NOTHING: два одновременных
+сохранения с одним новым хэштегом не падают на уникальности tags.name, второе просто
+находит тег первого. Теги, созданные в текущей транзакции, попадают в кэш только после
+ее фиксации (при откате id был бы недействительным).
+
+Счетчики использования тегов пользователем (tag_usage) меняются на разницу при каждом
+изменении связей note_tag/task_tag: change_tag_usage, release_item_tags и release_tags_by_item_ids.
+"""
+import hashlib
+import logging
+import threading
+from collections import Counter, OrderedDict
+from typing import Dict, Iterable, Set, Tuple
+
+from sqlalchemy import case, delete, event, exists, func, literal, select, union_all
+from sqlalchemy.orm import Session
+
+from ..core.config import settings
+from ..db import dialect_insert
+from ..models.todo import Note, Tag, TagUsage, Task, note_tag, task_tag
+
+logger = logging.getLogger(__name__)
+
+TAG_COLORS = [
+    "#FF6B6B", "#4ECDC4", "#45B7D1", "#FFA07A", "#98D8C8",
+    "#F7DC6F", "#BB8FCE", "#85C1E2", "#F8B739", "#52BE80",
+    "#EC7063", "#5DADE2", "#F4D03F", "#82E0AA", "#F1948A",
+    "#7FB3D3", "#F5B041", "#AED6F1", "#A9DFBF", "#F9E79F"
+]
+
+# Ключ Session.info: теги, созданные в текущей транзакции, {имя: (id, цвет)}
+_PENDING_KEY = "created_tags"
+
+
+def generate_color(name: str) -> str:
+    """Генерирует цвет на основе имени тега"""
+    hash_int = int(hashlib.md5(name.encode()).hexdigest(), 16)
+    return TAG_COLORS[hash_int % len(TAG_COLORS)]
+
+
+class TagCache:
+    """Потокобезопасный LRU-кэш имя тега -> (id, цвет) ограниченного размера."""
+
+    def __init__(self, max_size: int):
+        self.max_size = max_size
+        self._entries: "OrderedDict[str, Tuple[int, str]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get_many(self, names: Iterable[str]) -> Dict[str, Tuple[int, str]]:
+        found = {}
+        with self._lock:
+            for name in names:
+                tag = self._entries.get(name)
+                if tag is not None:
+                    self._entries.move_to_end(name)
+                    found[name] = tag
+        return found
+
+    def put_many(self, tags: Dict[str, Tuple[int, str]]) -> None:
+        if self.max_size <= 0 or not tags:
+            return
+        with self._lock:
+            for name, tag in tags.items():
+                self._entries[name] = tag
+                self._entries.move_to_end(name)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+tag_cache = TagCache(settings.tag_cache_size)
+
+
+@event.listens_for(Session, "after_commit")
+def _publish_created_tags(session: Session) -> None:
+    tag_cache.put_many(session.info.pop(_PENDING_KEY, None))
+
+
+@event.listens_for(Session, "after_transaction_end")
+def _discard_created_tags(session: Session, transaction) -> None:
+    # После фиксации список уже опубликован; здесь остается только откат
+    if transaction.parent is None:
+        session.info.pop(_PENDING_KEY, None)
+
+
+def _select_tags(db: Session, names: Set[str]) -> Dict[str, Tuple[int, str]]:
+    rows = db.query(Tag.name, Tag.id, Tag.color).filter(Tag.name.in_(names)).all()
+    return {name: (tag_id, color) for name, tag_id, color in rows}
+
+
+def resolve_tags(db: Session, names: Iterable[str]) -> Dict[str, Tuple[int, str]]:
+    """
+    Возвращает {имя: (id, цвет)} для тегов с указанными именами, создавая недостающие.
+    Известные теги берутся из кэша без запросов; на остальные - одна выборка и, если теги
+    новые, один INSERT ... ON CONFLICT DO NOTHING RETURNING (плюс выборка тегов, которые
+    одновременно создал другой запрос).
+    """
+    names = set(names)
+    if not names:
+        return {}
+    tags = tag_cache.get_many(names)
+    pending = db.info.get(_PENDING_KEY, {})
+    tags.update((name, pending[name]) for name in names - tags.keys() if name in pending)
+    missing = names - tags.keys()
+    if not missing:
+        return tags
+
+    found = _select_tags(db, missing)
+    tag_cache.put_many(found)
+    tags.update(found)
+    missing -= found.keys()
+    if missing:
+        stmt = dialect_insert(db, Tag).values([{"name": name, "color": generate_color(name)} for name in missing])
+        stmt = stmt.on_conflict_do_nothing(index_elements=[Tag.name]).returning(Tag.name, Tag.id, Tag.color)
+        created = {name: (tag_id, color) for name, tag_id, color in db.execute(stmt)}
+        db.info.setdefault(_PENDING_KEY, {}).update(created)
+        tags.update(created)
+        missing -= created.keys()
+        if missing:
+            # Теги, созданные параллельным запросом между выборкой и INSERT
+            concurrent = _select_tags(db, missing)
+            tag_cache.put_many(concurrent)
+            tags.update(concurrent)
+    return tags
+
+
+def resolve_tag_ids(db: Session, names: Iterable[str]) -> Dict[str, int]:
+    """Возвращает {имя: id} для тегов с указанными именами, создавая недостающие (см. resolve_tags)."""
+    return {name: tag_id for name, (tag_id, _) in resolve_tags(db, names).items()}
+
+
+def change_tag_usage(db: Session, user_id: int, deltas: Dict[int, int], is_note: bool) -> None:
+    """
+    Изменяет счетчик заметок (is_note) или задач пользователя для тегов {id тега: разница}.
+    Один INSERT ... ON CONFLICT DO UPDATE на все теги; строки с нулевыми счетчиками удаляются.
+    """
+    deltas = {tag_id: delta for tag_id, delta in deltas.items() if delta}
+    if not deltas:
+        return
+    column = "note_count" if is_note else "task_count"
+    other = "task_count" if is_note else "note_count"
+    stmt = dialect_insert(db, TagUsage).values([
+        {"user_id": user_id, "tag_id": tag_id, column: delta, other: 0} for tag_id, delta in deltas.items()
+    ])
+    delta = stmt.excluded[column]
+    db.execute(stmt.on_conflict_do_update(
+        index_elements=[TagUsage.user_id, TagUsage.tag_id],
+        set_={
+            column: TagUsage.__table__.c[column] + delta,
+            "last_used_at": case((delta > 0, func.now()), else_=TagUsage.last_used_at),
+        },
+    ))
+    released = [tag_id for tag_id, delta in deltas.items() if delta < 0]
+    if released:
+        db.execute(delete(TagUsage).where(
+            TagUsage.user_id == user_id,
+            TagUsage.tag_id.in_(released),
+            TagUsage.note_count <= 0,
+            TagUsage.task_count <= 0,
+        ))
+
+
+def release_item_tags(db: Session, user_id: int, items: Iterable, is_note: bool) -> None:
+    """Уменьшает счетчики тегов удаляемых заметок или задач (item.tags уже загружены)."""
+    deltas = Counter()
+    for item in items:
+        for tag in item.tags:
+            deltas[tag.id] -= 1
+    change_tag_usage(db, user_id, deltas, is_note)
+
+
+def release_tags_by_item_ids(db: Session, user_id: int, item_ids: Iterable[int], is_note: bool) -> None:
+    """
+    То же, что release_item_tags, для удаления без загрузки объектов: разница счетчиков
+    берется одним сгруппированным запросом к note_tag/task_tag.
+    """
+    association, id_column = (note_tag, "note_id") if is_note else (task_tag, "task_id")
+    rows = db.execute(
+        select(association.c.tag_id, func.count())
+        .where(association.c[id_column].in_(list(item_ids)))
+        .group_by(association.c.tag_id)
+    )
+    change_tag_usage(db, user_id, {tag_id: -count for tag_id, count in rows}, is_note)
+
+
+def backfill_tag_usage(bind) -> int:
+    """
+    Заполняет tag_usage по note_tag/task_tag для пользователей, у которых строк еще нет
+    (при старте приложения и в migrate_tag_usage.py). Возвращает количество добавленных строк.
+    """
+    links = union_all(
+        select(Note.user_id, note_tag.c.tag_id, literal(1).label("notes"), literal(0).label("tasks"), Note.updated_at.label("used_at"))
+        .join(Note, Note.id == note_tag.c.note_id),
+        select(Task.user_id, task_tag.c.tag_id, literal(0), literal(1), Task.created_at)
+        .join(Task, Task.id == task_tag.c.task_id),
+    ).subquery()
+    rows = (
+        select(links.c.user_id, links.c.tag_id, func.sum(links.c.notes), func.sum(links.c.tasks), func.max(links.c.used_at))
+        .where(~exists().where(TagUsage.user_id == links.c.user_id))
+        .group_by(links.c.user_id, links.c.tag_id)
+    )
+    with bind.begin() as conn:
+        filled = conn.execute(TagUsage.__table__.insert().from_select(
+            ["user_id", "tag_id", "note_count", "task_count", "last_used_at"], rows
+        )).rowcount
+    if filled:
+        logger.info("Таблица tag_usage заполнена: %s строк", filled)
+    return filled
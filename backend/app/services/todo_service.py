@@ -0,0 +1,404 @@
+"""
+Изменение отдельных пунктов todo-заметок.
+
+Todo-заметка хранит пункты одним JSON-документом в Note.content:
+{"type": "todo", "items": [{"id": ..., "text": ..., "completed": ...}, ...]}.
+Раньше любое изменение (отметка одного пункта) отправляло с клиента весь content через
+PATCH /api/notes/{id}, а тот пересчитывал теги и перечитывал заметку с дедлайном.
+
+Здесь каждое изменение выполняется на сервере одним UPDATE ... RETURNING: на SQLite документ
+меняется функциями JSON1 (json_set, json_remove; вставка и перемещение пересобирают массив
+json_group_array), RETURNING отдает только измененный пункт. Теги, дедлайн и остальные поля
+заметки не затрагиваются. На других СУБД документ меняется в Python и записывается условным
+UPDATE по версии (compare-and-set).
+
+Notes.version увеличивается при каждом изменении документа. Если клиент передал ожидаемую
+версию, она проверяется в том же UPDATE; при расхождении - TodoPatchError с кодом 409.
+Если UPDATE не изменил ни одной строки, причина (нет заметки, не todo, нет пункта, версия)
+выясняется отдельным запросом - только на пути ошибки.
+
+Пункты также хранятся построчно в todo_items (позиция, текст, отметка) для запросов по всем
+заметкам пользователя. Таблица поддерживается при каждой записи content: sync_todo_items()
+в create/update заметки и импорте, точечный UPDATE строки при отметке и правке пункта.
+Для существующих заметок она заполняется при старте (backfill_todo_items).
+
+Сжатый content (core/compression.py) функциям JSON1 недоступен: такие заметки на SQLite
+меняются тем же путем compare-and-set, что и на других СУБД.
+"""
+import json
+import logging
+from typing import Any, Callable, Iterable, List, NamedTuple, Optional, Tuple
+
+from sqlalchemy import delete, exists, insert, or_, select, text, update
+from sqlalchemy.orm import Session
+
+from ..core.compression import decode_content, encode_content, is_compressed, is_compressed_sql, stored_column
+from ..models.todo import Note, TodoItem
+
+logger = logging.getLogger(__name__)
+
+# Заметок за один проход заполнения todo_items при старте
+BACKFILL_BATCH_SIZE = 500
+
+
+class TodoPatchError(Exception):
+    def __init__(self, status_code: int, detail: str):
+        super().__init__(detail)
+        self.status_code = status_code
+        self.detail = detail
+
+
+class TodoPatchResult(NamedTuple):
+    version: int
+    item: Optional[dict]  # None после удаления
+    # title и content заметки - только если изменился текст (для полнотекстового индекса)
+    title: Optional[str] = None
+    content: Optional[str] = None
+
+
+# Пункты документа и позиция (key) пункта :item_id / :after_id в массиве items
+_ITEMS = "json_each(notes.content, '$.items')"
+_ITEM_KEY = f"(SELECT key FROM {_ITEMS} WHERE json_extract(value, '$.id') = :item_id LIMIT 1)"
+_AFTER_KEY = f"(SELECT key FROM {_ITEMS} WHERE json_extract(value, '$.id') = :after_id LIMIT 1)"
+_ITEM_PATH = f"'$.items[' || {_ITEM_KEY} || ']'"
+_ITEM_EXISTS = f"EXISTS (SELECT 1 FROM {_ITEMS} WHERE json_extract(value, '$.id') = :item_id)"
+_AFTER_EXISTS = f"EXISTS (SELECT 1 FROM {_ITEMS} WHERE json_extract(value, '$.id') = :after_id)"
+_IS_TODO = (
+    "json_valid(notes.content) AND json_extract(notes.content, '$.type') = 'todo' "
+    "AND json_type(notes.content, '$.items') = 'array'"
+)
+# Пункт в RETURNING: после UPDATE notes.content - уже новый документ
+_RETURN_ITEM = f"(SELECT value FROM {_ITEMS} WHERE json_extract(value, '$.id') = :item_id LIMIT 1)"
+
+
+def _json_bool(param: str) -> str:
+    return f"json(CASE WHEN :{param} THEN 'true' ELSE 'false' END)"
+
+
+def _rebuild_items(ordered_select: str) -> str:
+    """
+    Новый массив items из подзапроса (value, pos), упорядоченного по pos.
+    json() возвращает результату JSON-подтип, который теряется при выходе из подзапроса.
+    """
+    return (
+        "json_set(notes.content, '$.items', json((SELECT json_group_array(json(value)) "
+        f"FROM ({ordered_select} ORDER BY pos))))"
+    )
+
+
+def _is_sqlite(db: Session) -> bool:
+    return db.get_bind().dialect.name == "sqlite"
+
+
+def parse_todo_items(content: Optional[str]) -> Optional[list]:
+    """Список items todo-заметки или None, если content - не todo-документ."""
+    if not content or not content.lstrip().startswith("{"):
+        return None
+    try:
+        document = json.loads(content)
+    except ValueError:
+        return None
+    if isinstance(document, dict) and document.get("type") == "todo" and isinstance(document.get("items"), list):
+        return document["items"]
+    return None
+
+
+def _item_id(item: dict) -> Optional[int]:
+    value = item.get("id")
+    return value if isinstance(value, int) and not isinstance(value, bool) else None
+
+
+def sync_todo_items(db: Session, note_id: int, user_id: int, content: Optional[str]) -> None:
+    """Пересобирает строки todo_items заметки по ее content. Не коммитит."""
+    sync_todo_item_values(db, [(note_id, user_id, content)])
+
+
+def sync_todo_item_values(db, values: Iterable[Tuple[int, int, Optional[str]]]) -> None:
+    """То же для нескольких заметок: кортежи (note_id, user_id, content). db - сессия или соединение."""
+    values = list(values)
+    if not values:
+        return
+    db.execute(delete(TodoItem).where(TodoItem.note_id.in_([note_id for note_id, _, _ in values])))
+    rows = []
+    for note_id, user_id, content in values:
+        for position, item in enumerate(parse_todo_items(content) or ()):
+            if not isinstance(item, dict):
+                continue
+            rows.append({
+                "note_id": note_id,
+                "user_id": user_id,
+                "item_id": _item_id(item),
+                "position": position,
+                "text": str(item.get("text") or ""),
+                "done": bool(item.get("completed")),
+            })
+    if rows:
+        db.execute(insert(TodoItem), rows)
+
+
+def _update_item_row(db: Session, note_id: int, item: dict) -> None:
+    """Точечное обновление строки пункта после правки или отметки (позиции не меняются)."""
+    db.execute(
+        update(TodoItem)
+        .where(TodoItem.note_id == note_id, TodoItem.item_id == item["id"])
+        .values(text=str(item.get("text") or ""), done=bool(item.get("completed")))
+    )
+
+
+def backfill_todo_items(bind) -> int:
+    """
+    Заполняет todo_items для todo-заметок, у которых строк еще нет (при старте приложения
+    и в migrate_todo_items.py). Возвращает количество обработанных заметок.
+    """
+    filled = 0
+    last_id = 0
+    while True:
+        with bind.begin() as conn:
+            rows = conn.execute(
+                select(Note.id, Note.user_id, Note.content)
+                .where(
+                    Note.id > last_id,
+                    or_(stored_column(Note.content).like('%"todo"%'), is_compressed_sql(Note.content)),
+                    ~exists().where(TodoItem.note_id == Note.id),
+                )
+                .order_by(Note.id)
+                .limit(BACKFILL_BATCH_SIZE)
+            ).all()
+            if not rows:
+                break
+            sync_todo_item_values(conn, [(row.id, row.user_id, row.content) for row in rows])
+        filled += len(rows)
+        last_id = rows[-1].id
+    if filled:
+        logger.info("Таблица todo_items заполнена: %s заметок", filled)
+    return filled
+
+
+def _find(items: List[Any], item_id: int) -> int:
+    for index, item in enumerate(items):
+        if isinstance(item, dict) and item.get("id") == item_id:
+            return index
+    raise TodoPatchError(404, "Пункт не найден")
+
+
+def _load_document(db: Session, note_id: int, user_id: int, version: Optional[int]):
+    """
+    Читает документ заметки и проверяет все условия изменения.
+    Возвращает (версия, документ, хранится ли content сжатым).
+    """
+    row = db.execute(
+        text("SELECT version, content FROM notes WHERE id = :note_id AND user_id = :user_id"),
+        {"note_id": note_id, "user_id": user_id},
+    ).first()
+    if row is None:
+        raise TodoPatchError(404, "Заметка не найдена")
+    try:
+        document = json.loads(decode_content(row.content) or "")
+    except ValueError:
+        document = None
+    if not isinstance(document, dict) or document.get("type") != "todo" or not isinstance(document.get("items"), list):
+        raise TodoPatchError(400, "Заметка не является todo-заметкой")
+    if version is not None and version != row.version:
+        raise TodoPatchError(409, f"Заметка изменена: текущая версия {row.version}")
+    return row.version, document, is_compressed(row.content)
+
+
+def _apply(
+    db: Session,
+    note_id: int,
+    user_id: int,
+    version: Optional[int],
+    mutate: Callable[[List[Any]], Optional[dict]],
+    content_sql: str,
+    guards: List[str],
+    returning_item: str,
+    params: dict,
+    with_content: bool,
+) -> TodoPatchResult:
+    """
+    Выполняет изменение. mutate(items) - то же изменение над списком пунктов в Python:
+    используется вне SQLite и для определения причины, если UPDATE не сработал
+    (в этом случае его результат отбрасывается). with_content - вернуть title и content заметки.
+    """
+    if not _is_sqlite(db):
+        return _apply_compare_and_set(db, note_id, user_id, version, mutate, with_content)
+
+    conditions = ["id = :note_id", "user_id = :user_id", _IS_TODO, *guards]
+    if version is not None:
+        conditions.append("version = :version")
+    returning = f"version, {returning_item} AS item"
+    if with_content:
+        returning += ", title, content"
+    row = db.execute(
+        text(
+            f"UPDATE notes SET content = {content_sql}, version = version + 1, updated_at = CURRENT_TIMESTAMP "
+            f"WHERE {' AND '.join(conditions)} RETURNING {returning}"
+        ),
+        {**params, "note_id": note_id, "user_id": user_id, "version": version},
+    ).first()
+    if row is None:
+        _, document, compressed = _load_document(db, note_id, user_id, version)
+        if compressed:
+            return _apply_compare_and_set(db, note_id, user_id, version, mutate, with_content)
+        mutate(document["items"])
+        # Все условия выполняются сейчас - значит, заметка изменилась между запросами
+        raise TodoPatchError(409, "Заметка изменена, повторите запрос")
+    item = json.loads(row.item) if row.item is not None else None
+    if with_content:
+        return TodoPatchResult(row.version, item, row.title, row.content)
+    return TodoPatchResult(row.version, item)
+
+
+def _apply_compare_and_set(db: Session, note_id: int, user_id: int, version, mutate, with_content: bool) -> TodoPatchResult:
+    current_version, document, _ = _load_document(db, note_id, user_id, version)
+    item = mutate(document["items"])
+    content = json.dumps(document, ensure_ascii=False)
+    row = db.execute(
+        text(
+            "UPDATE notes SET content = :content, version = version + 1, updated_at = CURRENT_TIMESTAMP "
+            "WHERE id = :note_id AND version = :version RETURNING version, title"
+        ),
+        {"content": encode_content(content), "note_id": note_id, "version": current_version},
+    ).first()
+    if row is None:
+        raise TodoPatchError(409, "Заметка изменена, повторите запрос")
+    if with_content:
+        return TodoPatchResult(row.version, item, row.title, content)
+    return TodoPatchResult(row.version, item)
+
+
+def add_item(
+    db: Session,
+    note_id: int,
+    user_id: int,
+    item_text: str,
+    completed: bool = False,
+    after_id: Optional[int] = None,
+    version: Optional[int] = None,
+) -> TodoPatchResult:
+    """Добавляет пункт после after_id (None - в конец). id пункта - максимальный id + 1."""
+    def mutate(items):
+        position = _find(items, after_id) + 1 if after_id is not None else len(items)
+        ids = [item["id"] for item in items if isinstance(item, dict) and isinstance(item.get("id"), int)]
+        item = {"id": max(ids, default=0) + 1, "text": item_text, "completed": completed}
+        items.insert(position, item)
+        return item
+
+    new_id = f"(SELECT coalesce(max(json_extract(value, '$.id')), 0) + 1 FROM {_ITEMS})"
+    new_item = f"json_object('id', {new_id}, 'text', :text, 'completed', {_json_bool('completed')})"
+    params = {"text": item_text, "completed": completed, "after_id": after_id}
+    if after_id is None:
+        content_sql = f"json_insert(notes.content, '$.items[#]', {new_item})"
+        guards = []
+        returning_item = "json_extract(notes.content, '$.items[#-1]')"
+    else:
+        content_sql = _rebuild_items(
+            f"SELECT value, key * 2 AS pos FROM {_ITEMS} UNION ALL SELECT {new_item}, {_AFTER_KEY} * 2 + 1"
+        )
+        guards = [_AFTER_EXISTS]
+        returning_item = f"json_extract(notes.content, '$.items[' || ({_AFTER_KEY} + 1) || ']')"
+    result = _apply(db, note_id, user_id, version, mutate, content_sql, guards, returning_item, params, with_content=True)
+    sync_todo_items(db, note_id, user_id, result.content)
+    return result
+
+
+def update_item(
+    db: Session,
+    note_id: int,
+    user_id: int,
+    item_id: int,
+    item_text: Optional[str] = None,
+    completed: Optional[bool] = None,
+    version: Optional[int] = None,
+) -> TodoPatchResult:
+    """Меняет текст и/или отметку пункта (переданные значения, None - не менять)."""
+    def mutate(items):
+        item = items[_find(items, item_id)]
+        if item_text is not None:
+            item["text"] = item_text
+        if completed is not None:
+            item["completed"] = completed
+        return item
+
+    if item_text is None and completed is None:
+        raise TodoPatchError(400, "Нет изменяемых полей")
+    assignments = []
+    if item_text is not None:
+        assignments.append(f"{_ITEM_PATH} || '.text', :text")
+    if completed is not None:
+        assignments.append(f"{_ITEM_PATH} || '.completed', {_json_bool('completed')}")
+    content_sql = f"json_set(notes.content, {', '.join(assignments)})"
+    result = _apply(
+        db, note_id, user_id, version, mutate, content_sql, [_ITEM_EXISTS], _RETURN_ITEM,
+        {"item_id": item_id, "text": item_text, "completed": completed},
+        with_content=item_text is not None,
+    )
+    _update_item_row(db, note_id, result.item)
+    return result
+
+
+def toggle_item(db: Session, note_id: int, user_id: int, item_id: int, version: Optional[int] = None) -> TodoPatchResult:
+    """Инвертирует отметку пункта."""
+    def mutate(items):
+        item = items[_find(items, item_id)]
+        item["completed"] = not item.get("completed")
+        return item
+
+    path = f"{_ITEM_PATH} || '.completed'"
+    content_sql = (
+        f"json_set(notes.content, {path}, "
+        f"json(CASE WHEN json_extract(notes.content, {path}) THEN 'false' ELSE 'true' END))"
+    )
+    result = _apply(
+        db, note_id, user_id, version, mutate, content_sql, [_ITEM_EXISTS], _RETURN_ITEM,
+        {"item_id": item_id}, with_content=False,
+    )
+    _update_item_row(db, note_id, result.item)
+    return result
+
+
+def move_item(
+    db: Session,
+    note_id: int,
+    user_id: int,
+    item_id: int,
+    after_id: Optional[int] = None,
+    version: Optional[int] = None,
+) -> TodoPatchResult:
+    """Переставляет пункт после after_id (None - в начало списка)."""
+    if after_id == item_id:
+        raise TodoPatchError(400, "Пункт нельзя поставить после самого себя")
+
+    def mutate(items):
+        item = items.pop(_find(items, item_id))
+        position = _find(items, after_id) + 1 if after_id is not None else 0
+        items.insert(position, item)
+        return item
+
+    target = f"{_AFTER_KEY} * 2 + 1" if after_id is not None else "-1"
+    content_sql = _rebuild_items(
+        f"SELECT value, CASE WHEN json_extract(value, '$.id') = :item_id THEN {target} ELSE key * 2 END AS pos "
+        f"FROM {_ITEMS}"
+    )
+    guards = [_ITEM_EXISTS] + ([_AFTER_EXISTS] if after_id is not None else [])
+    result = _apply(
+        db, note_id, user_id, version, mutate, content_sql, guards, _RETURN_ITEM,
+        {"item_id": item_id, "after_id": after_id}, with_content=True,
+    )
+    sync_todo_items(db, note_id, user_id, result.content)
+    # Текст не менялся - переиндексация не нужна
+    return result._replace(title=None, content=None)
+
+
+def delete_item(db: Session, note_id: int, user_id: int, item_id: int, version: Optional[int] = None) -> TodoPatchResult:
+    """Удаляет пункт."""
+    def mutate(items):
+        items.pop(_find(items, item_id))
+        return None
+
+    result = _apply(
+        db, note_id, user_id, version, mutate, f"json_remove(notes.content, {_ITEM_PATH})", [_ITEM_EXISTS], "NULL",
+        {"item_id": item_id}, with_content=True,
+    )
+    sync_todo_items(db, note_id, user_id, result.content)
+    return result
@@ -0,0 +1,94 @@
+"""
+Сервис идентификации пользователей Max: единый атомарный upsert для всех точек входа
+(/auth/webapp-init, /webhook и отдельный webhook-сервер).
+"""
+import logging
+from typing import Optional, Tuple
+
+from sqlalchemy import case, literal, select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session, aliased
+
+from ..db import dialect_insert
+from ..models.user import User
+
+logger = logging.getLogger(__name__)
+
+
+def extract_identity(user_data: dict) -> Optional[Tuple[str, str]]:
+    """
+    Извлекает (uuid, username) из объекта пользователя Max (initData.user или update.user).
+
+    Returns:
+        Кортеж (uuid, username) или None, если в данных нет user_id
+    """
+    if not isinstance(user_data, dict):
+        return None
+
+    user_id = user_data.get("user_id") or user_data.get("id")
+    if not user_id:
+        return None
+
+    # Используем username из Max, если есть, иначе формируем из полного имени
+    username = user_data.get("username")
+    if not username:
+        first_name = user_data.get("first_name") or user_data.get("name") or ""
+        last_name = user_data.get("last_name") or ""
+        full_name = f"{first_name} {last_name}".strip() or f"user_{user_id}"
+        username = f"max_{user_id}_{full_name}".strip()
+
+    return str(user_id), username
+
+
+def _upsert_statement(db: Session, uuid: str, username: str, fallback: bool):
+    other = aliased(User)
+    username_taken = (
+        select(other.id)
+        .where(other.username == username, other.uuid != uuid)
+        .exists()
+    )
+    if fallback:
+        # Повтор после конфликта по username: новый пользователь сразу получает "<username>_<uuid>",
+        # существующий сохраняет свой username
+        insert_username, update_username = literal(f"{username}_{uuid}"), User.username
+    else:
+        insert_username = case((username_taken, literal(f"{username}_{uuid}")), else_=literal(username))
+        update_username = case((username_taken, User.username), else_=literal(username))
+    stmt = dialect_insert(db, User).values(uuid=uuid, username=insert_username)
+    return stmt.on_conflict_do_update(
+        index_elements=[User.uuid],
+        set_={"username": update_username},
+    ).returning(User)
+
+
+def upsert_user(db: Session, uuid: str, username: str) -> User:
+    """
+    Создает пользователя или обновляет существующего одним запросом
+    INSERT ... ON CONFLICT(uuid) DO UPDATE ... RETURNING и фиксирует транзакцию.
+
+    Коллизии username разрешаются в том же запросе:
+    - новый пользователь с занятым username получает username вида "<username>_<uuid>";
+    - существующему пользователю username меняется, только если новый не занят другим.
+    Проверка занятости не видит параллельную незафиксированную вставку того же username
+    (PostgreSQL): тогда запрос падает на уникальном индексе users.username, транзакция
+    откатывается и запрос повторяется один раз с "<username>_<uuid>".
+    """
+    options = {"populate_existing": True}
+    try:
+        user = db.scalars(_upsert_statement(db, uuid, username, fallback=False), execution_options=options).one()
+    except IntegrityError:
+        db.rollback()
+        logger.info("Конфликт username %r при входе uuid=%s, повтор с \"<username>_<uuid>\"", username, uuid)
+        user = db.scalars(_upsert_statement(db, uuid, username, fallback=True), execution_options=options).one()
+    db.commit()
+    return user
+
+
+def upsert_user_from_data(db: Session, user_data: dict) -> Optional[User]:
+    """Upsert пользователя по объекту пользователя Max. Возвращает None, если в данных нет user_id."""
+    identity = extract_identity(user_data)
+    if identity is None:
+        logger.warning("⚠️ Нет user_id в данных пользователя")
+        return None
+    uuid, username = identity
+    return upsert_user(db, uuid, username)
@@ -0,0 +1,118 @@
+"""
+Версии данных пользователя и журнал изменений.
+
+Каждая запись в crud.py и settings.py вызывает record_changes() в той же транзакции:
+версия пользователя увеличивается на 1, а в change_log для каждой затронутой сущности
+сохраняется последняя операция с этой версией. На этом построены ETag / 304
+(см. deps.user_etag) и дельта-синхронизация GET /api/sync?since=<version>.
+"""
+import logging
+from datetime import datetime, timedelta, timezone
+from typing import Iterable, Tuple
+
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+
+from ..core.config import settings
+from ..db import SessionLocal, dialect_insert
+from ..models.sync import ChangeLog, UserVersion
+
+logger = logging.getLogger(__name__)
+
+ENTITY_NOTE = "note"
+ENTITY_FOLDER = "folder"
+ENTITY_DEADLINE = "deadline"  # entity_id = note_id
+ENTITY_SETTINGS = "settings"  # entity_id = user_id
+
+OP_UPSERT = "upsert"
+OP_DELETE = "delete"
+
+
+def bump_user_version(db: Session, user_id: int) -> int:
+    """Увеличивает версию пользователя одним INSERT ... ON CONFLICT DO UPDATE. Не коммитит."""
+    stmt = dialect_insert(db, UserVersion).values(user_id=user_id, version=1)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[UserVersion.user_id],
+        set_={"version": UserVersion.version + 1},
+    ).returning(UserVersion.version)
+    return db.execute(stmt).scalar_one()
+
+
+def get_user_version(db: Session, user_id: int) -> int:
+    """Текущая версия пользователя (0, если изменений еще не было)."""
+    version = db.query(UserVersion.version).filter(UserVersion.user_id == user_id).scalar()
+    return version or 0
+
+
+def record_changes(db: Session, user_id: int, changes: Iterable[Tuple[str, int, str]] = ()) -> int:
+    """
+    Увеличивает версию пользователя и записывает изменения (entity_type, entity_id, op)
+    в change_log с этой версией. Не коммитит. Возвращает новую версию.
+    """
+    version = bump_user_version(db, user_id)
+    # Одна строка на сущность: при повторе в одном вызове побеждает последняя операция
+    latest = {(entity_type, entity_id): op for entity_type, entity_id, op in changes}
+    if latest:
+        now = datetime.now(timezone.utc)
+        stmt = dialect_insert(db, ChangeLog).values([
+            {
+                "user_id": user_id,
+                "entity_type": entity_type,
+                "entity_id": entity_id,
+                "op": op,
+                "version": version,
+                "changed_at": now,
+            }
+            for (entity_type, entity_id), op in latest.items()
+        ])
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[ChangeLog.user_id, ChangeLog.entity_type, ChangeLog.entity_id],
+            set_={"op": stmt.excluded.op, "version": stmt.excluded.version, "changed_at": stmt.excluded.changed_at},
+        )
+        db.execute(stmt)
+    return version
+
+
+def require_full_resync(db: Session, user_id: int) -> int:
+    """
+    Увеличивает версию и делает ее границей компактации: следующий /api/sync с более старым
+    since вернет полную выдачу. Для массовых изменений (импорт), которые не пишутся в change_log.
+    """
+    version = bump_user_version(db, user_id)
+    db.query(UserVersion).filter(UserVersion.user_id == user_id).update(
+        {UserVersion.compacted_version: version}, synchronize_session=False
+    )
+    return version
+
+
+def compact_change_log(db: Session, retention_days: int) -> int:
+    """
+    Удаляет надгробия старше retention_days и сдвигает compacted_version пользователей,
+    чтобы /api/sync с более старым since отвечал полной пересинхронизацией.
+    Возвращает количество удаленных строк.
+    """
+    cutoff = datetime.now(timezone.utc) - timedelta(days=retention_days)
+    expired = (ChangeLog.op == OP_DELETE) & (ChangeLog.changed_at < cutoff)
+    per_user = db.query(ChangeLog.user_id, func.max(ChangeLog.version)).filter(expired).group_by(ChangeLog.user_id).all()
+    for user_id, max_version in per_user:
+        db.query(UserVersion).filter(
+            UserVersion.user_id == user_id,
+            UserVersion.compacted_version < max_version,
+        ).update({UserVersion.compacted_version: max_version}, synchronize_session=False)
+    deleted = db.query(ChangeLog).filter(expired).delete(synchronize_session=False)
+    db.commit()
+    return deleted
+
+
+def run_change_log_compaction() -> None:
+    """Задача планировщика: компактация change_log в отдельной сессии."""
+    db = SessionLocal()
+    try:
+        deleted = compact_change_log(db, settings.sync_tombstone_retention_days)
+        if deleted:
+            logger.info("Компактация change_log: удалено надгробий: %s", deleted)
+    except Exception:
+        db.rollback()
+        logger.exception("Ошибка компактации change_log")
+    finally:
+        db.close()
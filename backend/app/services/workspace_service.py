@@ -0,0 +1,393 @@
+"""
+Экспорт и импорт рабочего пространства пользователя в формате NDJSON.
+
+Файл - по одной JSON-записи на строку: первая строка {"type": "meta", "format": ..., "version": ...},
+затем папки, задачи, заметки и дедлайны (в таком порядке). Теги записываются именами
+в поле tags задач и заметок: таблица тегов общая для всех пользователей.
+
+Экспорт читает БД порциями (yield_per) без ORM-объектов и пишет их во временный файл
+(export_workspace_file), поэтому память не зависит от размера пространства, а транзакция
+закрывается до начала скачивания. Импорт разбирает файл построчно и вставляет записи пачками по
+IMPORT_CHUNK_SIZE (INSERT ... RETURNING), теги разрешаются одним набором запросов на пачку.
+В памяти остаются только соответствия id из файла новым id папок и заметок.
+
+Тело запроса импорта сначала целиком сохраняется во временный файл (spool_upload) и только
+потом импортируется: транзакция (а на SQLite - блокировка записи для всей базы) не ждет
+медленную загрузку клиента.
+"""
+import json
+import logging
+import tempfile
+from collections import Counter
+from datetime import datetime, timezone
+from typing import AsyncIterator, BinaryIO, Dict, Iterator, List, Optional
+
+from pydantic import ValidationError
+from sqlalchemy import insert, select
+from sqlalchemy.orm import Session
+
+from ..db import SessionLocal
+from ..models.todo import Deadline, Folder, Note, Tag, Task, note_tag, task_tag
+from ..schemas import ExportDeadlineRecord, ExportFolderRecord, ExportNoteRecord, ExportTaskRecord, ImportOut
+from .search_service import index_note_values
+from .tag_service import change_tag_usage, resolve_tag_ids
+from .todo_service import sync_todo_item_values
+from .version_service import require_full_resync
+
+logger = logging.getLogger(__name__)
+
+EXPORT_FORMAT = "tuti-fruti-workspace"
+EXPORT_VERSION = 1
+# Строк экспорта на одну порцию чтения из БД / записей импорта на один INSERT
+EXPORT_CHUNK_SIZE = 1000
+IMPORT_CHUNK_SIZE = 1000
+# Экспорт хранится в памяти до EXPORT_SPOOL_MEMORY_BYTES, дальше - на диске; отдается порциями EXPORT_READ_BYTES
+EXPORT_SPOOL_MEMORY_BYTES = 1024 * 1024
+EXPORT_READ_BYTES = 64 * 1024
+# Максимальная длина строки импорта (защита от файла без переводов строк)
+IMPORT_MAX_LINE_BYTES = 10 * 1024 * 1024
+# Максимальный размер файла импорта; до SPOOL_MEMORY_BYTES тело хранится в памяти, дальше - на диске
+IMPORT_MAX_BYTES = 512 * 1024 * 1024
+IMPORT_SPOOL_MEMORY_BYTES = 1024 * 1024
+# Порция чтения сохраненного файла импорта
+IMPORT_READ_BYTES = 64 * 1024
+
+_RECORDS = {
+    "folder": ExportFolderRecord,
+    "task": ExportTaskRecord,
+    "note": ExportNoteRecord,
+    "deadline": ExportDeadlineRecord,
+}
+
+
+class ImportFormatError(ValueError):
+    def __init__(self, line_no: int, message: str):
+        super().__init__(f"Строка {line_no}: {message}")
+        self.line_no = line_no
+
+
+def _dump(record: dict) -> str:
+    return json.dumps(record, ensure_ascii=False, separators=(",", ":"), default=_json_default) + "\n"
+
+
+def _json_default(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    raise TypeError(f"Не сериализуется в JSON: {type(value).__name__}")
+
+
+def _tags_by_item(db: Session, association, id_column: str, item_ids: List[int]) -> Dict[int, List[str]]:
+    tags: Dict[int, List[str]] = {}
+    rows = db.execute(
+        select(association.c[id_column], Tag.name)
+        .join(Tag, Tag.id == association.c.tag_id)
+        .where(association.c[id_column].in_(item_ids))
+    )
+    for item_id, name in rows:
+        tags.setdefault(item_id, []).append(name)
+    return tags
+
+
+def export_workspace_file(user_id: int) -> BinaryIO:
+    """
+    Записывает NDJSON-экспорт во временный файл (в памяти до EXPORT_SPOOL_MEMORY_BYTES) и
+    возвращает его, перемотанным в начало. Чтение идет одной короткой транзакцией в собственной
+    сессии, закрытой до возврата: медленное скачивание не держит блокировку чтения SQLite
+    и не мешает записи других пользователей. Закрыть файл - забота вызывающего.
+    """
+    spool = tempfile.SpooledTemporaryFile(max_size=EXPORT_SPOOL_MEMORY_BYTES)
+    db = SessionLocal()
+    try:
+        for chunk in _export_chunks(db, user_id):
+            spool.write(chunk)
+        spool.seek(0)
+    except BaseException:
+        spool.close()
+        raise
+    finally:
+        db.close()
+    return spool
+
+
+def iter_file(spool: BinaryIO) -> Iterator[bytes]:
+    """Отдает файл кусками по EXPORT_READ_BYTES и закрывает его (тело StreamingResponse)."""
+    try:
+        while chunk := spool.read(EXPORT_READ_BYTES):
+            yield chunk
+    finally:
+        spool.close()
+
+
+def _export_chunks(db: Session, user_id: int) -> Iterator[bytes]:
+    yield _dump({
+        "type": "meta",
+        "format": EXPORT_FORMAT,
+        "version": EXPORT_VERSION,
+        "exported_at": datetime.now(timezone.utc),
+    }).encode()
+
+    folders = select(Folder.id, Folder.name, Folder.is_default, Folder.created_at).where(Folder.user_id == user_id)
+    for rows in _partitions(db, folders.order_by(Folder.id)):
+        yield "".join(_dump({"type": "folder", **row._asdict()}) for row in rows).encode()
+
+    tasks = select(
+        Task.id, Task.title, Task.description, Task.due_at, Task.is_completed, Task.created_at
+    ).where(Task.user_id == user_id)
+    for rows in _partitions(db, tasks.order_by(Task.id)):
+        tags = _tags_by_item(db, task_tag, "task_id", [row.id for row in rows])
+        yield "".join(
+            _dump({"type": "task", **row._asdict(), "tags": tags.get(row.id, [])}) for row in rows
+        ).encode()
+
+    notes = select(
+        Note.id, Note.folder_id, Note.title, Note.content, Note.is_favorite, Note.created_at, Note.updated_at
+    ).where(Note.user_id == user_id)
+    for rows in _partitions(db, notes.order_by(Note.id)):
+        tags = _tags_by_item(db, note_tag, "note_id", [row.id for row in rows])
+        yield "".join(
+            _dump({"type": "note", **row._asdict(), "tags": tags.get(row.id, [])}) for row in rows
+        ).encode()
+
+    deadlines = select(Deadline.note_id, Deadline.deadline_at, Deadline.notification_enabled).where(
+        Deadline.user_id == user_id
+    )
+    for rows in _partitions(db, deadlines.order_by(Deadline.note_id)):
+        yield "".join(_dump({"type": "deadline", **row._asdict()}) for row in rows).encode()
+
+
+def _partitions(db: Session, stmt):
+    return db.execute(stmt.execution_options(yield_per=EXPORT_CHUNK_SIZE)).partitions()
+
+
+class ImportTooLargeError(ValueError):
+    pass
+
+
+async def spool_upload(chunks: AsyncIterator[bytes]) -> BinaryIO:
+    """
+    Сохраняет тело запроса во временный файл (в памяти до IMPORT_SPOOL_MEMORY_BYTES) и
+    возвращает его, перемотанным в начало. Закрыть файл - забота вызывающего.
+    """
+    spool = tempfile.SpooledTemporaryFile(max_size=IMPORT_SPOOL_MEMORY_BYTES)
+    try:
+        size = 0
+        async for chunk in chunks:
+            size += len(chunk)
+            if size > IMPORT_MAX_BYTES:
+                raise ImportTooLargeError(f"файл больше {IMPORT_MAX_BYTES // (1024 * 1024)} МБ")
+            spool.write(chunk)
+        spool.seek(0)
+    except BaseException:
+        spool.close()
+        raise
+    return spool
+
+
+def import_workspace_file(db: Session, user_id: int, upload: BinaryIO) -> ImportOut:
+    """Импортирует сохраненный файл одной короткой транзакцией (см. WorkspaceImporter)."""
+    importer = WorkspaceImporter(db, user_id)
+    while chunk := upload.read(IMPORT_READ_BYTES):
+        importer.feed(chunk)
+    return importer.finish()
+
+
+class WorkspaceImporter:
+    """
+    Построчный импорт NDJSON в одной транзакции: feed() принимает очередные байты файла,
+    finish() вставляет остаток, увеличивает версию данных пользователя и фиксирует транзакцию.
+    Байты должны поступать без задержек (из уже сохраненного файла, см. spool_upload):
+    транзакция открыта с первой вставленной пачки.
+    Импортированные сущности добавляются к существующим; папка "Все" из файла сливается
+    с папкой "Все" пользователя. Избранной может быть только одна заметка: флаг из файла
+    сохраняется у первой избранной заметки и только если у пользователя избранной еще нет.
+    """
+
+    def __init__(self, db: Session, user_id: int):
+        self.db = db
+        self.user_id = user_id
+        self.counts: Counter = Counter()
+        self.line_no = 0
+        self._buffer = b""
+        self._pending_type: Optional[str] = None
+        self._pending: List[tuple] = []  # (номер строки, запись)
+        self._folder_ids: Dict[int, int] = {}
+        self._note_ids: Dict[int, int] = {}
+        self._default_folder_id: Optional[int] = None
+        self._favorite_taken: Optional[bool] = None
+
+    def feed(self, data: bytes) -> None:
+        self._buffer += data
+        *lines, self._buffer = self._buffer.split(b"\n")
+        if len(self._buffer) > IMPORT_MAX_LINE_BYTES:
+            raise ImportFormatError(self.line_no + 1, "слишком длинная строка")
+        for line in lines:
+            self._add_line(line)
+
+    def finish(self) -> ImportOut:
+        if self._buffer.strip():
+            self._add_line(self._buffer)
+        self._buffer = b""
+        if self.line_no == 0:
+            raise ImportFormatError(1, "пустой файл")
+        self._flush()
+        require_full_resync(self.db, self.user_id)
+        self.db.commit()
+        logger.info("Импорт для пользователя %s: %s", self.user_id, dict(self.counts))
+        return ImportOut(**self.counts)
+
+    def _add_line(self, line: bytes) -> None:
+        self.line_no += 1
+        if not line.strip():
+            return
+        try:
+            record = json.loads(line)
+        except ValueError as e:
+            raise ImportFormatError(self.line_no, f"неверный JSON: {e}")
+        if not isinstance(record, dict):
+            raise ImportFormatError(self.line_no, "ожидается JSON-объект")
+
+        record_type = record.pop("type", None)
+        if self.line_no == 1:
+            if record_type != "meta" or record.get("format") != EXPORT_FORMAT:
+                raise ImportFormatError(self.line_no, f"первая строка должна быть meta с format={EXPORT_FORMAT}")
+            if record.get("version") != EXPORT_VERSION:
+                raise ImportFormatError(self.line_no, f"неподдерживаемая версия формата: {record.get('version')}")
+            return
+        model = _RECORDS.get(record_type)
+        if model is None:
+            raise ImportFormatError(self.line_no, f"неизвестный тип записи: {record_type}")
+        try:
+            parsed = model.model_validate(record)
+        except ValidationError as e:
+            raise ImportFormatError(self.line_no, str(e.errors(include_url=False)))
+
+        # Записи одного типа копятся в пачку; смена типа или полная пачка - вставка
+        if record_type != self._pending_type:
+            self._flush()
+            self._pending_type = record_type
+        self._pending.append((self.line_no, parsed))
+        if len(self._pending) >= IMPORT_CHUNK_SIZE:
+            self._flush()
+
+    def _flush(self) -> None:
+        if self._pending:
+            getattr(self, f"_insert_{self._pending_type}s")(self._pending)
+        self._pending = []
+
+    def _now(self) -> datetime:
+        return datetime.now(timezone.utc)
+
+    def _get_default_folder_id(self) -> int:
+        if self._default_folder_id is None:
+            folder_id = self.db.execute(
+                select(Folder.id).where(Folder.user_id == self.user_id, Folder.is_default == True)
+            ).scalar()
+            if folder_id is None:
+                folder_id = self.db.execute(
+                    insert(Folder).values(user_id=self.user_id, name="Все", is_default=True).returning(Folder.id)
+                ).scalar_one()
+            self._default_folder_id = folder_id
+        return self._default_folder_id
+
+    def _take_favorite(self) -> bool:
+        """Можно ли сделать импортируемую заметку избранной (не больше одной на пользователя)."""
+        if self._favorite_taken is None:
+            self._favorite_taken = self.db.execute(
+                select(Note.id).where(Note.user_id == self.user_id, Note.is_favorite == True).limit(1)
+            ).first() is not None
+        if self._favorite_taken:
+            return False
+        self._favorite_taken = True
+        return True
+
+    def _insert_returning_ids(self, model, rows: List[dict]) -> List[int]:
+        result = self.db.execute(insert(model).returning(model.id, sort_by_parameter_order=True), rows)
+        return [row_id for (row_id,) in result]
+
+    def _link_tags(self, association, id_column: str, tagged: List[tuple]) -> None:
+        """tagged - пары (новый id сущности, имена тегов); теги всей пачки разрешаются вместе."""
+        tag_ids = resolve_tag_ids(self.db, {name for _, names in tagged for name in names})
+        links = {(item_id, tag_ids[name]) for item_id, names in tagged for name in names}
+        if links:
+            self.db.execute(insert(association), [{id_column: item_id, "tag_id": tag_id} for item_id, tag_id in links])
+            change_tag_usage(self.db, self.user_id, Counter(tag_id for _, tag_id in links), is_note=association is note_tag)
+            self.counts["tags"] += len(links)
+
+    def _insert_folders(self, pending: List[tuple]) -> None:
+        regular = []
+        for _, folder in pending:
+            if folder.is_default:
+                self._folder_ids[folder.id] = self._get_default_folder_id()
+            else:
+                regular.append(folder)
+        if regular:
+            new_ids = self._insert_returning_ids(Folder, [
+                {
+                    "user_id": self.user_id,
+                    "name": folder.name,
+                    "is_default": False,
+                    "created_at": folder.created_at or self._now(),
+                }
+                for folder in regular
+            ])
+            self._folder_ids.update(zip((folder.id for folder in regular), new_ids))
+        self.counts["folders"] += len(pending)
+
+    def _insert_tasks(self, pending: List[tuple]) -> None:
+        new_ids = self._insert_returning_ids(Task, [
+            {
+                "user_id": self.user_id,
+                "title": task.title,
+                "description": task.description,
+                "due_at": task.due_at,
+                "is_completed": task.is_completed,
+                "created_at": task.created_at or self._now(),
+            }
+            for _, task in pending
+        ])
+        self._link_tags(task_tag, "task_id", [(task_id, task.tags) for task_id, (_, task) in zip(new_ids, pending)])
+        self.counts["tasks"] += len(pending)
+
+    def _insert_notes(self, pending: List[tuple]) -> None:
+        rows = []
+        for _, note in pending:
+            folder_id = None
+            if note.folder_id is not None:
+                # Заметка из неизвестной папки попадает в "Все"
+                folder_id = self._folder_ids.get(note.folder_id) or self._get_default_folder_id()
+            rows.append({
+                "user_id": self.user_id,
+                "folder_id": folder_id,
+                "title": note.title,
+                "content": note.content,
+                "is_favorite": bool(note.is_favorite) and self._take_favorite(),
+                "created_at": note.created_at or self._now(),
+                "updated_at": note.updated_at or note.created_at or self._now(),
+            })
+        new_ids = self._insert_returning_ids(Note, rows)
+        self._note_ids.update(zip((note.id for _, note in pending), new_ids))
+        self._link_tags(note_tag, "note_id", [(note_id, note.tags) for note_id, (_, note) in zip(new_ids, pending)])
+        index_note_values(self.db, (
+            (note_id, self.user_id, row["title"], row["content"]) for note_id, row in zip(new_ids, rows)
+        ))
+        sync_todo_item_values(self.db, (
+            (note_id, self.user_id, row["content"]) for note_id, row in zip(new_ids, rows) if row["content"]
+        ))
+        self.counts["notes"] += len(pending)
+
+    def _insert_deadlines(self, pending: List[tuple]) -> None:
+        rows = []
+        for line_no, deadline in pending:
+            note_id = self._note_ids.get(deadline.note_id)
+            if note_id is None:
+                raise ImportFormatError(line_no, f"дедлайн ссылается на отсутствующую заметку {deadline.note_id}")
+            rows.append({
+                "note_id": note_id,
+                "user_id": self.user_id,
+                "deadline_at": deadline.deadline_at,
+                "notification_enabled": deadline.notification_enabled,
+                "created_at": self._now(),
+                "updated_at": self._now(),
+            })
+        self.db.execute(insert(Deadline), rows)
+        self.counts["deadlines"] += len(pending)
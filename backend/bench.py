@@ -0,0 +1,592 @@
+#!/usr/bin/env python3
+"""
+Бенчмарки горячих путей бэкенда на временной SQLite базе.
+
+Использование:
+    python bench.py auth [--concurrency 50] [--rounds 5]
+    python bench.py logging [--requests 500]
+    python bench.py middleware [--requests 2000]
+    python bench.py queries
+    python bench.py export [--notes 100000]
+    python bench.py notes [--requests 20]
+    python bench.py serialize [--requests 20] [--notes 2000]
+    python bench.py todo [--requests 200]
+    python bench.py compression [--notes 5000] [--requests 20]
+
+Сценарии запускаются in-process через httpx.ASGITransport (нужен пакет httpx),
+реальная сеть и бот Max не используются.
+
+Сравнение "до/после": --app-root указывает на другую копию backend/, например
+    git worktree add /tmp/before <commit> && python bench.py logging --app-root /tmp/before/backend
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+# Временная база создается до импорта приложения, чтобы engine подхватил DATABASE_URL
+_tmp_dir = tempfile.mkdtemp(prefix="bench_")
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{os.path.join(_tmp_dir, 'bench.sqlite3')}")
+
+import httpx  # noqa: E402
+
+
+def _percentile(values, p):
+    values = sorted(values)
+    k = max(0, min(len(values) - 1, int(round(p / 100 * (len(values) - 1)))))
+    return values[k]
+
+
+def _report(name, latencies, wall):
+    print(
+        f"{name}: n={len(latencies)} wall={wall * 1000:.1f}ms "
+        f"p50={_percentile(latencies, 50) * 1000:.1f}ms "
+        f"p95={_percentile(latencies, 95) * 1000:.1f}ms "
+        f"max={max(latencies) * 1000:.1f}ms "
+        f"mean={statistics.mean(latencies) * 1000:.1f}ms"
+    )
+
+
+def _make_client(app):
+    return httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench")
+
+
+async def _timed(client, method, url, **kwargs):
+    start = time.perf_counter()
+    response = await client.request(method, url, **kwargs)
+    elapsed = time.perf_counter() - start
+    response.raise_for_status()
+    return elapsed
+
+
+async def bench_auth(args):
+    """Параллельные /auth/webapp-init: первый вход (создание) и повторный вход тех же пользователей."""
+    from app.main import create_app
+
+    app = create_app()
+    async with _make_client(app) as client:
+        for round_no in range(args.rounds):
+            base = 1_000_000 + round_no * args.concurrency
+            bodies = [
+                {"initData": f"user_id={base + i}&first_name=Bench&username=bench_{base + i}"}
+                for i in range(args.concurrency)
+            ]
+            for label in ("create", "repeat"):
+                start = time.perf_counter()
+                latencies = await asyncio.gather(
+                    *(_timed(client, "POST", "/auth/webapp-init", json=body) for body in bodies)
+                )
+                _report(f"webapp-init round={round_no} {label}", latencies, time.perf_counter() - start)
+
+
+async def _login(client, user_id=4242):
+    response = await client.post("/auth/webapp-init", json={"initData": f"user_id={user_id}&username=bench_{user_id}"})
+    response.raise_for_status()
+    return {"Authorization": f"Bearer {response.json()['access_token']}"}
+
+
+async def _sequential(client, method, url, count, **kwargs):
+    start = time.perf_counter()
+    latencies = [await _timed(client, method, url, **kwargs) for _ in range(count)]
+    return latencies, time.perf_counter() - start
+
+
+async def bench_logging(args):
+    """
+    Накладные расходы логирования на запрос: продакшен-режим (без трассировки) против
+    трассировки каждого запроса, которая воспроизводит прежний объем INFO-логов на горячем пути.
+    Вывод логов идет в /dev/null, чтобы измерять форматирование, а не терминал.
+    """
+    import logging
+    from app.core.config import settings
+    from app.main import create_app
+
+    devnull = open(os.devnull, "w")
+    try:
+        from app.core.logs import configure_logging
+        configure_logging(stream=devnull)
+    except ImportError:
+        # Версия приложения без app.core.logs: настраиваем корневой логгер напрямую
+        root = logging.getLogger()
+        for handler in list(root.handlers):
+            root.removeHandler(handler)
+        root.addHandler(logging.StreamHandler(devnull))
+        root.setLevel(logging.INFO)
+    app = create_app()
+    async with _make_client(app) as client:
+        headers = await _login(client)
+        for i in range(20):
+            await client.post("/api/notes", headers=headers, json={"title": f"note {i}", "content": "text", "tags_text": "#bench"})
+
+        modes = (("trace-all", 1.0), ("production", 0.0)) if hasattr(settings, "log_trace_sample_rate") else (("default", None),)
+        for label, rate in modes:
+            if rate is not None:
+                settings.log_trace_sample_rate = rate
+            await _sequential(client, "GET", "/api/notes", 20, headers=headers)  # прогрев
+            latencies, wall = await _sequential(client, "GET", "/api/notes", args.requests, headers=headers)
+            _report(f"GET /api/notes {label}", latencies, wall)
+
+
+async def bench_middleware(args):
+    """
+    Микробенчмарк middleware на пустом эндпоинте: без middleware, прежний
+    LoggingMiddleware на BaseHTTPMiddleware и текущий AccessLogMiddleware (чистый ASGI).
+    """
+    import logging
+    from fastapi import FastAPI, Request
+    from starlette.middleware.base import BaseHTTPMiddleware
+    from app.middleware import AccessLogMiddleware
+
+    legacy_logger = logging.getLogger("bench.legacy")
+
+    class LegacyLoggingMiddleware(BaseHTTPMiddleware):
+        # Копия прежнего app.main.LoggingMiddleware
+        async def dispatch(self, request: Request, call_next):
+            legacy_logger.info(f"{request.method} {request.url.path} - Headers: {dict(request.headers)}")
+            response = await call_next(request)
+            legacy_logger.info(f"{request.method} {request.url.path} - Status: {response.status_code}")
+            return response
+
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    root.addHandler(logging.StreamHandler(open(os.devnull, "w")))
+    root.setLevel(logging.INFO)
+
+    def make_app(middleware):
+        app = FastAPI()
+
+        @app.get("/ping/{item_id}")
+        async def ping(item_id: int):
+            return {"ok": True, "id": item_id}
+
+        if middleware is not None:
+            app.add_middleware(middleware)
+        return app
+
+    variants = (
+        ("no middleware", None),
+        ("BaseHTTPMiddleware (legacy)", LegacyLoggingMiddleware),
+        ("AccessLogMiddleware (ASGI)", AccessLogMiddleware),
+    )
+    for label, middleware in variants:
+        async with _make_client(make_app(middleware)) as client:
+            headers = {"Authorization": "Bearer " + "x" * 150, "User-Agent": "bench"}
+            await _sequential(client, "GET", "/ping/1", 100, headers=headers)  # прогрев
+            latencies, wall = await _sequential(client, "GET", "/ping/1", args.requests, headers=headers)
+            _report(f"GET /ping/{{item_id}} {label}", latencies, wall)
+
+
+async def bench_queries(args):
+    """Количество SQL-запросов и время в БД по основным эндпоинтам (из заголовка Server-Timing)."""
+    from app.main import create_app
+
+    app = create_app()
+    async with _make_client(app) as client:
+        headers = await _login(client)
+        folder = (await client.post("/api/folders", headers=headers, json={"name": "bench"})).json()
+        for i in range(20):
+            await client.post("/api/notes", headers=headers, json={"title": f"note {i}", "content": "text", "tags_text": f"#bench #t{i % 5}"})
+        note = (await client.post("/api/notes", headers=headers, json={"title": "n", "content": "c", "folder_id": folder["id"]})).json()
+
+        calls = (
+            ("GET", "/api/notes", None),
+            ("GET", "/api/folders", None),
+            ("GET", "/api/tags", None),
+            ("GET", "/api/deadlines", None),
+            ("POST", "/api/notes", {"title": "x", "content": "y", "tags_text": "#bench #new"}),
+            ("PATCH", f"/api/notes/{note['id']}", {"content": "z", "tags_text": "#bench"}),
+        )
+        for method, url, body in calls:
+            response = await client.request(method, url, headers=headers, json=body)
+            response.raise_for_status()
+            print(f"{method} {url}: {response.headers.get('server-timing')}")
+
+
+def _seed_workspace(user_id, notes_count, tasks_count=0, deadline_every=100):
+    """
+    Быстрое наполнение пространства пользователя напрямую через БД: папки, заметки и задачи
+    с тегами, дедлайн у каждой deadline_every-й заметки.
+    """
+    from datetime import datetime, timedelta, timezone
+    from sqlalchemy import insert
+    from app.db import SessionLocal, engine
+    from app.models.todo import Deadline, Folder, Note, Task, note_tag, task_tag
+    from app.services.tag_service import backfill_tag_usage, resolve_tag_ids
+
+    db = SessionLocal()
+    try:
+        folder_ids = [
+            db.execute(insert(Folder).values(user_id=user_id, name=name, is_default=name == "Все").returning(Folder.id)).scalar_one()
+            for name in ("Все", "Учеба", "Работа", "Дом")
+        ]
+        tag_ids = list(resolve_tag_ids(db, [f"bench{i}" for i in range(50)]).values())
+        deadline_at = datetime.now(timezone.utc) + timedelta(days=30)
+        for start in range(0, notes_count, 5000):
+            rows = [
+                {
+                    "user_id": user_id,
+                    "folder_id": folder_ids[i % len(folder_ids)],
+                    "title": f"Заметка {i}",
+                    "content": f"Текст заметки номер {i} " * 10,
+                    "is_favorite": False,
+                }
+                for i in range(start, min(start + 5000, notes_count))
+            ]
+            note_ids = db.execute(insert(Note).returning(Note.id, sort_by_parameter_order=True), rows).scalars().all()
+            db.execute(insert(note_tag), [
+                {"note_id": note_id, "tag_id": tag_ids[(note_id + k) % len(tag_ids)]}
+                for note_id in note_ids for k in range(2)
+            ])
+            db.execute(insert(Deadline), [
+                {"note_id": note_id, "user_id": user_id, "deadline_at": deadline_at}
+                for note_id in note_ids[::deadline_every]
+            ])
+        if tasks_count:
+            task_ids = db.execute(insert(Task).returning(Task.id, sort_by_parameter_order=True), [
+                {"user_id": user_id, "title": f"Задача {i}", "due_at": deadline_at, "is_completed": i % 3 == 0}
+                for i in range(tasks_count)
+            ]).scalars().all()
+            db.execute(insert(task_tag), [
+                {"task_id": task_id, "tag_id": tag_ids[task_id % len(tag_ids)]} for task_id in task_ids
+            ])
+        db.commit()
+    finally:
+        db.close()
+    backfill_tag_usage(engine)
+
+
+async def bench_export(args):
+    """
+    Экспорт и импорт пространства из --notes заметок на уровне сервиса (ASGITransport httpx
+    буферизует тело ответа целиком и исказил бы замер памяти). Экспорт пишется во временный
+    файл, импорт читает его кусками по 64 КБ, как тело запроса. Пик памяти - tracemalloc
+    (отдельным проходом, т.к. он замедляет выполнение).
+    """
+    import tracemalloc
+    from app.db import SessionLocal
+    from app.main import create_app
+    from app.services.workspace_service import WorkspaceImporter, export_workspace_file, iter_file
+
+    app = create_app()
+    # На свежей временной базе пользователи получают id 1, 2, 3
+    async with _make_client(app) as client:
+        await _login(client, 4242)
+        await _login(client, 4243)
+        await _login(client, 4244)
+    start = time.perf_counter()
+    _seed_workspace(1, args.notes)
+    print(f"seed: {args.notes} заметок за {time.perf_counter() - start:.1f}s")
+    export_path = os.path.join(_tmp_dir, "export.ndjson")
+
+    def run_export():
+        size = 0
+        with open(export_path, "wb") as f:
+            for chunk in iter_file(export_workspace_file(1)):
+                f.write(chunk)
+                size += len(chunk)
+        return size
+
+    def run_import(user_id):
+        db = SessionLocal()
+        try:
+            importer = WorkspaceImporter(db, user_id)
+            with open(export_path, "rb") as f:
+                while chunk := f.read(64 * 1024):
+                    importer.feed(chunk)
+            return importer.finish()
+        finally:
+            db.close()
+
+    for label, func, arg in (("export", run_export, None), ("import", run_import, 2)):
+        start = time.perf_counter()
+        result = func(arg) if arg else func()
+        print(f"{label}: {time.perf_counter() - start:.2f}s result={result}")
+    tracemalloc.start()
+    run_export()
+    print(f"export peak python memory: {tracemalloc.get_traced_memory()[1] / 1024 / 1024:.1f} MiB")
+    tracemalloc.reset_peak()
+    run_import(3)
+    print(f"import peak python memory: {tracemalloc.get_traced_memory()[1] / 1024 / 1024:.1f} MiB")
+    tracemalloc.stop()
+    print(f"file size: {os.path.getsize(export_path) / 1024 / 1024:.1f} MiB")
+
+
+async def bench_notes(args):
+    """GET /api/notes (полное представление) у пользователей с 1k и 10k заметок: задержка и SQL из Server-Timing."""
+    from app.main import create_app
+
+    app = create_app()
+    async with _make_client(app) as client:
+        # На свежей временной базе пользователи получают id 1, 2
+        users = []
+        for user_id, notes_count in ((1, 1_000), (2, 10_000)):
+            users.append((await _login(client, 5000 + user_id), notes_count))
+            _seed_workspace(user_id, notes_count)
+        for headers, notes_count in users:
+            await _sequential(client, "GET", "/api/notes", 2, headers=headers)  # прогрев
+            latencies, wall = await _sequential(client, "GET", "/api/notes", args.requests, headers=headers)
+            _report(f"GET /api/notes notes={notes_count}", latencies, wall)
+            response = await client.get("/api/notes", headers=headers)
+            print(f"  {len(response.content) / 1024:.0f} KiB, {response.headers.get('server-timing')}")
+
+
+async def bench_serialize(args):
+    """
+    Сериализация списочных ответов: по каждому эндпоинту p50 и доля serialize из Server-Timing
+    (время от возврата из эндпоинта до начала ответа: валидация по response_model и JSON).
+    """
+    from app.main import create_app
+
+    app = create_app()
+    async with _make_client(app) as client:
+        headers = await _login(client, 6001)
+        # Пользователь получает id 1 на свежей временной базе
+        _seed_workspace(1, args.notes, tasks_count=args.notes, deadline_every=1)
+        for url in ("/api/notes", "/api/notes?view=summary", "/api/tasks", "/api/deadlines", "/api/folders", "/api/tags"):
+            await _sequential(client, "GET", url, 2, headers=headers)  # прогрев
+            latencies, wall = await _sequential(client, "GET", url, args.requests, headers=headers)
+            _report(f"GET {url}", latencies, wall)
+            response = await client.get(url, headers=headers)
+            print(f"  {len(response.content) / 1024:.0f} KiB, {response.headers.get('server-timing')}")
+
+
+async def bench_todo(args):
+    """
+    Отметка одного пункта todo-заметки (50 пунктов, 3 тега, дедлайн): отправка всего content
+    через PATCH /api/notes/{id} против POST /api/notes/{id}/items/{item_id}/toggle.
+    """
+    import json
+    from app.main import create_app
+
+    app = create_app()
+    async with _make_client(app) as client:
+        headers = await _login(client, 7001)
+        items = [{"id": i, "text": f"Пункт {i}", "completed": False} for i in range(1, 51)]
+        content = json.dumps({"type": "todo", "items": items}, ensure_ascii=False)
+        response = await client.post("/api/notes", headers=headers, json={
+            "title": "Список", "content": content, "tags_text": "#bench #todo #list",
+        })
+        note_id = response.json()["id"]
+        await client.post("/api/deadlines", headers=headers, json={"note_id": note_id, "deadline_at": "2099-01-01T00:00:00Z"})
+
+        latencies = []
+        start = time.perf_counter()
+        for n in range(args.requests):
+            items[n % len(items)]["completed"] = not items[n % len(items)]["completed"]
+            body = {"content": json.dumps({"type": "todo", "items": items}, ensure_ascii=False)}
+            latencies.append(await _timed(client, "PATCH", f"/api/notes/{note_id}", headers=headers, json=body))
+        _report("PATCH /api/notes/{id} (весь content)", latencies, time.perf_counter() - start)
+        response = await client.patch(f"/api/notes/{note_id}", headers=headers, json=body)
+        print(f"  {response.headers.get('server-timing')}")
+
+        routes = {route.path for route in app.routes}
+        if "/api/notes/{note_id}/items/{item_id}/toggle" not in routes:
+            print("toggle: эндпоинта нет в этой версии приложения")
+            return
+        latencies = []
+        start = time.perf_counter()
+        for n in range(args.requests):
+            url = f"/api/notes/{note_id}/items/{n % len(items) + 1}/toggle"
+            latencies.append(await _timed(client, "POST", url, headers=headers))
+        _report("POST /api/notes/{id}/items/{item_id}/toggle", latencies, time.perf_counter() - start)
+        response = await client.post(f"/api/notes/{note_id}/items/1/toggle", headers=headers)
+        print(f"  {response.headers.get('server-timing')}")
+
+
+async def bench_compression(args):
+    """
+    Сжатие текста заметок: размер файла БД (после VACUUM) и задержка списков заметок
+    до и после фоновой перезаписи. Заметки - todo-списки по 60 пунктов и длинные тексты (~5-8 КБ).
+    """
+    import json
+    from sqlalchemy import insert, text
+    from app.core.config import settings
+    from app.db import SessionLocal, engine
+    from app.main import create_app
+    from app.models.todo import Note
+    from app.services.compression_service import note_storage_report, rewrite_note_contents
+
+    app = create_app()
+    async with _make_client(app) as client:
+        headers = await _login(client, 8001)
+        settings.note_compression_threshold = 0  # исходные данные записываются без сжатия
+        rows = []
+        for i in range(args.notes):
+            if i % 2:
+                content = f"Конспект лекции {i}: определения, теоремы и примеры решений задач. " * 80
+            else:
+                content = json.dumps({"type": "todo", "items": [
+                    {"id": 1_700_000_000_000 + j, "text": f"Пункт {j} списка {i}: купить, позвонить, сделать", "completed": j % 3 == 0}
+                    for j in range(60)
+                ]}, ensure_ascii=False)
+            rows.append({"user_id": 1, "title": f"Заметка {i}", "content": content})
+        with SessionLocal() as db:
+            db.execute(insert(Note), rows)
+            db.commit()
+
+        async def measure(label):
+            with engine.connect() as conn:
+                conn.exec_driver_sql("VACUUM")
+            size = os.path.getsize(engine.url.database)
+            print(f"{label}: файл БД {size / 1024 / 1024:.1f} MiB")
+            for url in ("/api/notes?limit=500", "/api/notes?view=summary&limit=500"):
+                await _sequential(client, "GET", url, 2, headers=headers)  # прогрев
+                latencies, wall = await _sequential(client, "GET", url, args.requests, headers=headers)
+                _report(f"  GET {url}", latencies, wall)
+
+        await measure("без сжатия")
+        settings.note_compression_threshold = 2048
+        start = time.perf_counter()
+        stats = rewrite_note_contents(engine)
+        print(f"перезапись: {time.perf_counter() - start:.2f}s {stats}")
+        await measure("со сжатием")
+        with SessionLocal() as db:
+            print(note_storage_report(db))
+
+
+async def bench_tags(args):
+    """
+    Автосохранение заметки с тегами: PATCH content с тем же tags_text и со сменой одного тега.
+    Задержка и число SQL-запросов из Server-Timing. Затем GET /api/tags при 100k чужих тегов.
+    """
+    from sqlalchemy import insert
+    from app.db import SessionLocal
+    from app.main import create_app
+    from app.models.todo import Tag
+
+    app = create_app()
+    async with _make_client(app) as client:
+        headers = await _login(client, 9001)
+        tags_text = " ".join(f"#bench{i}" for i in range(8))
+        note = (await client.post("/api/notes", headers=headers, json={"title": "n", "content": "c", "tags_text": tags_text})).json()
+        url = f"/api/notes/{note['id']}"
+        variants = (
+            ("теги без изменений", lambda n: tags_text),
+            ("смена одного тега", lambda n: f"{tags_text} #extra{n % 2}"),
+        )
+        for label, make_tags in variants:
+            latencies = []
+            start = time.perf_counter()
+            for n in range(args.requests):
+                body = {"content": f"Текст {n}", "tags_text": make_tags(n)}
+                latencies.append(await _timed(client, "PATCH", url, headers=headers, json=body))
+            _report(f"PATCH /api/notes/{{id}} ({label})", latencies, time.perf_counter() - start)
+            response = await client.patch(url, headers=headers, json={"content": "x", "tags_text": make_tags(args.requests)})
+            print(f"  {response.headers.get('server-timing')}")
+
+        # Список тегов пользователя при 100k тегах других пользователей в общей таблице tags
+        with SessionLocal() as db:
+            db.execute(insert(Tag), [{"name": f"other{i}", "color": "#FFFFFF"} for i in range(100_000)])
+            db.commit()
+        await _sequential(client, "GET", "/api/tags", 2, headers=headers)  # прогрев
+        latencies, wall = await _sequential(client, "GET", "/api/tags", args.requests, headers=headers)
+        _report("GET /api/tags (100k тегов в таблице)", latencies, wall)
+        response = await client.get("/api/tags", headers=headers)
+        print(f"  {len(response.json())} тегов, {len(response.content) / 1024:.1f} KiB, {response.headers.get('server-timing')}")
+
+
+async def bench_tag_filter(args):
+    """
+    Фильтр заметок и задач по нескольким тегам (tag_ids, mode=all|any, exclude_tag_ids):
+    задержка и планы выполнения всех SELECT запроса. Полный просмотр таблицы БД (SCAN без
+    индекса; json_each и подзапросы не в счет) отмечается FULL SCAN, и сценарий завершается
+    с ошибкой.
+    """
+    import re
+    from sqlalchemy import event, func, select
+    from app.db import Base, engine
+    from app.main import create_app
+    from app.models.todo import Tag, note_tag
+
+    app = create_app()
+    async with _make_client(app) as client:
+        headers = await _login(client, 9101)
+        # Пользователь получает id 1 на свежей временной базе
+        _seed_workspace(1, args.notes, tasks_count=args.notes)
+        with engine.connect() as conn:
+            # Пара тегов, стоящих вместе у части заметок, и третий тег
+            a, b = conn.execute(
+                select(note_tag.c.tag_id, func.max(note_tag.c.tag_id).over(partition_by=note_tag.c.note_id))
+                .order_by(note_tag.c.note_id).limit(1)
+            ).one()
+            c = conn.execute(select(func.max(Tag.id)).where(Tag.id.not_in([a, b]))).scalar_one()
+        urls = (
+            f"/api/notes?tag_id={a}&limit=100",
+            f"/api/notes?tag_ids={a}&tag_ids={b}&mode=all&limit=100",
+            f"/api/notes?tag_ids={a}&tag_ids={b}&tag_ids={c}&mode=any&limit=100",
+            f"/api/notes?tag_ids={a}&exclude_tag_ids={b}&view=summary&limit=100",
+            f"/api/tasks?tag_ids={a}&tag_ids={b}&mode=any&exclude_tag_ids={c}&limit=100",
+        )
+
+        statements = []
+
+        def capture(conn, cursor, statement, parameters, context, executemany):
+            if statement.lstrip().upper().startswith("SELECT"):
+                statements.append((statement, parameters))
+
+        scan = re.compile(r"^SCAN (\w+?)(?:_\d+)?(?: |$)(?!.*USING (?:COVERING )?INDEX)")
+        full_scans = 0
+        for url in urls:
+            await _sequential(client, "GET", url, 2, headers=headers)  # прогрев
+            latencies, wall = await _sequential(client, "GET", url, args.requests, headers=headers)
+            _report(f"GET {url}", latencies, wall)
+            statements.clear()
+            event.listen(engine, "before_cursor_execute", capture)
+            try:
+                response = await client.get(url, headers=headers)
+            finally:
+                event.remove(engine, "before_cursor_execute", capture)
+            print(f"  {len(response.json())} строк, {response.headers.get('server-timing')}")
+            with engine.connect() as conn:
+                for statement, parameters in statements:
+                    for row in conn.exec_driver_sql("EXPLAIN QUERY PLAN " + statement, parameters):
+                        detail = row[-1]
+                        match = scan.search(detail)
+                        if match and match.group(1) in Base.metadata.tables:
+                            full_scans += 1
+                            detail += "  <-- FULL SCAN"
+                        print(f"    {detail}")
+        if full_scans:
+            raise SystemExit(f"полных просмотров таблиц: {full_scans}")
+
+
+SCENARIOS = {
+    "auth": bench_auth,
+    "logging": bench_logging,
+    "middleware": bench_middleware,
+    "queries": bench_queries,
+    "export": bench_export,
+    "notes": bench_notes,
+    "serialize": bench_serialize,
+    "todo": bench_todo,
+    "compression": bench_compression,
+    "tags": bench_tags,
+    "tag_filter": bench_tag_filter,
+}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("scenario", choices=sorted(SCENARIOS))
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--rounds", type=int, default=3)
+    parser.add_argument("--requests", type=int, default=500)
+    parser.add_argument("--notes", type=int, default=100_000)
+    parser.add_argument("--app-root", default=os.path.dirname(os.path.abspath(__file__)),
+                        help="каталог backend/, из которого импортируется пакет app")
+    args = parser.parse_args()
+
+    sys.path.insert(0, os.path.abspath(args.app_root))
+    from app.db import Base, engine
+    from app import models  # noqa: F401
+
+    Base.metadata.create_all(bind=engine)
+    asyncio.run(SCENARIOS[args.scenario](args))
+
+
+if __name__ == "__main__":
+    main()
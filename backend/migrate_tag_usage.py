@@ -0,0 +1,17 @@
+"""
+Миграция: таблица tag_usage (теги пользователя со счетчиками заметок и задач) и ее
+заполнение по существующим связям note_tag/task_tag.
+
+То же выполняется при старте приложения; скрипт нужен, чтобы заполнить таблицу заранее.
+Повторный запуск безопасен: обрабатываются только пользователи, у которых строк
+в tag_usage еще нет.
+"""
+from app import models  # noqa: F401
+from app.db import Base, engine, migrate_schema
+from app.services.tag_service import backfill_tag_usage
+
+if __name__ == "__main__":
+    Base.metadata.create_all(bind=engine)
+    migrate_schema(engine)
+    filled = backfill_tag_usage(engine)
+    print(f"OK: tag_usage заполнена, строк: {filled}")
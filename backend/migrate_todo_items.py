@@ -0,0 +1,17 @@
+"""
+Миграция: таблица todo_items (построчная копия пунктов todo-заметок) и ее заполнение
+из content существующих заметок.
+
+То же выполняется при старте приложения; скрипт нужен, чтобы заполнить таблицу заранее,
+не увеличивая время первого запуска на большой базе. Повторный запуск безопасен:
+обрабатываются только заметки, у которых строк в todo_items еще нет.
+"""
+from app import models  # noqa: F401
+from app.db import Base, engine, migrate_schema
+from app.services.todo_service import backfill_todo_items
+
+if __name__ == "__main__":
+    Base.metadata.create_all(bind=engine)
+    migrate_schema(engine)
+    filled = backfill_todo_items(engine)
+    print(f"OK: todo_items заполнена для заметок: {filled}")
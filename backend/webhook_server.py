@@ -13,7 +13,6 @@ import sys
 import json
 import logging
 import requests
-from datetime import datetime
 from contextlib import asynccontextmanager
 from fastapi import FastAPI, Request, HTTPException
 from fastapi.responses import JSONResponse
@@ -22,17 +21,14 @@ import uvicorn
 # Импорты для работы с БД
 sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
 from app.db import SessionLocal
-from app.models.user import User
+from app.services.user_service import upsert_user_from_data
 from app.core.config import settings
+from app.core.logs import configure_logging, trace, trace_enabled
+from app.middleware import AccessLogMiddleware
+from app.routers import metrics
 
-# Настройка логирования
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.StreamHandler(sys.stdout)
-    ]
-)
+# Настройка логирования (LOG_LEVEL, LOG_LEVELS, LOG_FORMAT, LOG_TRACE_SAMPLE_RATE)
+configure_logging()
 logger = logging.getLogger(__name__)
 
 # URL для подписки на вебхуки
@@ -150,77 +146,20 @@ async def lifespan(app: FastAPI):
 
 
 app = FastAPI(title="Max Bot Webhook Server", lifespan=lifespan)
+app.add_middleware(AccessLogMiddleware)
+app.include_router(metrics.router)
 
 
 def _upsert_user_from_webhook(user_data: dict) -> None:
     """
-    Сохраняет или обновляет пользователя в БД из данных вебхука.
+    Сохраняет или обновляет пользователя в БД из данных вебхука
+    (атомарный upsert из app.services.user_service).
     """
-    if not isinstance(user_data, dict):
-        return
-    
-    user_id = user_data.get("user_id") or user_data.get("id")
-    if not user_id:
-        logger.warning("⚠️ Нет user_id в данных пользователя")
-        return
-    
     db = SessionLocal()
     try:
-        uuid = str(user_id)
-        
-        # Формируем username
-        first_name = user_data.get("first_name") or user_data.get("name") or ""
-        last_name = user_data.get("last_name") or ""
-        username_from_data = user_data.get("username")
-        
-        if first_name and last_name:
-            full_name = f"{first_name} {last_name}".strip()
-        elif first_name:
-            full_name = first_name
-        elif username_from_data:
-            full_name = username_from_data
-        else:
-            full_name = f"user_{user_id}"
-        
-        # Используем username из Max, если есть, иначе формируем
-        if username_from_data:
-            username = username_from_data
-        else:
-            username = f"max_{user_id}_{full_name}".strip()
-        
-        # Проверяем существующего пользователя
-        existing = db.query(User).filter(User.uuid == uuid).first()
-        
-        if existing:
-            # Обновляем username, если изменился
-            updated = False
-            if username_from_data and existing.username != username_from_data:
-                existing.username = username_from_data
-                updated = True
-            elif not username_from_data and existing.username != username:
-                existing.username = username
-                updated = True
-            
-            if updated:
-                db.add(existing)
-                db.commit()
-                db.refresh(existing)
-                logger.info(f"✅ Обновлен пользователь в БД: id={existing.id}, username={existing.username}")
-            else:
-                logger.info(f"ℹ️ Пользователь уже существует: id={existing.id}, username={existing.username}")
-        else:
-            # Проверяем уникальность username
-            if db.query(User).filter(User.username == username).first() is not None:
-                username = f"{username}_{user_id}"
-                logger.info(f"⚠️ Конфликт username, используем: {username}")
-            
-            # Создаем нового пользователя
-            new_user = User(username=username, uuid=uuid)
-            db.add(new_user)
-            db.commit()
-            db.refresh(new_user)
-            logger.info(f"✅ Создан новый пользователь в БД: id={new_user.id}, username={new_user.username}, uuid={new_user.uuid}")
-            
+        user = upsert_user_from_data(db, user_data)
+        if user is not None:
+            logger.info("✅ Пользователь сохранен в БД: id=%s, username=%s, uuid=%s", user.id, user.username, user.uuid)
     except Exception as e:
         logger.exception(f"❌ Ошибка при сохранении пользователя в БД: {e}")
         db.rollback()
@@ -245,84 +184,52 @@ async def health():
 async def webhook(request: Request):
     """
     Принимает вебхуки от Max Bot API на корневом пути.
-    Логирует все входящие данные для отладки.
+    Полное содержимое (заголовки и тело) пишется только при включенной трассировке.
     """
     try:
-        # Получаем заголовки
-        headers = dict(request.headers)
-        client_ip = request.client.host if request.client else "unknown"
-        
-        logger.info("")
-        logger.info("=" * 80)
-        logger.info("🔔 НОВЫЙ ВЕБХУК ПОЛУЧЕН")
-        logger.info("=" * 80)
-        logger.info(f"⏰ Время: {datetime.now().isoformat()}")
-        logger.info(f"🌐 IP клиента: {client_ip}")
-        logger.info(f"📡 Method: {request.method}")
-        logger.info(f"🔗 URL: {request.url}")
-        logger.info(f"📋 Headers:")
-        for key, value in headers.items():
-            logger.info(f"   {key}: {value}")
-        
         # Получаем тело запроса
+        payload = None
         try:
             body_bytes = await request.body()
-            body_str = body_bytes.decode('utf-8')
-            logger.info(f"📦 Raw body ({len(body_bytes)} bytes):")
-            logger.info(f"   {body_str}")
-            
-            # Пытаемся распарсить как JSON
-            payload = None
+            if trace_enabled(logger):
+                trace(logger, "🔔 Вебхук: %s %s headers=%s", request.method, request.url, dict(request.headers))
+                trace(logger, "📦 Raw body (%s bytes): %s", len(body_bytes), body_bytes.decode("utf-8", errors="replace"))
             try:
-                payload = json.loads(body_str)
-                logger.info(f"✅ Parsed JSON payload:")
-                logger.info(json.dumps(payload, indent=4, ensure_ascii=False))
+                payload = json.loads(body_bytes)
             except json.JSONDecodeError as e:
-                logger.warning(f"⚠️ Body is not valid JSON: {e}")
-                logger.warning(f"   Raw content: {body_str[:500]}")
+                logger.warning("⚠️ Body is not valid JSON: %s", e)
         except Exception as e:
-            logger.error(f"❌ Error reading body: {e}")
-            payload = None
+            logger.error("❌ Error reading body: %s", e)
         
         # Извлекаем информацию о пользователе
-        if payload:
+        if isinstance(payload, dict):
             update_type = payload.get("update_type")
-            logger.info(f"📌 Update type: {update_type}")
             
             # Извлекаем пользователя из разных типов обновлений
             user = None
             if update_type == "bot_started":
                 user = payload.get("user")
-                logger.info(f"🤖 Bot started by user: {json.dumps(user, indent=2, ensure_ascii=False) if user else 'None'}")
             elif update_type == "message_created":
                 message = payload.get("message")
                 if message:
                     user = message.get("sender")
-                    logger.info(f"💬 Message from user: {json.dumps(user, indent=2, ensure_ascii=False) if user else 'None'}")
             elif update_type == "message_callback":
                 callback = payload.get("callback")
                 if callback:
                     user = callback.get("user")
-                    logger.info(f"🔘 Callback from user: {json.dumps(user, indent=2, ensure_ascii=False) if user else 'None'}")
-            if user:
-                user_id = user.get("user_id") or user.get("id")
-                first_name = user.get("first_name") or user.get("name")
-                last_name = user.get("last_name")
-                username = user.get("username")
-                full_name = f"{first_name} {last_name}".strip() if first_name else username or "Unknown"
-                logger.info(f"👤 User ID: {user_id}")
-                logger.info(f"👤 Name: {full_name}")
-                logger.info(f"👤 Username: {username or 'N/A'}")
-                
-                # Сохраняем пользователя в БД при bot_started
-                if update_type == "bot_started":
-                    logger.info("💾 Сохраняем пользователя в БД...")
-                    _upsert_user_from_webhook(user)
-        
-        logger.info("=" * 80)
-        logger.info("✅ Вебхук обработан успешно, отправляем 200 OK")
-        logger.info("=" * 80)
-        logger.info("")
+
+            if trace_enabled(logger):
+                trace(logger, "✅ Parsed JSON payload:\n%s", json.dumps(payload, indent=4, ensure_ascii=False))
+            trace(
+                logger,
+                "webhook",
+                update_type=update_type,
+                user_id=(user.get("user_id") or user.get("id")) if isinstance(user, dict) else None,
+            )
+
+            # Сохраняем пользователя в БД при bot_started
+            if user and update_type == "bot_started":
+                _upsert_user_from_webhook(user)
         
         # Всегда возвращаем 200 OK, чтобы Max не повторял запрос
         return JSONResponse(
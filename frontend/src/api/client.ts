@@ -21,7 +21,30 @@ function getToken(): string | null {
   return localStorage.getItem('token')
 }
 
-export async function api<T>(path: string, options: RequestInit = {}): Promise<T> {
+/**
+ * Продлевает сессию через /auth/refresh по текущему (в том числе недавно истекшему) токену.
+ * Не требует initData, поэтому полный /auth/webapp-init нужен только при первом входе.
+ */
+export async function refreshToken(): Promise<boolean> {
+  const token = getToken()
+  if (!token) return false
+  try {
+    const res = await fetch(`${API_URL}/auth/refresh`, {
+      method: 'POST',
+      headers: { 'Authorization': `Bearer ${token}` }
+    })
+    if (!res.ok) return false
+    const data = await res.json() as { access_token?: string }
+    if (!data.access_token) return false
+    localStorage.setItem('token', data.access_token)
+    return true
+  } catch (e) {
+    console.warn('[API] Не удалось продлить токен:', e)
+    return false
+  }
+}
+
+export async function api<T>(path: string, options: RequestInit = {}, retried: boolean = false): Promise<T> {
   const headers: Record<string, string> = {
     'Content-Type': 'application/json',
     ...(options.headers as Record<string, string> | undefined)
@@ -64,6 +87,11 @@ export async function api<T>(path: string, options: RequestInit = {}): Promise<T
       // При других ошибках (502, 503, network errors) не удаляем токен,
       // чтобы пользователь мог видеть сообщение об ошибке подключения
       if (res.status === 401) {
+        // Сначала пробуем продлить сессию и повторить запрос один раз
+        if (hasToken && !retried && await refreshToken()) {
+          console.log(`[API] 🔄 Токен продлен через /auth/refresh, повторяем запрос`)
+          return api<T>(path, options, true)
+        }
         console.error(`[API] ❌ 401 Unauthorized - запрос отклонен сервером`)
         console.error(`[API] Токен был в запросе: ${hasToken ? 'ДА' : 'НЕТ'}`)
         if (hasToken) {
@@ -1,3 +1,5 @@
+import { refreshToken } from '../api/client'
+
 /**
  * Определяет платформу (iOS/Android/Desktop)
  */
@@ -486,8 +488,24 @@ function getInitData(): string | null {
   return null
 }
 
+// user_id Max, для которого выдан сохраненный токен (см. autoLogin)
+const TOKEN_USER_ID_KEY = 'token_user_id'
+
 /**
- * Пытается извлечь user_id из initData для логирования
+ * initData, переданный SDK или родительским окном при текущем запуске
+ * (без сохраненного в localStorage - он мог остаться от другого пользователя)
+ */
+function getLiveInitData(): string | null {
+  const w = window as any
+  return w?.MaxWebApp?.initData
+    || w?.Telegram?.WebApp?.initData
+    || w?.Max?.WebApp?.initData
+    || sessionStorage.getItem('initData_from_postMessage')
+    || null
+}
+
+/**
+ * Пытается извлечь user_id из initData
  */
 function extractUserIdFromInitData(initData: string): number | null {
   try {
@@ -530,6 +548,21 @@ export async function autoLogin(waitForData: boolean = true): Promise<boolean> {
   console.log('[autoLogin] Платформа:', platformInfo.platform, platformInfo.isIOS ? '(iOS)' : platformInfo.isAndroid ? '(Android)' : '')
   console.log('[autoLogin] ========================================')
   
+  // Если токен уже есть, продлеваем сессию без initData (дешевый путь /auth/refresh).
+  // Токен принадлежит пользователю, для которого он был выдан: если SDK уже передал initData
+  // другого пользователя Max (другой аккаунт в том же webview), нужен новый вход через webapp-init
+  const liveInitData = getLiveInitData()
+  const liveUserId = liveInitData ? extractUserIdFromInitData(liveInitData) : null
+  if (liveInitData && (liveUserId === null || String(liveUserId) !== localStorage.getItem(TOKEN_USER_ID_KEY))) {
+    console.log('[autoLogin] ⚠️ initData принадлежит другому пользователю, сохраненная сессия не используется')
+    localStorage.removeItem('token')
+    localStorage.removeItem(TOKEN_USER_ID_KEY)
+    localStorage.removeItem('initData_saved')
+  } else if (localStorage.getItem('token') && await refreshToken()) {
+    console.log('[autoLogin] ✅ Сессия продлена через /auth/refresh, initData не требуется')
+    return true
+  }
+  
   try {
     let initData: string | null = null
     
@@ -786,6 +819,11 @@ export async function autoLogin(waitForData: boolean = true): Promise<boolean> {
         // Сохраняем токен в localStorage
         try {
     localStorage.setItem('token', token)
+          if (userId) {
+            localStorage.setItem(TOKEN_USER_ID_KEY, String(userId))
+          } else {
+            localStorage.removeItem(TOKEN_USER_ID_KEY)
+          }
           console.log('[autoLogin] 🔐 Токен сохранен в localStorage')
           if (platformInfo.isIOS) {
             console.log('[autoLogin] iOS: 🔐 Токен сохранен в localStorage')